@@ -1,15 +1,61 @@
 from django.contrib import admin
-from .models import Document, Shipment
+from django.utils import timezone
+
+from .models import Document, Job, Membership, Organization, Shipment
+from .search import get_backend
+
+
+class FullTextSearchMixin:
+    """Answer admin searches from the full-text index instead of icontains scans."""
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        ranked = get_backend().search(search_term, kinds=[self.search_kind], limit=1000)
+        return queryset.filter(pk__in=[pk for _kind, pk, _score in ranked]), False
+
 
 @admin.register (Document)
-class DocumentAdmin(admin.ModelAdmin):
+class DocumentAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = 'document'
     list_display=['title','document_type','uploaded_by','uploaded_at']
     list_filter = ['document_type','uploaded_at']
     search_fields = ['title','description']
 @admin.register(Shipment)
-class ShipmentAdmin(admin.ModelAdmin):
+class ShipmentAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = 'shipment'
     list_display = ['tracking_number', 'shipment_type', 'status', 'origin', 'destination', 'estimated_delivery', 'created_by']
     list_filter = ['status', 'shipment_type', 'created_at']
     search_fields = ['tracking_number', 'origin', 'destination']
 
+
+class MembershipInline(admin.TabularInline):
+    model = Membership
+    raw_id_fields = ['user']
+    extra = 0
+
+
+@admin.register(Organization)
+class OrganizationAdmin(admin.ModelAdmin):
+    list_display = ['name', 'created_at']
+    search_fields = ['name']
+    inlines = [MembershipInline]
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'queue', 'priority', 'status', 'attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'queue']
+    search_fields = ['name', 'unique_key']
+    readonly_fields = ['claimed_at', 'claimed_by', 'created_at', 'finished_at', 'last_error']
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected failed jobs now')
+    def retry_now(self, request, queryset):
+        retried = queryset.filter(status='failed').update(
+            status='pending', run_at=timezone.now(), attempts=0, finished_at=None,
+        )
+        self.message_user(request, f'Queued {retried} job(s) again.')
+
 # Register your models here.
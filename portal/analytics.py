@@ -0,0 +1,129 @@
+from datetime import timedelta
+
+import numpy
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from .models import DailyProductTradeRollup, Trade
+from .rollups import TRADE_REVENUE
+
+PERIODS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+TRADE_TOTALS = {'trades': Count('id'), 'volume': Sum('quantity'), 'revenue': Sum(TRADE_REVENUE)}
+
+
+class TradeSource:
+    """Where a report reads from: the queryset, its date field and how to total it."""
+
+    def __init__(self, queryset, date_field, totals):
+        self.queryset = queryset
+        self.date_field = date_field
+        self.totals = totals
+
+    def total(self, rows):
+        return rows.annotate(**self.totals)
+
+
+def filter_trades(date_from=None, date_to=None, product=None, user=None):
+    trades = Trade.objects.order_by()
+    if user:
+        trades = trades.filter(user__username=user)
+    if product:
+        trades = trades.filter(product=product)
+    if date_from:
+        trades = trades.filter(date__gte=date_from)
+    if date_to:
+        trades = trades.filter(date__lte=date_to)
+    return trades
+
+
+def trade_source(date_from=None, date_to=None, product=None, user=None):
+    """
+    The filtered rows to aggregate, read from the per-product daily rollup
+    unless a user filter needs individual trades.
+
+    The rollup holds at most one row per product per day however many trades
+    there are, which keeps period, product and moving-average reports cheap.
+    Per-user reports scan Trade through its user index, or through
+    trade_product_date_idx when a product is given too.
+    """
+    if user:
+        return TradeSource(filter_trades(date_from, date_to, product, user), 'date', TRADE_TOTALS)
+    rollups = DailyProductTradeRollup.objects.order_by()
+    if product:
+        rollups = rollups.filter(product=product)
+    if date_from:
+        rollups = rollups.filter(day__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(day__lte=date_to)
+    return TradeSource(rollups, 'day', {
+        'trades': Sum('trade_count'), 'volume': Sum('volume'), 'revenue': Sum('revenue'),
+    })
+
+
+def totals_by(source, by):
+    """Trade count, volume and revenue per day, week or month, or per product."""
+    if by in PERIODS:
+        rows = source.queryset.annotate(period=PERIODS[by](source.date_field)).values('period')
+        return list(source.total(rows).order_by('period'))
+    return list(source.total(source.queryset.values('product')).order_by('product'))
+
+
+def totals_by_user(trades):
+    """Trade count, volume and revenue per user, from filter_trades(); the rollup does not keep users."""
+    rows = trades.values('user_id', 'user__username').annotate(**TRADE_TOTALS)
+    return list(rows.order_by('user__username'))
+
+
+def top_products(source, limit=10, rank_by='revenue'):
+    """The limit products with the highest revenue or volume."""
+    return list(source.total(source.queryset.values('product')).order_by(f'-{rank_by}', 'product')[:limit])
+
+
+def daily_series(source):
+    """Dense per-day volume and revenue columns from the first to the last trade day, zeros included."""
+    rows = list(
+        source.total(source.queryset.values(source.date_field))
+        .order_by(source.date_field).values_list(source.date_field, 'volume', 'revenue')
+    )
+    if not rows:
+        return [], [], []
+    first = rows[0][0]
+    days = (rows[-1][0] - first).days + 1
+    volume, revenue = [0.0] * days, [0.0] * days
+    for day, day_volume, day_revenue in rows:
+        offset = (day - first).days
+        volume[offset] = float(day_volume)
+        revenue[offset] = float(day_revenue)
+    return [first + timedelta(days=offset) for offset in range(days)], volume, revenue
+
+
+def rolling_mean(values, window):
+    """Trailing means over window values; the first window - 1 positions have no full window."""
+    if len(values) < window:
+        return []
+    sums = numpy.cumsum(numpy.asarray(values, dtype=float))
+    sums[window:] = sums[window:] - sums[:-window]
+    return (sums[window - 1:] / window).tolist()
+
+
+def moving_averages(source, window=7):
+    """
+    Per-day volume and revenue with their trailing window-day averages.
+
+    Only one row per calendar day reaches Python; the windows run over those
+    columns, vectorised with NumPy. Days without trades count as zero, and
+    days before the first full window are left out.
+    """
+    days, volume, revenue = daily_series(source)
+    volume_avg = rolling_mean(volume, window)
+    revenue_avg = rolling_mean(revenue, window)
+    return [
+        {
+            'date': days[index],
+            'volume': volume[index],
+            'revenue': round(revenue[index], 2),
+            'volume_avg': round(volume_avg[index - window + 1], 2),
+            'revenue_avg': round(revenue_avg[index - window + 1], 2),
+        }
+        for index in range(window - 1, len(days))
+    ]
@@ -0,0 +1,183 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+from .caching import bump_version
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+# 'buffered' batches events in memory and may lose the last unflushed batch if
+# the process dies; 'sync' inserts each event inside the request's transaction.
+# A buffer is flushed when it fills, when a request finishes after
+# AUDIT_FLUSH_INTERVAL seconds, and at exit, so an idle process keeps its last
+# events in memory until the next request, and a SIGKILL loses them.
+AUDIT_DURABILITY = getattr(settings, 'AUDIT_DURABILITY', 'buffered')
+AUDIT_BUFFER_SIZE = getattr(settings, 'AUDIT_BUFFER_SIZE', 200)
+AUDIT_FLUSH_INTERVAL = getattr(settings, 'AUDIT_FLUSH_INTERVAL', 2.0)
+AUDIT_RETENTION_MONTHS = getattr(settings, 'AUDIT_RETENTION_MONTHS', 12)
+
+
+class AuditBuffer:
+    """Process-local queue of ActivityLog rows flushed with one bulk_create."""
+
+    def __init__(self, size=AUDIT_BUFFER_SIZE, interval=AUDIT_FLUSH_INTERVAL):
+        self.size = size
+        self.interval = interval
+        self._events = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, event):
+        self.extend([event])
+
+    def extend(self, events):
+        with self._lock:
+            if not self._events:
+                self._oldest = time.monotonic()
+            self._events.extend(events)
+            full = len(self._events) >= self.size
+        if full:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        if self._events and time.monotonic() - self._oldest >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written."""
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+        try:
+            with transaction.atomic():
+                ActivityLog.objects.bulk_create(events, batch_size=self.size)
+        except DatabaseError:
+            written = self._write_one_by_one(events)
+        else:
+            written = len(events)
+        if written:
+            bump_version('activity')
+        return written
+
+    def _write_one_by_one(self, events):
+        """
+        Insert events one at a time after a batch failed, so one bad row, such
+        as one whose user was deleted since, costs only that event. If the
+        database itself fails, the rest go back in the buffer for the next flush.
+        """
+        written = 0
+        for index, event in enumerate(events):
+            try:
+                with transaction.atomic():
+                    event.save(force_insert=True)
+            except IntegrityError:
+                logger.exception('Dropped activity log event %r that could not be written.', event.action)
+            except DatabaseError:
+                logger.exception('Activity log flush failed; keeping %s event(s) for the next one.', len(events) - index)
+                with self._lock:
+                    self._events[:0] = events[index:]
+                    self._oldest = time.monotonic()
+                break
+            else:
+                written += 1
+        return written
+
+
+buffer = AuditBuffer()
+
+
+def _event(user, verb, target, action, timestamp):
+    return ActivityLog(
+        user_id=user.pk,
+        verb=verb,
+        target_type=target._meta.label_lower if target is not None else '',
+        target_id=str(target.pk) if target is not None else '',
+        action=action or f'{verb} {target}'.strip(),
+        timestamp=timestamp,
+    )
+
+
+def _record(events):
+    if AUDIT_DURABILITY == 'sync':
+        ActivityLog.objects.bulk_create(events)
+        bump_version('activity')
+        return
+    transaction.on_commit(lambda: buffer.extend(events))
+
+
+def log_activity(user, verb, target=None, action=''):
+    """
+    Record that user did verb to target, e.g. log_activity(user, 'create', shipment).
+
+    The row is only queued once the surrounding transaction commits, so a
+    rolled-back change leaves no audit trail behind.
+    """
+    _record([_event(user, verb, target, action, timezone.now())])
+
+
+def log_activities(user, verb, targets, describe=None):
+    """log_activity() for many targets at once; describe(target) gives each row's action text."""
+    now = timezone.now()
+    _record([_event(user, verb, target, describe(target) if describe else '', now) for target in targets])
+
+
+def flush_activity():
+    return buffer.flush()
+
+
+atexit.register(flush_activity)
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def retention_cutoff(months=AUDIT_RETENTION_MONTHS, now=None):
+    """Start of the oldest month that is kept."""
+    start = month_start(timezone.localtime(now or timezone.now()))
+    year, month = divmod(start.year * 12 + start.month - 1 - months, 12)
+    return start.replace(year=year, month=month + 1)
+
+
+def expired_months(months=AUDIT_RETENTION_MONTHS):
+    """(start, end) bounds of each whole month older than the retention window, oldest first."""
+    cutoff = retention_cutoff(months)
+    oldest = (
+        ActivityLog.objects.filter(timestamp__lt=cutoff)
+        .order_by('timestamp')
+        .values_list('timestamp', flat=True)
+        .first()
+    )
+    if oldest is None:
+        return []
+    bounds = []
+    start = month_start(timezone.localtime(oldest))
+    while start < cutoff:
+        year, month = divmod(start.year * 12 + start.month, 12)
+        end = start.replace(year=year, month=month + 1)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def delete_month(start, end, batch_size=5000):
+    """Delete one month of events in pk batches so the write lock is released between them."""
+    deleted = 0
+    in_month = ActivityLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    while True:
+        pks = list(in_month.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += ActivityLog.objects.filter(pk__in=pks).delete()[0]
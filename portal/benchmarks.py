@@ -0,0 +1,338 @@
+import random
+import re
+import secrets
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import metrics
+from .caching import NAMESPACES, bump_version
+from .imports import insert_shipments, insert_trades
+from .models import ActivityLog, Document, Membership, Organization, Shipment, Trade
+from .stats import invalidate_dashboard_stats
+
+SEED_CHUNK_SIZE = getattr(settings, 'SEED_CHUNK_SIZE', 2000)
+SEED_USERS_PER_ORGANIZATION = getattr(settings, 'SEED_USERS_PER_ORGANIZATION', 5)
+# p95 values this close to the baseline never count as regressions; timer noise
+# on a fast view is larger than any ratio is meant to catch.
+BENCHMARK_LATENCY_SLACK_MS = getattr(settings, 'BENCHMARK_LATENCY_SLACK_MS', 5.0)
+
+PORTS = [
+    'Shanghai', 'Singapore', 'Rotterdam', 'Antwerp', 'Hamburg', 'Los Angeles',
+    'Dubai', 'Busan', 'Mumbai', 'Santos', 'Felixstowe', 'Valencia',
+]
+PRODUCTS = ['Coffee', 'Cotton', 'Copper', 'Steel coil', 'Rice', 'Solar panels', 'Textiles', 'Machinery']
+STATUSES = [value for value, _label in Shipment.STATUS_CHOICES]
+SHIPMENT_TYPES = [value for value, _label in Shipment.SHIPMENT_TYPE]
+DOCUMENT_TYPES = [value for value, _label in Document.DOCUMENT_TYPES]
+VERBS = ['create', 'update', 'upload', 'download', 'export']
+
+SEED_PASSWORD = 'benchmark'
+NEXT_PAGE = re.compile(r'href="\?([^"]*cursor=[^"]*)"')
+
+
+def _chunks(count, size=SEED_CHUNK_SIZE):
+    while count > 0:
+        yield min(count, size)
+        count -= size
+
+
+def fake_pdf(rng, label):
+    """A small, valid single-page PDF whose text makes its content unique."""
+    text = f'{label} {rng.getrandbits(64):016x}'
+    stream = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'.encode()
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+        b'/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>',
+        b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    body = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, content in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += b'%d 0 obj\n%s\nendobj\n' % (number, content)
+    xref = len(body)
+    body += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        body += b'%010d 00000 n \n' % offset
+    body += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(body)
+
+
+def seed(users=50, shipments=10000, trades=5000, documents=100, activities=20000, rng_seed=0, log=None):
+    """
+    Add synthetic users, shipments, trades, documents and activity events.
+
+    Rows go in through the bulk paths the importer uses, so rollups, the search
+    index and status timelines stay consistent. Run it repeatedly to grow a
+    database: every call uses fresh usernames and tracking numbers. The first
+    new user is staff; all of them log in with SEED_PASSWORD. The others are
+    grouped into organizations of SEED_USERS_PER_ORGANIZATION members, and
+    every row a member owns belongs to their organization.
+    """
+    rng = random.Random(rng_seed)
+    run = secrets.token_hex(3)
+    log = log or (lambda message: None)
+    today = date.today()
+
+    password = make_password(SEED_PASSWORD)
+    User.objects.bulk_create([
+        User(username=f'bench-{run}-{i}', password=password, is_staff=(i == 0), email=f'bench-{run}-{i}@example.com')
+        for i in range(users)
+    ])
+    people = list(User.objects.filter(username__startswith=f'bench-{run}-').order_by('pk'))
+    log(f'{len(people)} user(s)')
+    if not people:
+        return run
+    tenants = _seed_organizations(run, people[1:])
+
+    made = 0
+    for size in _chunks(shipments):
+        batch = []
+        for _ in range(size):
+            origin, destination = rng.sample(PORTS, 2)
+            owner = rng.choice(people)
+            batch.append(Shipment(
+                tracking_number=f'BENCH-{run}-{made:08d}',
+                shipment_type=rng.choice(SHIPMENT_TYPES),
+                status=rng.choice(STATUSES),
+                origin=origin,
+                destination=destination,
+                description=f'{rng.choice(PRODUCTS)} from {origin} to {destination}',
+                price=Decimal(rng.randint(100, 500000)) / 100,
+                created_by=owner,
+                organization_id=tenants.get(owner.pk),
+                estimated_delivery=today + timedelta(days=rng.randint(-180, 90)),
+            ))
+            made += 1
+        insert_shipments(batch)
+        log(f'{made} shipment(s)')
+
+    made = 0
+    for size in _chunks(trades):
+        batch = []
+        for _ in range(size):
+            owner = rng.choice(people)
+            batch.append(Trade(
+                user=owner,
+                organization_id=tenants.get(owner.pk),
+                product=rng.choice(PRODUCTS),
+                quantity=rng.randint(1, 1000),
+                price=Decimal(rng.randint(100, 100000)) / 100,
+                date=today - timedelta(days=rng.randint(0, 365)),
+            ))
+        insert_trades(batch)
+        made += size
+        log(f'{made} trade(s)')
+
+    # One save per document: the storage, dedupe and preview queue all hang off it.
+    for i in range(documents):
+        owner = rng.choice(people)
+        document = Document(
+            title=f'Bench document {run}-{i}',
+            document_type=rng.choice(DOCUMENT_TYPES),
+            uploaded_by=owner,
+            organization_id=tenants.get(owner.pk),
+            description=rng.choice(PRODUCTS),
+        )
+        document.file.save(f'bench-{run}-{i}.pdf', ContentFile(fake_pdf(rng, document.title)), save=False)
+        document.save()
+    log(f'{documents} document(s)')
+
+    now = timezone.now()
+    made = 0
+    for size in _chunks(activities):
+        ActivityLog.objects.bulk_create([
+            ActivityLog(
+                user=rng.choice(people),
+                verb=rng.choice(VERBS),
+                action='Benchmark event',
+                target_type='shipment',
+                target_id=str(rng.randint(1, max(shipments, 1))),
+                timestamp=now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)),
+            )
+            for _ in range(size)
+        ])
+        made += size
+        log(f'{made} activity event(s)')
+
+    invalidate_dashboard_stats(*tenants.values())
+    bump_version(*NAMESPACES)
+    return run
+
+
+def _seed_organizations(run, members):
+    """Group members into organizations and return their organization ids by user pk."""
+    size = max(SEED_USERS_PER_ORGANIZATION, 1)
+    groups = [members[start:start + size] for start in range(0, len(members), size)]
+    Organization.objects.bulk_create([
+        Organization(name=f'Bench {run} {number}') for number in range(len(groups))
+    ])
+    organizations = Organization.objects.filter(name__startswith=f'Bench {run} ').order_by('pk')
+    tenants = {}
+    for organization, group in zip(organizations, groups):
+        tenants.update((user.pk, organization.pk) for user in group)
+    Membership.objects.bulk_create([
+        Membership(user_id=user, organization_id=organization) for user, organization in tenants.items()
+    ])
+    return tenants
+
+
+class Benchmark:
+    """Run scripted request scenarios through the test client and time each request."""
+
+    def __init__(self, staff, client_user, rng_seed=0):
+        self.staff = staff
+        self.client_user = client_user
+        self.rng = random.Random(rng_seed)
+        self.staff_client = self._client(staff)
+        self.user_client = self._client(client_user)
+
+    def _client(self, user):
+        # A host the running settings accept; with DEBUG and no ALLOWED_HOSTS that is localhost.
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        client = Client(HTTP_HOST=hosts[0] if hosts else 'localhost')
+        client.force_login(user)
+        return client
+
+    def _measure(self, samples, method, *args, **kwargs):
+        collector = metrics.RequestMetrics()
+        start = time.perf_counter()
+        with connection.execute_wrapper(collector):
+            response = method(*args, **kwargs)
+        samples.append((time.perf_counter() - start, collector.queries, response.status_code))
+        return response
+
+    def dashboard_reads(self, samples, count):
+        urls = [
+            (self.staff_client, reverse('admin_dashboard')),
+            (self.user_client, reverse('client_dashboard')),
+        ]
+        for i in range(count):
+            client, url = urls[i % len(urls)]
+            self._measure(samples, client.get, url)
+
+    def shipment_list_paging(self, samples, count):
+        url = reverse('shipment_list')
+        query = ''
+        for _ in range(count):
+            response = self._measure(samples, self.user_client.get, f'{url}?{query}' if query else url)
+            found = NEXT_PAGE.search(response.content.decode())
+            # Walk forward page by page and start over at the end.
+            query = found.group(1).replace('&amp;', '&') if found else ''
+
+    def shipment_create_burst(self, samples, count):
+        url = reverse('shipment_create')
+        run = secrets.token_hex(3)
+        for i in range(count):
+            origin, destination = self.rng.sample(PORTS, 2)
+            self._measure(samples, self.user_client.post, url, {
+                'tracking_number': f'BENCH-NEW-{run}-{i}',
+                'shipment_type': self.rng.choice(SHIPMENT_TYPES),
+                'status': 'pending',
+                'origin': origin,
+                'destination': destination,
+                'description': 'Benchmark shipment',
+                'estimated_delivery': (date.today() + timedelta(days=30)).isoformat(),
+            })
+
+    def shipment_update_burst(self, samples, count):
+        fields = ['pk', 'tracking_number', 'shipment_type', 'status', 'origin', 'destination', 'description',
+                  'estimated_delivery']
+        shipments = list(Shipment.objects.order_by('-pk').values(*fields)[:max(count, 1)])
+        if not shipments:
+            return
+        for i in range(count):
+            data = dict(shipments[i % len(shipments)])
+            pk = data.pop('pk')
+            data['status'] = self.rng.choice([status for status in STATUSES if status != data['status']])
+            data['estimated_delivery'] = data['estimated_delivery'].isoformat()
+            shipments[i % len(shipments)]['status'] = data['status']
+            self._measure(samples, self.user_client.post, reverse('shipment_update', args=[pk]), data)
+
+    def document_upload(self, samples, count):
+        url = reverse('document_upload')
+        for i in range(count):
+            title = f'Benchmark upload {i}'
+            upload = SimpleUploadedFile(f'upload-{i}.pdf', fake_pdf(self.rng, title), 'application/pdf')
+            self._measure(samples, self.user_client.post, url, {
+                'title': title,
+                'document_type': self.rng.choice(DOCUMENT_TYPES),
+                'file': upload,
+                'description': 'Benchmark upload',
+            })
+
+    SCENARIOS = ['dashboard_reads', 'shipment_list_paging', 'shipment_create_burst', 'shipment_update_burst',
+                 'document_upload']
+
+    def run(self, scenario, count, warmup=2):
+        """Run count timed requests of a scenario, after a few untimed ones."""
+        method = getattr(self, scenario)
+        # The bursts are far above the per-user write limits; time the views, not 429s.
+        with override_settings(RATELIMIT_ENABLED=False):
+            if warmup:
+                method([], warmup)
+            samples = []
+            started = time.perf_counter()
+            method(samples, count)
+            return summarize(samples, time.perf_counter() - started)
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0
+
+
+def summarize(samples, elapsed):
+    """Latency percentiles in ms, throughput, query counts and error count of (seconds, queries, status) samples."""
+    latencies = sorted(duration * 1000 for duration, _queries, _status in samples)
+    queries = [count for _duration, count, _status in samples]
+    return {
+        'requests': len(samples),
+        'p50_ms': round(_percentile(latencies, 0.50), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'p99_ms': round(_percentile(latencies, 0.99), 2),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0,
+        'mean_queries': round(sum(queries) / len(queries), 2) if queries else 0,
+        'max_queries': max(queries, default=0),
+        'errors': sum(1 for _duration, _count, status in samples if status >= 400),
+    }
+
+
+def compare(results, baseline, tolerance=0.5, slack_ms=BENCHMARK_LATENCY_SLACK_MS):
+    """
+    List the regressions of results against a baseline, both {scenario: summary}.
+
+    A scenario regresses when it runs more queries or fails more requests than
+    its baseline, or when its p95 grows past the tolerance (0.5 allows +50%).
+    Scenarios missing from either side are not compared; runs of a different
+    length are refused, since the share of cold-cache requests differs.
+    """
+    problems = []
+    for scenario, result in results.items():
+        expected = baseline.get(scenario)
+        if expected is None:
+            continue
+        if result['requests'] != expected['requests']:
+            problems.append(f'{scenario}: ran {result["requests"]} requests, baseline ran {expected["requests"]}')
+            continue
+        if result['max_queries'] > expected['max_queries']:
+            problems.append(f'{scenario}: {result["max_queries"]} queries, baseline {expected["max_queries"]}')
+        if result['errors'] > expected['errors']:
+            problems.append(f'{scenario}: {result["errors"]} failed request(s), baseline {expected["errors"]}')
+        limit = max(expected['p95_ms'] * (1 + tolerance), expected['p95_ms'] + slack_ms)
+        if result['p95_ms'] > limit:
+            problems.append(f'{scenario}: p95 {result["p95_ms"]}ms, baseline {expected["p95_ms"]}ms (limit {limit:.1f}ms)')
+    return problems
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Blob
+from .storage import document_storage
+
+# Seconds a released file stays in the trash, where an upload of the same
+# content that raced with the release can still take it back.
+BLOB_TRASH_SECONDS = getattr(settings, 'BLOB_TRASH_SECONDS', 3600)
+
+
+def acquire_blob(name):
+    """
+    Count one more reference to a stored file.
+
+    Storage skips writing content it already has, so the file this upload
+    found may have been released and trashed since; it is put back here.
+    """
+    if not name:
+        return
+    storage = document_storage()
+    with transaction.atomic():
+        blob, _created = Blob.objects.select_for_update().get_or_create(name=name)
+        if not storage.exists(name):
+            storage.restore(name)
+        size = storage.size(name) if storage.exists(name) else 0
+        Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1, size=size)
+
+
+def release_blob(name):
+    """
+    Drop one reference and trash the file once nothing uses it.
+
+    The last release leaves the row at zero references until the file has
+    been trashed after commit, so an upload of the same content in between
+    has a row to lock and acquires it again instead of losing the file.
+    Files stored before content addressing have no Blob row and are left
+    alone, as they were before.
+    """
+    if not name:
+        return
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(name=name).first()
+        if blob is None:
+            return
+        if blob.ref_count > 1:
+            Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+            return
+        Blob.objects.filter(pk=blob.pk).update(ref_count=0)
+        transaction.on_commit(lambda: discard_blob(name))
+
+
+def discard_blob(name):
+    """Trash a released file, unless it has been acquired again since."""
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(name=name).first()
+        if blob is None or blob.ref_count > 0:
+            return
+        blob.delete()
+        document_storage().trash(name)
+
+
+def sweep_blobs(trash_seconds=BLOB_TRASH_SECONDS):
+    """
+    Trash files whose release never got as far as its commit hook, and
+    delete trashed files older than trash_seconds; returns how many.
+    """
+    for name in Blob.objects.filter(ref_count=0).values_list('name', flat=True).iterator():
+        discard_blob(name)
+    return document_storage().purge_trash(trash_seconds)
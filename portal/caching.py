@@ -0,0 +1,119 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+VIEW_CACHE_TTL = getattr(settings, 'VIEW_CACHE_TTL', 300)
+FRAGMENT_CACHE_TTL = getattr(settings, 'FRAGMENT_CACHE_TTL', 300)
+
+# Each namespace has a version number that is part of every key depending on
+# it. Bumping the version orphans those entries at once; they expire on their
+# own instead of being found and deleted one by one.
+NAMESPACES = ('shipments', 'documents', 'trades', 'activity', 'users')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _version_key(namespace):
+    return f'portal:version:{namespace}'
+
+
+def get_versions(namespaces):
+    """Current version of each namespace, fetched in one cache round trip."""
+    keys = {_version_key(namespace): namespace for namespace in namespaces}
+    found = cache.get_many(keys)
+    versions = {}
+    for key, namespace in keys.items():
+        if key not in found:
+            # Start evicted or unseen versions from the clock, so they cannot
+            # collide with a version some surviving entry was stored under.
+            cache.add(key, time.time_ns() // 1000, None)
+            found[key] = cache.get(key)
+        versions[namespace] = found[key]
+    return versions
+
+
+async def aget_versions(namespaces):
+    """get_versions() through the cache's async API."""
+    keys = {_version_key(namespace): namespace for namespace in namespaces}
+    found = await cache.aget_many(keys)
+    versions = {}
+    for key, namespace in keys.items():
+        if key not in found:
+            await cache.aadd(key, time.time_ns() // 1000, None)
+            found[key] = await cache.aget(key)
+        versions[namespace] = found[key]
+    return versions
+
+
+def bump_version(*namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            cache.set(_version_key(namespace), time.time_ns() // 1000, None)
+
+
+def versioned_key(name, namespaces, *vary_on):
+    return _compose_key(name, namespaces, get_versions(namespaces), vary_on)
+
+
+async def aversioned_key(name, namespaces, *vary_on):
+    return _compose_key(name, namespaces, await aget_versions(namespaces), vary_on)
+
+
+def _compose_key(name, namespaces, versions, vary_on):
+    version_part = '.'.join(str(versions[namespace]) for namespace in namespaces)
+    # Vary values may be long query strings; a digest keeps keys short and safe.
+    vary_part = hashlib.md5(':'.join(str(value) for value in vary_on).encode()).hexdigest()
+    return f'portal:{name}:{version_part}:{vary_part}'
+
+
+def record_lookup(name, hit):
+    with _stats_lock:
+        _stats[(name, 'hit' if hit else 'miss')] += 1
+
+
+def cache_stats():
+    """Hit and miss counts per cached view or fragment since this process started."""
+    with _stats_lock:
+        names = sorted({name for name, _outcome in _stats})
+        return {
+            name: {'hits': _stats[(name, 'hit')], 'misses': _stats[(name, 'miss')]}
+            for name in names
+        }
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def cached(name, namespaces, vary_on, compute, timeout=VIEW_CACHE_TTL):
+    """
+    Return compute() from cache, keyed on the namespaces' versions and vary_on.
+
+    compute must return something picklable; materialise querysets first.
+    """
+    key = versioned_key(name, namespaces, *vary_on)
+    value = cache.get(key)
+    record_lookup(name, value is not None)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+async def acached(name, namespaces, vary_on, compute, timeout=VIEW_CACHE_TTL):
+    """cached() for async views: compute is awaited, and the cache is read through its async API."""
+    key = await aversioned_key(name, namespaces, *vary_on)
+    value = await cache.aget(key)
+    record_lookup(name, value is not None)
+    if value is None:
+        value = await compute()
+        await cache.aset(key, value, timeout)
+    return value
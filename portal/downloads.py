@@ -0,0 +1,136 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.text import slugify
+
+from .streaming import stream_for
+
+# 'django' streams the file from the worker, 'x-accel' hands off to nginx and
+# 'x-sendfile' to Apache/lighttpd. The proxy then handles Range itself.
+DOCUMENT_SERVE_MODE = getattr(settings, 'DOCUMENT_SERVE_MODE', 'django')
+DOCUMENT_ACCEL_PREFIX = getattr(settings, 'DOCUMENT_ACCEL_PREFIX', '/protected-media/')
+DOWNLOAD_BLOCK_SIZE = 256 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """Read-only view of length bytes of a file starting at start."""
+
+    def __init__(self, fileobj, start, length):
+        self.fileobj = fileobj
+        self.remaining = length
+        fileobj.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def document_etag(document, stat):
+    # Content-addressed names already are the SHA-256 of the bytes.
+    name = os.path.basename(document.file.name)
+    if document.file.name.startswith('blobs/'):
+        return f'"{os.path.splitext(name)[0]}"'
+    return f'"{int(stat.st_mtime)}-{stat.st_size}"'
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single byte range, None to send the whole file,
+    or False when the range cannot be satisfied.
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if not match:
+        # Missing, malformed and multi-range requests get the full body.
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def serve_document(request, document):
+    """
+    Serve a document's file without reading it into memory.
+
+    Full responses use FileResponse over the open file, so servers with
+    wsgi.file_wrapper (gunicorn, uWSGI) send it with sendfile(); under ASGI
+    the blocks are read in a thread as they are sent. Single byte ranges,
+    If-None-Match/If-Modified-Since and If-Range are honoured.
+    """
+    path = document.file.path
+    stat = os.stat(path)
+    etag = document_etag(document, stat)
+    last_modified = int(stat.st_mtime)
+    extension = os.path.splitext(document.file.name)[1]
+    filename = f'{slugify(document.title) or "document"}{extension}'
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    if DOCUMENT_SERVE_MODE in ('x-accel', 'x-sendfile'):
+        response = HttpResponse(content_type=content_type)
+        if DOCUMENT_SERVE_MODE == 'x-accel':
+            response['X-Accel-Redirect'] = DOCUMENT_ACCEL_PREFIX + document.file.name
+        else:
+            response['X-Sendfile'] = path
+    else:
+        byte_range = None
+        if _if_range_matches(request, etag, last_modified):
+            byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            response.block_size = DOWNLOAD_BLOCK_SIZE
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = FileResponse(RangeFile(open(path, 'rb'), start, length), status=206, content_type=content_type)
+            response.block_size = DOWNLOAD_BLOCK_SIZE
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        stream_for(request, response, thread_sensitive=False)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'private'
+    return response
@@ -0,0 +1,80 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+
+from .streaming import stream_for
+
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+EXPORT_FORMATS = ['csv', 'json']
+
+SHIPMENT_FIELDS = [
+    'id', 'tracking_number', 'shipment_type', 'status', 'origin', 'destination',
+    'description', 'price', 'estimated_delivery', 'created_by__username', 'created_at', 'updated_at',
+]
+TRADE_FIELDS = ['id', 'product', 'quantity', 'price', 'date', 'user__username', 'created_at']
+ACTIVITY_FIELDS = ['id', 'user__username', 'verb', 'target_type', 'target_id', 'action', 'timestamp']
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def _rows(queryset, fields, chunk_size):
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def _batched(lines, chunk_size):
+    # Join lines into one string per chunk so the server sends a few large
+    # writes instead of one tiny write per row.
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= chunk_size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def stream_csv(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    yield from _batched((writer.writerow(row) for row in _rows(queryset, fields, chunk_size)), chunk_size)
+
+
+def stream_json(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    def lines():
+        separator = ''
+        for row in _rows(queryset, fields, chunk_size):
+            yield separator + json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder)
+            separator = ',\n'
+
+    yield '['
+    yield from _batched(lines(), chunk_size)
+    yield ']\n'
+
+
+def export_response(request, queryset, fields, basename):
+    """
+    Stream queryset as CSV, or JSON with ?format=json, without materialising it.
+
+    Rows are pulled with .iterator(), so memory use and time-to-first-byte do
+    not depend on the number of rows exported, under WSGI or ASGI.
+    """
+    fmt = request.GET.get('format') or 'csv'
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f'Unknown export format {fmt!r}; use one of {", ".join(EXPORT_FORMATS)}.')
+    if fmt == 'json':
+        response = StreamingHttpResponse(stream_json(queryset, fields), content_type='application/json')
+        filename = f'{basename}.json'
+    else:
+        response = StreamingHttpResponse(stream_csv(queryset, fields), content_type='text/csv')
+        filename = f'{basename}.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return stream_for(request, response)
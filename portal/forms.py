@@ -1,5 +1,10 @@
+from datetime import datetime, time, timedelta
+
 from django import forms
-from .models import Document, Shipment, Trade
+from django.utils import timezone
+from .models import Document, Organization, Shipment, Trade
+from .transitions import BULK_STATUS_MAX
+from .uploads import DOCUMENT_MAX_SIZE
 
 class DocumentForm(forms.ModelForm):
     class Meta:
@@ -12,6 +17,12 @@ class DocumentForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Optional description'}),
         }
 
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if file and file.size > DOCUMENT_MAX_SIZE:
+            raise forms.ValidationError(f'Documents may be at most {DOCUMENT_MAX_SIZE // (1024 * 1024)} MB.')
+        return file
+
 class ShipmentForm(forms.ModelForm):
     class Meta:
         model = Shipment
@@ -28,4 +39,139 @@ class ShipmentForm(forms.ModelForm):
 class TradeForm(forms.ModelForm):
     class Meta:
         model = Trade
-        fields = ['product','quantity','price','date']
\ No newline at end of file
+        fields = ['product','quantity','price','date']
+
+
+def filter_date_range(queryset, field, date_from, date_to, is_datetime=True):
+    """Filter field to the inclusive [date_from, date_to] day range."""
+    # Datetime columns are compared against day boundaries rather than
+    # field__date so an index on the column can still be used.
+    if is_datetime:
+        tz = timezone.get_current_timezone()
+        if date_from:
+            queryset = queryset.filter(**{f'{field}__gte': datetime.combine(date_from, time.min, tzinfo=tz)})
+        if date_to:
+            queryset = queryset.filter(**{f'{field}__lt': datetime.combine(date_to + timedelta(days=1), time.min, tzinfo=tz)})
+    else:
+        if date_from:
+            queryset = queryset.filter(**{f'{field}__gte': date_from})
+        if date_to:
+            queryset = queryset.filter(**{f'{field}__lte': date_to})
+    return queryset
+
+
+class ShipmentFilterForm(forms.Form):
+    status = forms.ChoiceField(choices=[('', 'All statuses')] + Shipment.STATUS_CHOICES, required=False)
+    shipment_type = forms.ChoiceField(choices=[('', 'All types')] + Shipment.SHIPMENT_TYPE, required=False)
+    origin = forms.CharField(max_length=200, required=False, widget=forms.TextInput(attrs={'placeholder': 'Origin'}))
+    destination = forms.CharField(max_length=200, required=False, widget=forms.TextInput(attrs={'placeholder': 'Destination'}))
+    created_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    created_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def filter(self, queryset):
+        """Apply the cleaned filters; each one lines up with a Shipment index."""
+        data = self.cleaned_data
+        for field in ['status', 'shipment_type', 'origin', 'destination']:
+            if data.get(field):
+                queryset = queryset.filter(**{field: data[field]})
+        return filter_date_range(queryset, 'created_at', data.get('created_from'), data.get('created_to'))
+
+
+class ShipmentVersionsField(forms.Field):
+    """
+    Shipments to change with the version each was read at: "id:version"
+    strings from a form, or {"id": ..., "version": ...} objects from JSON.
+    A missing version skips the concurrency check for that shipment.
+    """
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if isinstance(value, (str, dict)):
+            value = [value]
+        versions = {}
+        for item in value or []:
+            if isinstance(item, dict):
+                pk, version = item.get('id'), item.get('version')
+            else:
+                pk, _sep, version = str(item).partition(':')
+            try:
+                pk = int(pk)
+                version = datetime.fromisoformat(version) if version else None
+            except (TypeError, ValueError):
+                raise forms.ValidationError(f'Invalid shipment reference: {item}')
+            if version is not None and timezone.is_naive(version):
+                version = timezone.make_aware(version)
+            versions[pk] = version
+        return versions
+
+    def validate(self, value):
+        super().validate(value)
+        if len(value) > BULK_STATUS_MAX:
+            raise forms.ValidationError(f'At most {BULK_STATUS_MAX} shipments can be changed at once.')
+
+
+class ShipmentBulkStatusForm(forms.Form):
+    shipments = ShipmentVersionsField()
+    to_status = forms.ChoiceField(choices=Shipment.STATUS_CHOICES)
+    from_status = forms.ChoiceField(choices=[('', 'Any status')] + Shipment.STATUS_CHOICES, required=False)
+
+
+class BulkImportForm(forms.Form):
+    KIND_CHOICES = [
+        ('shipments', 'Shipments'),
+        ('trades', 'Trades'),
+    ]
+
+    kind = forms.ChoiceField(choices=KIND_CHOICES, widget=forms.Select(attrs={'class': 'form-control'}))
+    file = forms.FileField(
+        help_text='CSV or XLSX with a header row.',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+    organization = forms.ModelChoiceField(
+        queryset=Organization.objects.order_by('name'),
+        required=False,
+        help_text='The client the rows belong to; leave empty for staff-only rows.',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+
+
+class DateRangeForm(forms.Form):
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def filter(self, queryset, field, is_datetime=True):
+        data = self.cleaned_data
+        return filter_date_range(queryset, field, data.get('date_from'), data.get('date_to'), is_datetime)
+
+
+class UploadSessionForm(forms.Form):
+    filename = forms.CharField(max_length=255)
+    total_size = forms.IntegerField(min_value=1, max_value=DOCUMENT_MAX_SIZE)
+
+
+class DocumentDetailsForm(forms.ModelForm):
+    """Document metadata submitted when a chunked upload is completed."""
+    class Meta:
+        model = Document
+        fields = ['title', 'document_type', 'description']
+
+
+class TradeAnalyticsForm(forms.Form):
+    REPORTS = [
+        ('month', 'By month'),
+        ('week', 'By week'),
+        ('day', 'By day'),
+        ('product', 'By product'),
+        ('user', 'By user'),
+        ('top', 'Top products'),
+        ('moving_average', 'Moving averages'),
+    ]
+
+    report = forms.ChoiceField(choices=REPORTS, required=False)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    product = forms.CharField(max_length=200, required=False)
+    user = forms.CharField(max_length=150, required=False)
+    limit = forms.IntegerField(min_value=1, max_value=100, required=False)
+    rank_by = forms.ChoiceField(choices=[('revenue', 'Revenue'), ('volume', 'Volume')], required=False)
+    window = forms.IntegerField(min_value=1, max_value=365, required=False)
@@ -0,0 +1,205 @@
+import csv
+import io
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from . import rollups
+from .models import Shipment, Trade
+from .caching import bump_version
+from .search import get_backend
+from .stats import invalidate_dashboard_stats
+from .timeline import record_initial_statuses
+from .tracking import invalidate_tracking
+
+IMPORT_CHUNK_SIZE = getattr(settings, 'IMPORT_CHUNK_SIZE', 2000)
+IMPORT_MAX_ERRORS = getattr(settings, 'IMPORT_MAX_ERRORS', 1000)
+
+SHIPMENT_COLUMNS = [
+    'tracking_number', 'shipment_type', 'status', 'origin', 'destination',
+    'description', 'price', 'estimated_delivery',
+]
+TRADE_COLUMNS = ['product', 'quantity', 'price', 'date']
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, messages):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append((line, messages))
+
+
+def read_rows(fileobj, filename):
+    """Yield one dict per data row, reading CSV or XLSX incrementally."""
+    if filename.lower().endswith('.xlsx'):
+        yield from _read_xlsx(fileobj)
+    else:
+        yield from csv.DictReader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+
+
+def _read_xlsx(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError('XLSX imports require openpyxl (pip install openpyxl).')
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, [])]
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _build(model, row, columns, exclude, **extra):
+    values = {
+        column: row[column] for column in columns
+        if row.get(column) not in (None, '')
+    }
+    instance = model(**values, **extra)
+    instance.clean_fields(exclude=exclude)
+    return instance
+
+
+def _messages(exc):
+    return [f'{field}: {message}' for field, messages in exc.message_dict.items() for message in messages]
+
+
+def import_shipments(rows, user, organization=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Validate and insert shipment rows chunk by chunk.
+
+    Only one chunk is held in memory at a time. Duplicate tracking numbers are
+    checked against one prefetch query per chunk plus the numbers already seen
+    in this file. Each chunk is written with bulk_create in its own transaction.
+    """
+    result = ImportResult()
+    seen = set()
+    line = 1
+    for chunk in _chunks(rows, chunk_size):
+        numbers = {str(row.get('tracking_number') or '').strip() for row in chunk}
+        existing = set(
+            Shipment.objects.filter(tracking_number__in=numbers).values_list('tracking_number', flat=True)
+        )
+        valid = []
+        for row in chunk:
+            line += 1
+            number = str(row.get('tracking_number') or '').strip()
+            row['tracking_number'] = number
+            if number in existing or number in seen:
+                result.add_error(line, [f'Tracking number {number} already exists.'])
+                continue
+            try:
+                shipment = _build(
+                    Shipment, row, SHIPMENT_COLUMNS, ['created_by', 'organization'],
+                    created_by=user, organization=organization,
+                )
+            except ValidationError as exc:
+                result.add_error(line, _messages(exc))
+                continue
+            seen.add(number)
+            valid.append((line, shipment))
+        result.created += _insert_chunk(valid, result)
+    invalidate_dashboard_stats(organization and organization.pk)
+    bump_version('shipments')
+    return result
+
+
+def _insert_chunk(valid, result):
+    """
+    Insert one chunk of (line, shipment) pairs and return how many were saved.
+
+    A concurrent writer can take a tracking number after the prefetch; the
+    chunk is then rolled back, the numbers taken since are reported as row
+    errors, and the rest is inserted again.
+    """
+    try:
+        insert_shipments([shipment for _line, shipment in valid])
+        return len(valid)
+    except IntegrityError:
+        pass
+    taken = set(
+        Shipment.objects.filter(tracking_number__in=[shipment.tracking_number for _line, shipment in valid])
+        .values_list('tracking_number', flat=True)
+    )
+    remaining = []
+    for line, shipment in valid:
+        if shipment.tracking_number in taken:
+            result.add_error(line, [f'Tracking number {shipment.tracking_number} already exists.'])
+            continue
+        # Rows of a batch that was rolled back may have been given a pk already.
+        shipment.pk = None
+        shipment._state.adding = True
+        remaining.append((line, shipment))
+    try:
+        insert_shipments([shipment for _line, shipment in remaining])
+    except IntegrityError as exc:
+        for line, _shipment in remaining:
+            result.add_error(line, [f'Could not be saved: {exc}'])
+        return 0
+    return len(remaining)
+
+
+def insert_shipments(shipments):
+    """
+    Bulk-insert validated shipments and bring what signals would have updated
+    (rollups, search index, status timeline, tracking cache) up to date.
+
+    Dashboard stats and cache versions are left to the caller, once per run.
+    """
+    with transaction.atomic():
+        Shipment.objects.bulk_create(shipments)
+        rollups.apply_shipments(shipments)
+        get_backend().index_many(shipments)
+        record_initial_statuses(shipments)
+    invalidate_tracking(*(shipment.tracking_number for shipment in shipments))
+
+
+def insert_trades(trades):
+    """Bulk-insert validated trades and their daily rollups."""
+    with transaction.atomic():
+        Trade.objects.bulk_create(trades)
+        rollups.apply_trades(trades)
+
+
+def import_trades(rows, user, organization=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Validate and insert trade rows chunk by chunk, owned by the importing user."""
+    result = ImportResult()
+    line = 1
+    for chunk in _chunks(rows, chunk_size):
+        valid = []
+        for row in chunk:
+            line += 1
+            try:
+                trade = _build(
+                    Trade, row, TRADE_COLUMNS, ['user', 'organization'], user=user, organization=organization,
+                )
+            except ValidationError as exc:
+                result.add_error(line, _messages(exc))
+                continue
+            valid.append(trade)
+        insert_trades(valid)
+        result.created += len(valid)
+    invalidate_dashboard_stats(organization and organization.pk)
+    bump_version('trades')
+    return result
+
+
+IMPORTERS = {
+    'shipments': import_shipments,
+    'trades': import_trades,
+}
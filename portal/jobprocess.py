@@ -0,0 +1,15 @@
+"""
+Entry points for runworker --processes. Spawned pool processes unpickle the
+function they are given before Django is set up, so this module must not
+import models at the top.
+"""
+import django
+
+
+def setup():
+    django.setup()
+
+
+def execute_job(name, args, kwargs):
+    from .jobs import execute_job
+    return execute_job(name, args, kwargs)
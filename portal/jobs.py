@@ -0,0 +1,394 @@
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import jobprocess
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = getattr(settings, 'JOB_WORKERS', 4)
+JOB_MAX_ATTEMPTS = getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+JOB_RETRY_BACKOFF = getattr(settings, 'JOB_RETRY_BACKOFF', 30)
+# A job still running this many seconds after it was claimed is assumed to
+# belong to a worker that died, and is handed out again.
+JOB_CLAIM_TIMEOUT = getattr(settings, 'JOB_CLAIM_TIMEOUT', 1800)
+JOB_RETENTION_DAYS = getattr(settings, 'JOB_RETENTION_DAYS', 7)
+JOB_POLL_INTERVAL = getattr(settings, 'JOB_POLL_INTERVAL', 1.0)
+
+# Recurring jobs, enqueued by every running worker and deduplicated through
+# Job.unique_key: each entry names a task and either 'every' (seconds) or
+# 'cron' (minute hour day-of-month month day-of-week, in TIME_ZONE), and may
+# give 'args', 'kwargs', 'queue' and 'priority'.
+JOB_SCHEDULE = getattr(settings, 'JOB_SCHEDULE', {
+    'send-outbox': {'task': 'portal.tasks.send_outbox', 'every': 30},
+    'refresh-dashboard-stats': {'task': 'portal.tasks.refresh_dashboard_stats', 'every': 20},
+    'purge-jobs': {'task': 'portal.tasks.purge_jobs', 'cron': '45 3 * * *'},
+    'purge-blob-trash': {'task': 'portal.tasks.purge_blob_trash', 'every': 900},
+    'expire-uploads': {'task': 'portal.tasks.expire_uploads', 'cron': '15 * * * *'},
+})
+
+
+class PermanentJobError(Exception):
+    """Raised by a task whose failure retrying will not fix; the job fails at once."""
+
+
+class Task:
+    """A function that can run in the background; created with @task."""
+
+    def __init__(self, func, queue, priority, max_attempts):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.queue = queue
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+    def delay(self, *args, **kwargs):
+        """Enqueue a call with these arguments, to run as soon as a worker is free."""
+        return enqueue(self, args, kwargs)
+
+
+def task(queue='default', priority=0, max_attempts=JOB_MAX_ATTEMPTS):
+    """
+    Make a module-level function enqueueable.
+
+    Jobs store the function's dotted path and JSON arguments, and workers
+    import it by that path, so pass primary keys rather than model instances.
+    """
+    def decorator(func):
+        return Task(func, queue, priority, max_attempts)
+    return decorator
+
+
+def get_task(name):
+    try:
+        found = import_string(name)
+    except ImportError as exc:
+        raise ImproperlyConfigured(f'No task {name!r}: {exc}') from None
+    if not isinstance(found, Task):
+        raise ImproperlyConfigured(f'{name!r} is not a portal.jobs task.')
+    return found
+
+
+def enqueue(task, args=(), kwargs=None, queue=None, priority=None, run_at=None, unique_key=None):
+    """
+    Queue a call to task (a Task or its dotted name) and return the Job.
+
+    The row is written in the caller's transaction, so a job queued by a
+    request that rolls back never runs. With unique_key, a job that already
+    has the key is returned instead of queueing another.
+    """
+    if isinstance(task, str):
+        task = get_task(task)
+    fields = {
+        'name': task.name,
+        'args': list(args),
+        'kwargs': kwargs or {},
+        'queue': queue or task.queue,
+        'priority': task.priority if priority is None else priority,
+        'max_attempts': task.max_attempts,
+        'run_at': run_at or timezone.now(),
+    }
+    if unique_key is None:
+        return Job.objects.create(**fields)
+    return Job.objects.get_or_create(unique_key=unique_key, defaults=fields)[0]
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 30s, 60s, 120s, ... with the default base."""
+    return timedelta(seconds=JOB_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def claim_jobs(limit, queues=None, worker=''):
+    """
+    Mark up to limit due jobs as running and return them, highest priority first.
+
+    Locked rows are skipped on PostgreSQL, so several workers claim different
+    jobs at once; SQLite starts the transaction with BEGIN IMMEDIATE, which
+    lets one claim run at a time.
+    """
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    with transaction.atomic():
+        due = Job.objects.select_for_update(skip_locked=True).filter(status='pending', run_at__lte=now)
+        if queues:
+            due = due.filter(queue__in=queues)
+        pks = list(due.order_by('-priority', 'run_at', 'id').values_list('pk', flat=True)[:limit])
+        if not pks:
+            return []
+        Job.objects.filter(pk__in=pks).update(
+            status='running', claimed_at=now, claimed_by=worker, attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(pk__in=pks).order_by('-priority', 'run_at', 'id'))
+
+
+def execute_job(name, args, kwargs):
+    """
+    Run one job's task in this thread or pool process.
+
+    Returns (error, retry): an empty error when it succeeded, otherwise the
+    traceback and whether another attempt may help.
+    """
+    close_old_connections()
+    try:
+        get_task(name).func(*args, **kwargs)
+    except (ImproperlyConfigured, PermanentJobError):
+        return traceback.format_exc(), False
+    except Exception:
+        return traceback.format_exc(), True
+    finally:
+        # Pool threads outlive the job; do not leave a connection open in each.
+        close_old_connections()
+    return '', False
+
+
+def finish_job(job, error='', retry=False):
+    """Record the outcome of a claimed job, scheduling a retry while attempts remain."""
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=job.pk, status='running', claimed_at=job.claimed_at)
+    if not error:
+        claimed.update(status='done', finished_at=now, last_error='')
+        return
+    logger.warning('Job %s %s failed (attempt %s of %s): %s',
+                   job.pk, job.name, job.attempts, job.max_attempts, error.strip().splitlines()[-1])
+    if retry and job.attempts < job.max_attempts:
+        claimed.update(status='pending', run_at=now + retry_delay(job.attempts), last_error=error)
+    else:
+        claimed.update(status='failed', finished_at=now, last_error=error)
+
+
+def requeue_stale_jobs(timeout=JOB_CLAIM_TIMEOUT):
+    """Give jobs claimed by a worker that died back to the queue, or fail those out of attempts."""
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', claimed_at__lt=now - timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', finished_at=now, last_error='Worker stopped while running the job.',
+    )
+    return failed + stale.update(status='pending', run_at=now)
+
+
+def purge_finished_jobs(days=JOB_RETENTION_DAYS):
+    """Delete done and failed jobs that finished more than days ago."""
+    cutoff = timezone.now() - timedelta(days=days)
+    return Job.objects.filter(status__in=['done', 'failed'], finished_at__lt=cutoff).delete()[0]
+
+
+def queue_depth():
+    """
+    Unfinished jobs per queue: 'due' now, 'scheduled' for later, 'running'
+    and 'failed', plus 'lag', the seconds the oldest due job has waited.
+    """
+    now = timezone.now()
+    due = Q(status='pending', run_at__lte=now)
+    rows = (
+        Job.objects.exclude(status='done').values('queue')
+        .annotate(
+            due=Count('id', filter=due),
+            scheduled=Count('id', filter=Q(status='pending', run_at__gt=now)),
+            running=Count('id', filter=Q(status='running')),
+            failed=Count('id', filter=Q(status='failed')),
+            oldest_due=Min('run_at', filter=due),
+        )
+        .order_by('queue')
+    )
+    depth = {}
+    for row in rows:
+        oldest_due = row.pop('oldest_due')
+        row['lag'] = (now - oldest_due).total_seconds() if oldest_due else 0.0
+        depth[row.pop('queue')] = row
+    return depth
+
+
+def work_off(queues=None, limit=None):
+    """Run due jobs one after another in this thread until none are left; returns how many ran."""
+    ran = 0
+    while limit is None or ran < limit:
+        jobs = claim_jobs(1, queues, worker=worker_name())
+        if not jobs:
+            break
+        finish_job(jobs[0], *execute_job(jobs[0].name, jobs[0].args, jobs[0].kwargs))
+        ran += 1
+    return ran
+
+
+# ==================== SCHEDULE ====================
+
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _cron_values(field, low, high):
+    values = set()
+    for part in field.split(','):
+        span, _, step = part.partition('/')
+        if span == '*':
+            start, end = low, high
+        elif '-' in span:
+            start, end = (int(bound) for bound in span.split('-', 1))
+        else:
+            start = end = int(span)
+            if step:
+                end = high
+        if not low <= start <= end <= high:
+            raise ValueError(f'Cron field {field!r} is outside {low}-{high}.')
+        values.update(range(start, end + 1, int(step or 1)))
+    return values
+
+
+class Cron:
+    """A crontab expression: minute hour day-of-month month day-of-week, with *, lists, ranges and steps."""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression {expression!r} needs five fields.')
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _cron_values(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        # Both 0 and 7 mean Sunday.
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def matches(self, moment):
+        if moment.minute not in self.minutes or moment.hour not in self.hours or moment.month not in self.months:
+            return False
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        # As in cron, a restricted day of month and day of week match either way.
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+
+class Scheduler:
+    """Enqueues JOB_SCHEDULE entries as their slots come round; safe to run in every worker."""
+
+    def __init__(self, schedule=None):
+        self.entries = {}
+        for name, entry in (JOB_SCHEDULE if schedule is None else schedule).items():
+            if ('every' in entry) == ('cron' in entry):
+                raise ImproperlyConfigured(f"Scheduled job {name!r} needs either 'every' or 'cron'.")
+            cron = Cron(entry['cron']) if 'cron' in entry else None
+            self.entries[name] = (get_task(entry['task']), entry, cron)
+        self._last_slots = {}
+
+    def slot(self, entry, cron, now):
+        """The start of the slot now falls in, or None when a cron entry is not due this minute."""
+        if cron is None:
+            every = entry['every']
+            return datetime.fromtimestamp(now.timestamp() // every * every, dt_timezone.utc)
+        minute = timezone.localtime(now).replace(second=0, microsecond=0)
+        return minute if cron.matches(minute) else None
+
+    def tick(self, now=None):
+        """Enqueue every entry whose current slot has no job yet; returns the jobs of the new slots."""
+        now = now or timezone.now()
+        jobs = []
+        for name, (task, entry, cron) in self.entries.items():
+            slot = self.slot(entry, cron, now)
+            if slot is None or self._last_slots.get(name) == slot:
+                continue
+            jobs.append(enqueue(
+                task, entry.get('args', ()), entry.get('kwargs'), entry.get('queue'), entry.get('priority'),
+                run_at=slot, unique_key=f'schedule:{name}:{slot.timestamp():.0f}',
+            ))
+            self._last_slots[name] = slot
+        return jobs
+
+
+# ==================== WORKER ====================
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+class Worker:
+    """
+    Claims due jobs and runs them in a pool of threads or processes.
+
+    Only as many jobs as the pool has free slots are claimed, so the rest
+    stay in the table for other workers. Threads suit jobs that wait on the
+    database or the network; processes suit CPU-bound ones.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, processes=False, queues=None, schedule=True,
+                 poll_interval=JOB_POLL_INTERVAL):
+        self.workers = workers
+        self.processes = processes
+        self.queues = queues or None
+        self.scheduler = Scheduler() if schedule else None
+        self.poll_interval = poll_interval
+        self.name = worker_name()
+        self._stopping = threading.Event()
+
+    def stop(self):
+        """Stop claiming jobs; run() returns once the running ones finish."""
+        self._stopping.set()
+
+    def _pool(self):
+        if self.processes:
+            # Spawned rather than forked: a fork would hand each process the
+            # dispatcher's open database connections.
+            return ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=jobprocess.setup,
+            )
+        return ThreadPoolExecutor(self.workers, thread_name_prefix='job')
+
+    def _submit(self, pool, job):
+        if self.processes:
+            return pool.submit(jobprocess.execute_job, job.name, job.args, job.kwargs)
+        return pool.submit(execute_job, job.name, job.args, job.kwargs)
+
+    def run(self, once=False):
+        """Run jobs until stopped, or with once until none are due; returns how many finished."""
+        requeue_stale_jobs()
+        finished = 0
+        in_flight = {}
+        with self._pool() as pool:
+            while in_flight or not self._stopping.is_set():
+                if not self._stopping.is_set():
+                    if self.scheduler is not None:
+                        self.scheduler.tick()
+                    for job in claim_jobs(self.workers - len(in_flight), self.queues, self.name):
+                        try:
+                            in_flight[self._submit(pool, job)] = job
+                        except BrokenExecutor:
+                            # A pool process died; hand the job back and wind down.
+                            finish_job(job, traceback.format_exc(), retry=True)
+                            self.stop()
+                if not in_flight:
+                    if once:
+                        break
+                    self._stopping.wait(self.poll_interval)
+                    continue
+                done, _pending = wait(in_flight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = in_flight.pop(future)
+                    try:
+                        error, retry = future.result()
+                    except Exception:
+                        # The pool itself broke, e.g. a process was killed.
+                        error, retry = traceback.format_exc(), True
+                    finish_job(job, error, retry)
+                    finished += 1
+        return finished
@@ -0,0 +1,125 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from portal.benchmarks import summarize
+from portal.models import Shipment
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the read-heavy views through the WSGI and the ASGI handler, in process, at several '
+        'concurrency levels. Read-only, but logs a user in, so point it at a benchmark database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Client to request as; defaults to the first organization member.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per handler and concurrency level.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--paths', nargs='+', help='Request these paths instead of the default read views.')
+        parser.add_argument('--uncached', action='store_true', help='Use a dummy cache so every request hits the ORM.')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=options['user']) if options['user'] else User.objects.filter(
+            is_staff=False, membership__isnull=False,
+        )
+        user = users.select_related('membership').order_by('pk').first()
+        if user is None:
+            raise CommandError('No client user to request as.')
+        shipment = Shipment.objects.for_user(user).order_by('-pk').first()
+        urls = [reverse('home'), reverse('client_dashboard'), reverse('shipment_list'), reverse('document_list')]
+        if shipment is not None:
+            urls.append(reverse('shipment_detail', args=[shipment.pk]))
+        urls = options['paths'] or urls
+
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        host = hosts[0] if hosts else 'localhost'
+        client = Client(HTTP_HOST=host)
+        client.force_login(user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        caches = settings.CACHES
+        if options['uncached']:
+            caches = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=caches):
+            self.stdout.write(f'{user.username}: {", ".join(urls)}')
+            for concurrency in options['concurrency']:
+                for name, run in [('wsgi', self.run_wsgi), ('asgi', self.run_asgi)]:
+                    # Warm up caches and connections, untimed.
+                    run(host, cookie, urls, len(urls), concurrency)
+                    started = time.perf_counter()
+                    samples = run(host, cookie, urls, options['requests'], concurrency)
+                    result = summarize(samples, time.perf_counter() - started)
+                    self.stdout.write(
+                        f'{name} x{concurrency:<3} p50 {result["p50_ms"]:7.1f}ms  p95 {result["p95_ms"]:7.1f}ms  '
+                        f'p99 {result["p99_ms"]:7.1f}ms  {result["throughput_rps"]:7.1f} req/s  '
+                        f'errors {result["errors"]}'
+                    )
+
+    def run_wsgi(self, host, cookie, urls, count, concurrency):
+        application = WSGIHandler()
+
+        def get(index):
+            path, _, query = urls[index % len(urls)].partition('?')
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': host,
+                'SERVER_NAME': host, 'HTTP_COOKIE': cookie, 'wsgi.input': io.BytesIO(),
+            }
+            setup_testing_defaults(environ)
+            status = []
+            start = time.perf_counter()
+            response = application(environ, lambda line, headers, exc_info=None: status.append(int(line[:3])))
+            try:
+                for _chunk in response:
+                    pass
+            finally:
+                response.close()
+            return time.perf_counter() - start, 0, status[0]
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(get, range(count)))
+
+    def run_asgi(self, host, cookie, urls, count, concurrency):
+        application = ASGIHandler()
+
+        async def get(index, limit):
+            path, _, query = urls[index % len(urls)].partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+                'root_path': '', 'headers': [(b'host', host.encode()), (b'cookie', cookie.encode())],
+                'client': ('127.0.0.1', 50000), 'server': (host, 80),
+            }
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            status = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # Nobody disconnects; the handler cancels this wait when it is done.
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with limit:
+                start = time.perf_counter()
+                await application(scope, receive, send)
+                return time.perf_counter() - start, 0, status[0]
+
+        async def main():
+            limit = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(get(index, limit) for index in range(count)))
+
+        return asyncio.run(main())
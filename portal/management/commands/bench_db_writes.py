@@ -0,0 +1,100 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from portal.models import Shipment
+
+STATUSES = [value for value, _label in Shipment.STATUS_CHOICES]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test concurrent shipment updates against the configured database profile. '
+        'Rewrites shipment statuses, so run it against a disposable copy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent writer threads.')
+        parser.add_argument('--updates', type=int, default=200, help='Updates per worker.')
+        parser.add_argument('--shipments', type=int, default=1000, help='Spread updates over this many shipments.')
+        parser.add_argument('--user', help='Username recorded as the changer; defaults to the first staff user.')
+
+    def describe_database(self):
+        description = f'profile={getattr(settings, "DB_PROFILE", "sqlite")} vendor={connection.vendor}'
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                for pragma in ['journal_mode', 'synchronous', 'busy_timeout', 'mmap_size']:
+                    cursor.execute(f'PRAGMA {pragma}')
+                    description += f' {pragma}={cursor.fetchone()[0]}'
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SHOW synchronous_commit')
+                description += f' synchronous_commit={cursor.fetchone()[0]}'
+        options = connection.settings_dict.get('OPTIONS', {})
+        return (
+            f'{description} conn_max_age={connection.settings_dict["CONN_MAX_AGE"]} '
+            f'pool={"pool" in options} transaction_mode={options.get("transaction_mode")}'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=options['user']) if options['user'] else User.objects.filter(is_staff=True)
+        user = users.order_by('pk').first()
+        if user is None:
+            raise CommandError('No user to record the updates as.')
+        pks = list(Shipment.objects.order_by('pk').values_list('pk', flat=True)[:options['shipments']])
+        if not pks:
+            raise CommandError('There are no shipments to update.')
+        self.stdout.write(self.describe_database())
+
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            own_latencies, own_errors = [], []
+            try:
+                for _ in range(options['updates']):
+                    start = time.perf_counter()
+                    try:
+                        # Same work as shipment_update: a read, then a save that
+                        # fires the rollup, search, tracking and timeline signals.
+                        with transaction.atomic():
+                            shipment = Shipment.objects.get(pk=rng.choice(pks))
+                            shipment.status = rng.choice([s for s in STATUSES if s != shipment.status])
+                            shipment._changed_by = user
+                            shipment.save()
+                    except OperationalError as exc:
+                        own_errors.append(str(exc))
+                        continue
+                    own_latencies.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(own_latencies)
+                errors.extend(own_errors)
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(options['workers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+
+        def percentile(fraction):
+            return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000 if latencies else 0
+
+        self.stdout.write(
+            f'{len(latencies)} update(s) in {elapsed:.2f}s = {len(latencies) / elapsed:.1f} updates/s; '
+            f'p50 {percentile(0.50):.1f}ms p95 {percentile(0.95):.1f}ms p99 {percentile(0.99):.1f}ms; '
+            f'{len(errors)} error(s)'
+        )
+        for message in sorted(set(errors)):
+            self.stdout.write(f'  {errors.count(message)} x {message}')
@@ -0,0 +1,59 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from portal.models import Document
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure in-process throughput of the document download view for full '
+        'and ranged requests. Network and proxy time are not included.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('document', type=int, help='Primary key of the document to download.')
+        parser.add_argument('--user', required=True, help='Username to download as.')
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--range-size', type=int, default=1024 * 1024, help='Bytes per ranged request.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+            document = Document.objects.get(pk=options['document'])
+        except (User.DoesNotExist, Document.DoesNotExist) as exc:
+            raise CommandError(exc)
+        url = reverse('document_download', args=[document.pk])
+        size = document.file.size
+        login = Client(HTTP_HOST='localhost')
+        login.force_login(user)
+
+        def download(headers):
+            client = Client(HTTP_HOST='localhost')
+            client.cookies = login.cookies
+            try:
+                response = client.get(url, headers=headers)
+                return sum(len(chunk) for chunk in response.streaming_content)
+            finally:
+                connection.close()
+
+        scenarios = [
+            ('full', {}),
+            ('range', {'Range': f'bytes=0-{min(options["range_size"], size) - 1}'}),
+        ]
+        self.stdout.write(f'Document {document.pk}: {size} bytes')
+        for label, headers in scenarios:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                total = sum(pool.map(download, [headers] * options['requests']))
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{label:>6}: {options["requests"] / elapsed:8.1f} req/s '
+                f'{total / elapsed / 1024 / 1024:9.1f} MiB/s over {options["requests"]} requests'
+            )
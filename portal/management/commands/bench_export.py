@@ -0,0 +1,40 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from portal.exports import SHIPMENT_FIELDS, stream_csv, stream_json
+from portal.models import Shipment
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure peak Python memory and time-to-first-byte while streaming the '
+        'shipment export at several row counts. Seed enough shipments first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000', help='Comma-separated row counts.')
+        parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+
+    def handle(self, *args, **options):
+        stream = stream_json if options['format'] == 'json' else stream_csv
+        available = Shipment.objects.count()
+        self.stdout.write(f'{"rows":>10} {"ttfb ms":>9} {"total s":>9} {"peak KiB":>10} {"bytes":>14}')
+        for size in [int(value) for value in options['sizes'].split(',')]:
+            if size > available:
+                self.stderr.write(f'Skipping {size}: only {available} shipments in the database.')
+                continue
+            queryset = Shipment.objects.order_by('-created_at', '-id')[:size]
+            tracemalloc.start()
+            start = time.perf_counter()
+            ttfb = None
+            total_bytes = 0
+            for chunk in stream(queryset, SHIPMENT_FIELDS):
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                total_bytes += len(chunk)
+            elapsed = time.perf_counter() - start
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(f'{size:>10} {ttfb * 1000:>9.1f} {elapsed:>9.2f} {peak / 1024:>10.0f} {total_bytes:>14}')
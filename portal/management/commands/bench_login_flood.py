@@ -0,0 +1,58 @@
+import logging
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        'Flood the login view with wrong passwords from a few addresses, with rate limiting off and on, '
+        'and report the CPU time the process spent. Writes only cache entries.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=150, help='Login attempts per mode.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Attempts in flight at once.')
+        parser.add_argument('--ips', type=int, default=2, help='Distinct attacker addresses.')
+        parser.add_argument('--usernames', type=int, default=50, help='Distinct usernames tried.')
+        parser.add_argument('--modes', nargs='+', choices=['off', 'on'], default=['off', 'on'])
+
+    def handle(self, *args, **options):
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        host = hosts[0] if hosts else 'localhost'
+        url = reverse('login')
+        # Every 429 would otherwise log a warning.
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        for mode in options['modes']:
+            # Fresh addresses and usernames per mode, so earlier runs left no buckets behind.
+            run = random.randrange(256)
+            ips = [f'198.18.{run}.{index + 1}' for index in range(options['ips'])]
+            usernames = [f'flood-{run}-{index}' for index in range(options['usernames'])]
+
+            def attempt(index):
+                client = Client(HTTP_HOST=host)
+                response = client.post(
+                    url, {'username': usernames[index % len(usernames)], 'password': 'not-the-password'},
+                    REMOTE_ADDR=ips[index % len(ips)],
+                )
+                return response.status_code
+
+            with override_settings(RATELIMIT_ENABLED=mode == 'on'):
+                started, cpu_started = time.perf_counter(), time.process_time()
+                with ThreadPoolExecutor(options['concurrency']) as pool:
+                    statuses = Counter(pool.map(attempt, range(options['requests'])))
+                elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+
+            # Every attempt that reached the view hashed a password, whether or not the user exists.
+            hashed = options['requests'] - statuses[429]
+            self.stdout.write(
+                f'limits {mode:<3}  {options["requests"]} attempts in {elapsed:6.1f}s  CPU {cpu:6.1f}s '
+                f'({cpu * 1000 / options["requests"]:6.1f}ms per attempt)  hashed {hashed}  '
+                f'refused {statuses[429]}  statuses {dict(sorted(statuses.items()))}'
+            )
@@ -0,0 +1,41 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from portal.models import Document
+from portal.storage import document_storage
+
+
+class Command(BaseCommand):
+    help = 'Move documents stored before content addressing into deduplicated blob storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many documents would move.')
+
+    def handle(self, *args, **options):
+        storage = document_storage()
+        legacy = Document.objects.exclude(file__startswith='blobs/').order_by('pk')
+        if options['dry_run']:
+            self.stdout.write(f'{legacy.count()} document(s) still use per-upload files.')
+            return
+
+        moved = removed = removed_bytes = missing = 0
+        for document in legacy.iterator(chunk_size=500):
+            old_name = document.file.name
+            if not storage.exists(old_name):
+                missing += 1
+                self.stderr.write(f'Document {document.pk}: {old_name} is missing, skipped.')
+                continue
+            size = storage.size(old_name)
+            with storage.open(old_name, 'rb') as old_file:
+                document.file.name = storage.save(old_name, File(old_file))
+            document.save(update_fields=['file'])
+            moved += 1
+            if not Document.objects.filter(file=old_name).exists():
+                storage.delete(old_name)
+                removed += 1
+                removed_bytes += size
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} document(s), skipped {missing}; '
+            f'removed {removed} per-upload file(s) totalling {removed_bytes} bytes.'
+        ))
@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.imports import IMPORT_CHUNK_SIZE, IMPORTERS, read_rows
+from portal.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Bulk import shipments or trades from a CSV or XLSX file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='Username recorded as owner of the imported rows.')
+        parser.add_argument('--organization', type=int, help='Id of the organization the imported rows belong to.')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist.")
+        organization = None
+        if options['organization'] is not None:
+            try:
+                organization = Organization.objects.get(pk=options['organization'])
+            except Organization.DoesNotExist:
+                raise CommandError(f"Organization {options['organization']} does not exist.")
+
+        with open(options['path'], 'rb') as fileobj:
+            rows = read_rows(fileobj, options['path'])
+            result = IMPORTERS[options['kind']](rows, user, organization, chunk_size=options['chunk_size'])
+
+        for line, messages in result.errors:
+            self.stderr.write(f"Line {line}: {'; '.join(messages)}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} {options["kind"]}, {result.error_count} row(s) rejected.'
+        ))
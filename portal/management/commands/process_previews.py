@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from portal.previews import PREVIEW_WORKERS, preview_backlog, queue_missing_previews, run_preview_pipeline
+
+
+class Command(BaseCommand):
+    help = 'Extract text and first-page thumbnails for uploaded documents in a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep waiting for new uploads until interrupted.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when nothing is pending.')
+        parser.add_argument('--workers', type=int, default=PREVIEW_WORKERS, help='Number of pool processes.')
+        parser.add_argument(
+            '--queue-missing', action='store_true',
+            help='First queue documents uploaded before previews existed.',
+        )
+
+    def handle(self, *args, **options):
+        if options['queue_missing']:
+            self.stdout.write(f'Queued {queue_missing_previews()} document(s).')
+        self.stdout.write(f'{preview_backlog()} preview(s) waiting.')
+        finished = run_preview_pipeline(options['workers'], loop=options['loop'], interval=options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Built {finished} preview(s).'))
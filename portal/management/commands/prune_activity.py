@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from portal.audit import AUDIT_RETENTION_MONTHS, delete_month, expired_months
+from portal.exports import ACTIVITY_FIELDS, stream_csv
+from portal.models import ActivityLog
+
+
+class Command(BaseCommand):
+    help = 'Drop activity log months older than the retention window, optionally archiving each to CSV first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=AUDIT_RETENTION_MONTHS, help='Whole months to keep.')
+        parser.add_argument('--archive-dir', help='Write activity-YYYY-MM.csv here before deleting a month.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed.')
+
+    def handle(self, *args, **options):
+        total = 0
+        for start, end in expired_months(options['months']):
+            label = start.strftime('%Y-%m')
+            in_month = ActivityLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+            if not in_month.exists():
+                continue
+            if options['dry_run']:
+                self.stdout.write(f'{label}: {in_month.count()} event(s) would be removed.')
+                continue
+            if options['archive_dir']:
+                os.makedirs(options['archive_dir'], exist_ok=True)
+                path = os.path.join(options['archive_dir'], f'activity-{label}.csv')
+                with open(path, 'w', newline='') as archive:
+                    archive.writelines(stream_csv(in_month.order_by('timestamp', 'id'), ACTIVITY_FIELDS))
+            deleted = delete_month(start, end)
+            total += deleted
+            self.stdout.write(f'{label}: removed {deleted} event(s).')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Removed {total} activity log event(s).'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from portal.models import DailyShipmentRollup, DailyTradeRollup
+from portal.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily shipment and trade rollup tables from scratch.'
+
+    def handle(self, *args, **options):
+        rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {DailyShipmentRollup.objects.count()} shipment and '
+            f'{DailyTradeRollup.objects.count()} trade rollup rows.'
+        ))
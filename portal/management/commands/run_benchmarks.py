@@ -0,0 +1,61 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.benchmarks import Benchmark, compare
+
+
+class Command(BaseCommand):
+    help = (
+        'Time scripted request scenarios and compare them with a stored baseline; '
+        'exits non-zero on a regression. Writes rows, so run it against a seeded, disposable database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', choices=Benchmark.SCENARIOS, default=Benchmark.SCENARIOS)
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per scenario.')
+        parser.add_argument('--baseline', help='JSON file of per-scenario results to compare with.')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results to --baseline instead.')
+        parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed p95 growth; 0.5 is +50%%.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline needs --baseline PATH.')
+        staff = User.objects.filter(is_staff=True, is_active=True).order_by('pk').first()
+        client_user = User.objects.filter(is_staff=False, is_active=True).order_by('pk').first()
+        if staff is None or client_user is None:
+            raise CommandError('Needs a staff and a non-staff user; run seed_data first.')
+
+        benchmark = Benchmark(staff, client_user)
+        results = {}
+        for scenario in options['scenarios']:
+            results[scenario] = summary = benchmark.run(scenario, options['requests'])
+            if not options['json']:
+                self.stdout.write(
+                    f'{scenario:<24} p50 {summary["p50_ms"]:>7.1f}ms  p95 {summary["p95_ms"]:>7.1f}ms  '
+                    f'p99 {summary["p99_ms"]:>7.1f}ms  {summary["throughput_rps"]:>6.1f} req/s  '
+                    f'queries {summary["mean_queries"]:.1f} (max {summary["max_queries"]})  '
+                    f'errors {summary["errors"]}'
+                )
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+
+        if not options['baseline']:
+            return
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as handle:
+                json.dump(results, handle, indent=2, sort_keys=True)
+                handle.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {options["baseline"]}.'))
+            return
+        try:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+        except FileNotFoundError:
+            raise CommandError(f'No baseline at {options["baseline"]}; create one with --save-baseline.')
+        problems = compare(results, baseline, options['tolerance'])
+        if problems:
+            raise CommandError('Benchmark regressions:\n  ' + '\n  '.join(problems))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
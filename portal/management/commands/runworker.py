@@ -0,0 +1,50 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from portal.jobs import JOB_POLL_INTERVAL, JOB_WORKERS, Worker, queue_depth
+
+
+class Command(BaseCommand):
+    help = 'Run queued and scheduled background jobs in a pool of threads or processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=JOB_WORKERS, help='Jobs to run at the same time.')
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Run jobs in worker processes instead of threads, for CPU-bound tasks.',
+        )
+        parser.add_argument(
+            '--queue', action='append', dest='queues',
+            help='Only take jobs from this queue; may be given more than once.',
+        )
+        parser.add_argument('--once', action='store_true', help='Exit when no job is due instead of waiting.')
+        parser.add_argument('--no-schedule', action='store_true', help='Do not enqueue JOB_SCHEDULE entries.')
+        parser.add_argument('--interval', type=float, default=JOB_POLL_INTERVAL, help='Seconds between polls.')
+        parser.add_argument('--status', action='store_true', help='Print the depth of each queue and exit.')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            depth = queue_depth()
+            if not depth:
+                self.stdout.write('No unfinished jobs.')
+            for queue, counts in depth.items():
+                self.stdout.write(
+                    f'{queue}: {counts["due"]} due, {counts["scheduled"]} scheduled, {counts["running"]} running, '
+                    f'{counts["failed"]} failed, oldest due job waiting {counts["lag"]:.0f}s'
+                )
+            return
+
+        worker = Worker(
+            options['workers'], processes=options['processes'], queues=options['queues'],
+            schedule=not options['no_schedule'], poll_interval=options['interval'],
+        )
+        # Finish the jobs in hand on Ctrl-C or a deploy's SIGTERM, rather than
+        # leaving them to be requeued after JOB_CLAIM_TIMEOUT.
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_args: worker.stop())
+        pool = 'process(es)' if options['processes'] else 'thread(s)'
+        queues = ', '.join(options['queues'] or ['all queues'])
+        self.stdout.write(f'Worker {worker.name} running {options["workers"]} {pool} on {queues}.')
+        finished = worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f'Finished {finished} job(s).'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from portal.benchmarks import SEED_PASSWORD, seed
+
+
+class Command(BaseCommand):
+    help = 'Bulk-insert synthetic users, shipments, trades, documents and activity events for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--shipments', type=int, default=10000)
+        parser.add_argument('--trades', type=int, default=5000)
+        parser.add_argument('--documents', type=int, default=100)
+        parser.add_argument('--activities', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for repeatable data shapes.')
+
+    def handle(self, *args, **options):
+        run = seed(
+            users=options['users'], shipments=options['shipments'], trades=options['trades'],
+            documents=options['documents'], activities=options['activities'], rng_seed=options['seed'],
+            log=lambda message: self.stdout.write(f'  {message}'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded run {run}; users are bench-{run}-N with password "{SEED_PASSWORD}".'
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal.outbox import OUTBOX_BATCH_SIZE, dispatch_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued emails from the outbox, once or continuously.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox until interrupted.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when the outbox is empty.')
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            sent = dispatch_outbox(options['batch_size'])
+            if sent:
+                self.stdout.write(f'Sent {sent} email(s).')
+            if not options['loop']:
+                break
+            if sent < options['batch_size']:
+                time.sleep(options['interval'])
@@ -0,0 +1,211 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from .caching import cache_stats
+from .jobs import queue_depth
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024, 100 * 1024 * 1024)
+
+# The per-request collector, set by MetricsMiddleware; None outside a request.
+current_request = contextvars.ContextVar('portal_metrics_request', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {_format_number(value)}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observing is a bisect and three additions under a lock."""
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for label_values, counts, total, count in sorted(series, key=lambda item: item[0]):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, label_values, [('le', _format_number(bound))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {_format_number(total)}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+requests_total = Counter(
+    'portal_requests_total', 'Requests handled, by view, method and status code.', ('view', 'method', 'status'),
+)
+request_duration = Histogram(
+    'portal_request_duration_seconds', 'Time spent producing each response.', LATENCY_BUCKETS, ('view',),
+)
+request_queries = Histogram(
+    'portal_request_queries', 'SQL queries run per request.', QUERY_COUNT_BUCKETS, ('view',),
+)
+request_query_duration = Histogram(
+    'portal_request_query_seconds', 'Total SQL time per request.', LATENCY_BUCKETS, ('view',),
+)
+template_render_duration = Histogram(
+    'portal_template_render_seconds', 'Template render time per request.', LATENCY_BUCKETS, ('view',),
+)
+response_size = Histogram(
+    'portal_response_size_bytes', 'Response body size, when known up front.', SIZE_BUCKETS, ('view',),
+)
+ratelimited_requests = Counter(
+    'portal_ratelimited_requests_total', 'Requests refused with 429 by portal.ratelimit, by scope.', ('scope',),
+)
+
+REGISTRY = [
+    requests_total, request_duration, request_queries, request_query_duration,
+    template_render_duration, response_size, ratelimited_requests,
+]
+
+
+def _cache_lookup_lines():
+    # Read from the counters portal.caching already keeps, not duplicated here.
+    yield '# HELP portal_cache_lookups_total View and fragment cache lookups, by outcome.'
+    yield '# TYPE portal_cache_lookups_total counter'
+    for name, counts in cache_stats().items():
+        for outcome, value in [('hit', counts['hits']), ('miss', counts['misses'])]:
+            yield f'portal_cache_lookups_total{_format_labels(("cache", "outcome"), (name, outcome))} {value}'
+
+
+def _job_queue_lines():
+    # Read from the job table in one grouped query, so every web process reports the same numbers.
+    depth = queue_depth()
+    yield '# HELP portal_job_queue_depth Unfinished background jobs, by queue and state.'
+    yield '# TYPE portal_job_queue_depth gauge'
+    for queue, counts in depth.items():
+        for state in ('due', 'scheduled', 'running', 'failed'):
+            yield f'portal_job_queue_depth{_format_labels(("queue", "state"), (queue, state))} {counts[state]}'
+    yield '# HELP portal_job_queue_lag_seconds How long the oldest due job of each queue has waited.'
+    yield '# TYPE portal_job_queue_lag_seconds gauge'
+    for queue, counts in depth.items():
+        yield f'portal_job_queue_lag_seconds{_format_labels(("queue",), (queue,))} {_format_number(counts["lag"])}'
+
+
+def render_metrics():
+    """All metrics of this process, and the job queue, in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    lines.extend(_cache_lookup_lines())
+    lines.extend(_job_queue_lines())
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+    """What one request spent, filled in by the SQL wrapper and the template backend."""
+
+    def __init__(self, keep_sql=False):
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.keep_sql = keep_sql
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # Execute wrapper hook: time every statement of the request.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.query_time += elapsed
+            if self.keep_sql:
+                self.statements.append((elapsed, sql))
+
+
+def record_query(execute, sql, params, many, context):
+    # Installed on every connection, so a statement is charged to the request
+    # whose context issued it, also when the async ORM runs it on a worker thread.
+    collector = current_request.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    return collector(execute, sql, params, many, context)
+
+
+def instrument_connection(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        collector = current_request.get()
+        if collector is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            collector.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render for the metrics middleware."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
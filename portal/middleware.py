@@ -0,0 +1,103 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+slow_request_logger = logging.getLogger('portal.slow_requests')
+
+# Any other verb a client sends is counted as 'other', so it cannot add series.
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def slow_request_ms():
+    """
+    METRICS_SLOW_REQUEST_MS: log requests slower than this many milliseconds
+    with their slowest SQL; None disables. Read per request, like the rate
+    limits, so override_settings applies.
+    """
+    return getattr(settings, 'METRICS_SLOW_REQUEST_MS', None)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, SQL count and time, template time and response size per view.
+
+    Goes first in MIDDLEWARE so the timings cover the rest of the stack. The
+    figures are aggregated in this process and served by the metrics view.
+    Streaming responses are timed up to the first byte only. Works in both
+    modes: under ASGI a sync-only middleware would push every request through
+    one thread, and async views would gain nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        collector = metrics.RequestMetrics(keep_sql=slow_request_ms() is not None)
+        token = metrics.current_request.set(collector)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        self.record(request, response, collector, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        collector = metrics.RequestMetrics(keep_sql=slow_request_ms() is not None)
+        token = metrics.current_request.set(collector)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        self.record(request, response, collector, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, collector, elapsed):
+        # Label by URL name, never by path, so 404 probes cannot add series.
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        metrics.requests_total.inc(view, method, response.status_code)
+        metrics.request_duration.observe(elapsed, view)
+        metrics.request_queries.observe(collector.queries, view)
+        metrics.request_query_duration.observe(collector.query_time, view)
+        if collector.template_time:
+            metrics.template_render_duration.observe(collector.template_time, view)
+        size = self.response_size(response)
+        if size is not None:
+            metrics.response_size.observe(size, view)
+
+        threshold = slow_request_ms()
+        if threshold is not None and collector.keep_sql and elapsed * 1000 >= threshold:
+            self.log_slow_request(request, view, elapsed, collector)
+
+    def response_size(self, response):
+        if response.has_header('Content-Length'):
+            return int(response['Content-Length'])
+        if not response.streaming:
+            return len(response.content)
+        return None
+
+    def log_slow_request(self, request, view, elapsed, collector):
+        limit = getattr(settings, 'METRICS_SLOW_SQL_LIMIT', 5)
+        slowest = sorted(collector.statements, reverse=True)[:limit]
+        lines = [f'  {duration * 1000:.1f}ms {sql}' for duration, sql in slowest]
+        slow_request_logger.warning(
+            'Slow request %s %s (%s): %.0fms, %s queries in %.0fms, templates %.0fms\n%s',
+            request.method, request.get_full_path(), view, elapsed * 1000,
+            collector.queries, collector.query_time * 1000, collector.template_time * 1000,
+            '\n'.join(lines),
+        )
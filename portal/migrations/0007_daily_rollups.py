@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:05
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    # Seed the buckets from existing rows, as portal.rollups.rebuild_rollups does,
+    # so the signal handlers' deltas start from the right totals.
+    Shipment = apps.get_model('portal', 'Shipment')
+    Trade = apps.get_model('portal', 'Trade')
+    DailyShipmentRollup = apps.get_model('portal', 'DailyShipmentRollup')
+    DailyTradeRollup = apps.get_model('portal', 'DailyTradeRollup')
+    shipment_rows = (
+        Shipment.objects.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'shipment_type', 'status')
+        .annotate(shipment_count=Count('id'), revenue=Sum('price'))
+    )
+    DailyShipmentRollup.objects.bulk_create(
+        [DailyShipmentRollup(**row) for row in shipment_rows], batch_size=1000
+    )
+    revenue = ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=16, decimal_places=2))
+    trade_rows = (
+        Trade.objects.order_by()
+        .values(day=F('date'))
+        .annotate(trade_count=Count('id'), revenue=Sum(revenue))
+    )
+    DailyTradeRollup.objects.bulk_create(
+        [DailyTradeRollup(**row) for row in trade_rows], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0006_shipment_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTradeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('trade_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyShipmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('shipment_type', models.CharField(choices=[('import', 'Import'), ('export', 'Export')], max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_transit', 'In Transit'), ('customs', 'Customs Clearance'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('shipment_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'shipment_type', 'status'), name='unique_shipment_rollup_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_status_events(apps, schema_editor):
+    # Seed each existing shipment's timeline with its current status.
+    Shipment = apps.get_model('portal', 'Shipment')
+    ShipmentStatusEvent = apps.get_model('portal', 'ShipmentStatusEvent')
+    batch = []
+    for shipment in Shipment.objects.order_by('pk').iterator(chunk_size=2000):
+        batch.append(ShipmentStatusEvent(
+            shipment_id=shipment.pk,
+            to_status=shipment.status,
+            changed_at=shipment.created_at,
+            changed_by_id=shipment.created_by_id,
+            origin=shipment.origin,
+            destination=shipment.destination,
+        ))
+        if len(batch) >= 2000:
+            ShipmentStatusEvent.objects.bulk_create(batch)
+            batch = []
+    ShipmentStatusEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0010_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('pending', 'Pending'), ('in_transit', 'In Transit'), ('customs', 'Customs Clearance'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('to_status', models.CharField(choices=[('pending', 'Pending'), ('in_transit', 'In Transit'), ('customs', 'Customs Clearance'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('left_at', models.DateTimeField(blank=True, null=True)),
+                ('origin', models.CharField(max_length=200)),
+                ('destination', models.CharField(max_length=200)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('shipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='portal.shipment')),
+            ],
+            options={
+                'ordering': ['changed_at', 'id'],
+                'indexes': [models.Index(fields=['shipment', 'changed_at'], name='status_event_timeline_idx'), models.Index(fields=['to_status', 'origin', 'destination', 'changed_at', 'left_at'], name='status_event_dwell_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_status_events, migrations.RunPython.noop),
+    ]
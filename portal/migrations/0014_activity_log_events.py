@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:25
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_user_activity(apps, schema_editor):
+    # UserActivity duplicated ActivityLog and was never written by the app;
+    # keep any rows that exist before the table goes away.
+    UserActivity = apps.get_model('portal', 'UserActivity')
+    ActivityLog = apps.get_model('portal', 'ActivityLog')
+    ActivityLog.objects.bulk_create(
+        [
+            ActivityLog(user_id=row.user_id, action=row.action, timestamp=row.timestamp)
+            for row in UserActivity.objects.iterator(chunk_size=2000)
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0013_document_preview'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='target_id',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='activitylog',
+            name='target_type',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='activitylog',
+            name='verb',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='activitylog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['-timestamp'], name='activity_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['target_type', 'target_id', 'timestamp'], name='activity_target_idx'),
+        ),
+        migrations.RunPython(merge_user_activity, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='UserActivity',
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+
+
+def backfill_product_rollups(apps, schema_editor):
+    Trade = apps.get_model('portal', 'Trade')
+    DailyProductTradeRollup = apps.get_model('portal', 'DailyProductTradeRollup')
+    revenue = ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=16, decimal_places=2))
+    rows = (
+        Trade.objects.order_by()
+        .values('product', day=F('date'))
+        .annotate(trade_count=Count('id'), volume=Sum('quantity'), revenue=Sum(revenue))
+    )
+    DailyProductTradeRollup.objects.bulk_create(
+        [DailyProductTradeRollup(**row) for row in rows], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0014_activity_log_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductTradeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('product', models.CharField(max_length=200)),
+                ('trade_count', models.IntegerField(default=0)),
+                ('volume', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['product', 'date'], name='trade_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyproducttraderollup',
+            index=models.Index(fields=['product', 'day'], name='product_rollup_product_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproducttraderollup',
+            constraint=models.UniqueConstraint(fields=('day', 'product'), name='unique_product_trade_rollup_bucket'),
+        ),
+        migrations.RunPython(backfill_product_rollups, migrations.RunPython.noop),
+    ]
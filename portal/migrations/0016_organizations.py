@@ -0,0 +1,80 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def assign_organizations(apps, schema_editor):
+    """Give every existing client an organization of their own and file their rows under it."""
+    User = apps.get_model('auth', 'User')
+    Organization = apps.get_model('portal', 'Organization')
+    Membership = apps.get_model('portal', 'Membership')
+    for user in User.objects.filter(is_staff=False).order_by('pk').iterator():
+        organization = Organization.objects.create(name=user.username)
+        Membership.objects.create(user=user, organization=organization)
+    for model_name, owner in [('Shipment', 'created_by'), ('Document', 'uploaded_by'), ('Trade', 'user')]:
+        owned = Membership.objects.filter(user_id=OuterRef(f'{owner}_id')).values('organization_id')[:1]
+        apps.get_model('portal', model_name).objects.filter(**{f'{owner}__is_staff': False}).update(
+            organization_id=Subquery(owned),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0015_trade_analytics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Organization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Membership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='membership', to=settings.AUTH_USER_MODEL)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='portal.organization')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='organization',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='portal.organization'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='organization',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='portal.organization'),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='organization',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='portal.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['organization', '-uploaded_at'], name='document_org_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['organization', '-created_at', '-id'], name='shipment_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['organization', 'status', '-created_at', '-id'], name='shipment_org_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['organization', 'date'], name='trade_org_date_idx'),
+        ),
+        migrations.RunPython(assign_organizations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# rowid = pk * 4 + kind code, as in portal.search: shipments are 0, documents 1.
+SHIPMENT_ROWS = (
+    "SELECT id * 4, tracking_number, origin || ' ' || destination, description{organization} "
+    "FROM portal_shipment"
+)
+DOCUMENT_ROWS = (
+    "SELECT d.id * 4 + 1, '', d.title, d.description || ' ' || COALESCE(p.text, ''){organization} "
+    "FROM portal_document d LEFT JOIN portal_documentpreview p ON p.document_id = d.id"
+)
+
+
+def _recreate(schema_editor, with_organization):
+    schema_editor.execute('DROP TABLE IF EXISTS portal_search')
+    columns = 'tracking, title, body' + (', organization UNINDEXED' if with_organization else '')
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE portal_search USING fts5({columns}, tokenize='unicode61', prefix='2 3 4')"
+    )
+    insert = 'INSERT INTO portal_search (rowid, tracking, title, body{organization}) '
+    for rows, prefix in [(SHIPMENT_ROWS, ''), (DOCUMENT_ROWS, 'd.')]:
+        schema_editor.execute(
+            insert.format(organization=', organization' if with_organization else '')
+            + rows.format(organization=f', {prefix}organization_id' if with_organization else '')
+        )
+
+
+def add_organization_column(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        _recreate(schema_editor, True)
+
+
+def drop_organization_column(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        _recreate(schema_editor, False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0017_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_organization_column, drop_organization_column),
+    ]
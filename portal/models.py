@@ -1,5 +1,49 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .storage import document_storage
+
+
+class Organization(models.Model):
+    """A client company; its members see only its shipments, documents and trades."""
+    name = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Membership(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='membership')
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='memberships')
+
+    def __str__(self):
+        return f'{self.user} @ {self.organization}'
+
+
+class TenantQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """
+        Rows user may see: everything for staff, their organization's rows for
+        members, nothing for anyone else.
+
+        Reads user.membership, which portal.backends loads with the user, so
+        scoping costs no query of its own. Rows without an organization are
+        staff-only.
+        """
+        if user.is_staff:
+            return self
+        try:
+            organization_id = user.membership.organization_id
+        except Membership.DoesNotExist:
+            return self.none()
+        return self.filter(organization_id=organization_id)
+
+
+TenantManager = models.Manager.from_queryset(TenantQuerySet)
 
 
 class Document(models.Model):
@@ -10,16 +54,20 @@ class Document(models.Model):
 
     title = models.CharField(max_length=200)
     document_type = models.CharField(max_length=10, choices=DOCUMENT_TYPES)
-    file = models.FileField(upload_to='documents/%Y/%m/%d/')
+    file = models.FileField(upload_to='documents/%Y/%m/%d/', storage=document_storage)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     description = models.TextField(blank=True)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True)
+
+    objects = TenantManager()
 
     def __str__(self):
         return f"{self.title} - {self.get_document_type_display()}"
 
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [models.Index(fields=['organization', '-uploaded_at'], name='document_org_uploaded_idx')]
 
 # Create your models here.
 class Shipment(models.Model):
@@ -47,12 +95,32 @@ class Shipment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     estimated_delivery = models.DateField()
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True)
+
+    objects = TenantManager()
     
     def __str__(self):
         return f"{self.tracking_number} - {self.get_status_display()}"
+
+    @property
+    def version(self):
+        """Token clients send back with a change; a different updated_at means someone else saved first."""
+        return self.updated_at.isoformat()
     
     class Meta:
         ordering = ['-created_at']
+        # One index per shipment_list filter, each ending in the keyset
+        # (created_at, id) so filtered pages are served by an index seek.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='shipment_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='shipment_status_created_idx'),
+            models.Index(fields=['shipment_type', '-created_at', '-id'], name='shipment_type_created_idx'),
+            models.Index(fields=['origin', '-created_at', '-id'], name='shipment_origin_created_idx'),
+            models.Index(fields=['destination', '-created_at', '-id'], name='shipment_dest_created_idx'),
+            # Tenant-scoped lists and dashboards lead with the organization.
+            models.Index(fields=['organization', '-created_at', '-id'], name='shipment_org_created_idx'),
+            models.Index(fields=['organization', 'status', '-created_at', '-id'], name='shipment_org_status_idx'),
+        ]
 class Trade(models.Model):
         user = models.ForeignKey(User, on_delete=models.CASCADE)
         product = models.CharField(max_length=200)
@@ -60,18 +128,234 @@ class Trade(models.Model):
         price = models.DecimalField(max_digits=10, decimal_places=2)
         date = models.DateField()
         created_at = models.DateTimeField(auto_now_add=True)
+        organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True)
+
+        objects = TenantManager()
 
         def __str__(self):
             return f"{self.product} ({self.quantity}) - {self.user.username}"
+
+        class Meta:
+            # Per-product analytics read one product over a date range.
+            indexes = [
+                models.Index(fields=['product', 'date'], name='trade_product_date_idx'),
+                models.Index(fields=['organization', 'date'], name='trade_org_date_idx'),
+            ]
+
 class ActivityLog(models.Model):
+    """One audit event: who did what to which object. Written in batches by portal.audit."""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     action = models.CharField(max_length=255)
-    timestamp=models.DateTimeField(auto_now_add=True)
+    verb = models.CharField(max_length=32, blank=True)
+    target_type = models.CharField(max_length=64, blank=True)
+    target_id = models.CharField(max_length=64, blank=True)
+    # Set when the event happens, not when its batch is flushed.
+    timestamp = models.DateTimeField(default=timezone.now)
+
     def __str__(self):
         return f'{self.user.username}-{self.action} at {self.timestamp}'
 
-class UserActivity(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['-timestamp'], name='activity_recent_idx'),
+            models.Index(fields=['target_type', 'target_id', 'timestamp'], name='activity_target_idx'),
+        ]
+
+
+class DailyShipmentRollup(models.Model):
+    day = models.DateField()
+    shipment_type = models.CharField(max_length=10, choices=Shipment.SHIPMENT_TYPE)
+    status = models.CharField(max_length=20, choices=Shipment.STATUS_CHOICES)
+    shipment_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.day} {self.shipment_type}/{self.status}: {self.shipment_count}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'shipment_type', 'status'], name='unique_shipment_rollup_bucket'),
+        ]
+
+
+class DailyTradeRollup(models.Model):
+    day = models.DateField(unique=True)
+    trade_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.day}: {self.trade_count}'
+
+
+class DailyProductTradeRollup(models.Model):
+    """Trades per product per day, so trade analytics never scan the Trade table."""
+    day = models.DateField()
+    product = models.CharField(max_length=200)
+    trade_count = models.IntegerField(default=0)
+    volume = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.day} {self.product}: {self.trade_count}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='unique_product_trade_rollup_bucket'),
+        ]
+        indexes = [models.Index(fields=['product', 'day'], name='product_rollup_product_day_idx')]
+
+
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.recipients)} ({self.status})'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+
+class ShipmentStatusEvent(models.Model):
+    shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name='status_events')
+    from_status = models.CharField(max_length=20, choices=Shipment.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Shipment.STATUS_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+    # Set when the shipment leaves to_status, so dwell time is left_at - changed_at.
+    left_at = models.DateTimeField(null=True, blank=True)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    # Route copied from the shipment so dwell times can be grouped without a join.
+    origin = models.CharField(max_length=200)
+    destination = models.CharField(max_length=200)
+
+    def __str__(self):
+        return f'{self.shipment_id}: {self.from_status or "new"} -> {self.to_status} at {self.changed_at}'
+
+    class Meta:
+        ordering = ['changed_at', 'id']
+        indexes = [
+            models.Index(fields=['shipment', 'changed_at'], name='status_event_timeline_idx'),
+            # Covers the dwell-time aggregation, so it never reads the table.
+            models.Index(
+                fields=['to_status', 'origin', 'destination', 'changed_at', 'left_at'],
+                name='status_event_dwell_idx',
+            ),
+        ]
+
+
+class Blob(models.Model):
+    """One stored file in content-addressed storage, shared by every Document that uses it."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count} refs)'
+
+
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    action = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.filename} ({self.received}/{self.total_size} bytes)'
 
+    @property
+    def is_complete(self):
+        return self.received >= self.total_size
+
+
+class DocumentPreview(models.Model):
+    """Text and first-page thumbnail extracted from a Document's file in the background."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+        ('unsupported', 'Unsupported'),
+    ]
+
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='preview')
+    file_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='pending')
+    text = models.TextField(blank=True)
+    page_count = models.PositiveIntegerField(default=0)
+    thumbnail = models.BinaryField(blank=True, default=b'')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Preview of {self.file_name} ({self.status})'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='preview_queue_idx'),
+            models.Index(fields=['file_name', 'status'], name='preview_file_idx'),
+        ]
+
+    @property
+    def has_thumbnail(self):
+        return self.status == 'ready' and self.page_count > 0
+
+
+class Job(models.Model):
+    """A call to a portal.jobs task, waiting for or run by manage.py runworker."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)
+    queue = models.CharField(max_length=50, default='default')
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    # Higher runs first among jobs that are due.
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # Set for jobs that must be enqueued at most once, such as one slot of a schedule.
+    unique_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.name} on {self.queue} ({self.status})'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'queue', '-priority', 'run_at'], name='job_due_idx'),
+            models.Index(fields=['status', 'finished_at'], name='job_finished_idx'),
+        ]
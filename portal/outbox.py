@@ -0,0 +1,120 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+OUTBOX_RETRY_BACKOFF = getattr(settings, 'OUTBOX_RETRY_BACKOFF', 30)
+# Seconds after which a batch claimed by a dispatcher that never finished it
+# may be claimed again; longer than any batch should take to send.
+OUTBOX_CLAIM_TIMEOUT = getattr(settings, 'OUTBOX_CLAIM_TIMEOUT', 600)
+
+
+def enqueue_mail(subject, body, recipients, from_email=None):
+    """Queue an email for the dispatcher instead of talking to SMTP in the request."""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or '',
+        recipients=[address for address in recipients if address],
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 30s, 60s, 120s, ... with the default base."""
+    return timedelta(seconds=OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def claim_outbox(batch_size, now):
+    """
+    Mark up to batch_size due emails as sending and return them, so a
+    dispatcher running at the same time picks different ones.
+
+    Emails claimed more than OUTBOX_CLAIM_TIMEOUT seconds ago by a dispatcher
+    that stopped are due again.
+    """
+    stale = now - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        pks = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', claimed_at__lt=stale))
+            .order_by('next_attempt_at', 'id')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return []
+        OutboundEmail.objects.filter(pk__in=pks).update(status='sending', claimed_at=now)
+    return list(OutboundEmail.objects.filter(pk__in=pks).order_by('next_attempt_at', 'id'))
+
+
+def dispatch_outbox(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Claim one batch of due emails and send it over a single reused mail
+    connection. Returns the number of messages sent.
+
+    Dispatchers may overlap, as when a scheduled slot starts while the last
+    one is still sending; each sends only the batch it claimed.
+    """
+    now = timezone.now()
+    batch = claim_outbox(batch_size, now)
+    if not batch:
+        return 0
+
+    sent = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        logger.warning('Outbox could not connect to the mail server: %s', exc)
+        for email in batch:
+            _record_failure(email, exc, now)
+        OutboundEmail.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at', 'last_error'])
+        return 0
+
+    try:
+        for email in batch:
+            if not email.recipients:
+                email.status = 'failed'
+                email.last_error = 'No recipients'
+                continue
+            message = EmailMessage(
+                email.subject,
+                email.body,
+                email.from_email or None,
+                email.recipients,
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as exc:
+                logger.warning('Outbox failed to send email %s: %s', email.pk, exc)
+                _record_failure(email, exc, now)
+            else:
+                email.status = 'sent'
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                sent += 1
+    finally:
+        connection.close()
+
+    OutboundEmail.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return sent
+
+
+def _record_failure(email, exc, now):
+    email.attempts += 1
+    email.last_error = str(exc)
+    if email.attempts >= OUTBOX_MAX_ATTEMPTS:
+        email.status = 'failed'
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = now + retry_delay(email.attempts)
@@ -0,0 +1,73 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(created_at, pk):
+    raw = f'{created_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Return the (created_at, pk) pair stored in a cursor, or None if it is
+    malformed. Cursors always carry an offset; one without was not made here.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, pk = raw.split('|')
+        created_at, pk = datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if created_at.tzinfo is None:
+        return None
+    return created_at, pk
+
+
+def _page_queryset(queryset, cursor, page_size):
+    queryset = queryset.order_by('-created_at', '-id')
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    return queryset[:page_size + 1]
+
+
+def _make_page(items, page_size):
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.pk)
+    return KeysetPage(items, next_cursor)
+
+
+def keyset_page(queryset, cursor, page_size):
+    """
+    Return the page of queryset after the cursor, newest first.
+
+    Each page is read with an index seek on (created_at, id), so deep pages
+    cost the same as the first one, unlike OFFSET.
+    """
+    return _make_page(list(_page_queryset(queryset, cursor, page_size)), page_size)
+
+
+async def akeyset_page(queryset, cursor, page_size):
+    """keyset_page() for async views."""
+    return _make_page([item async for item in _page_queryset(queryset, cursor, page_size)], page_size)
@@ -0,0 +1,229 @@
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Document, DocumentPreview
+from .search import get_backend
+from .storage import document_storage
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_WORKERS = getattr(settings, 'PREVIEW_WORKERS', max(1, (os.cpu_count() or 2) // 2))
+PREVIEW_NICENESS = getattr(settings, 'PREVIEW_NICENESS', 10)
+PREVIEW_MAX_ATTEMPTS = getattr(settings, 'PREVIEW_MAX_ATTEMPTS', 3)
+PREVIEW_CLAIM_TIMEOUT = getattr(settings, 'PREVIEW_CLAIM_TIMEOUT', 600)
+PREVIEW_TEXT_LIMIT = getattr(settings, 'PREVIEW_TEXT_LIMIT', 20000)
+PREVIEW_THUMBNAIL_WIDTH = getattr(settings, 'PREVIEW_THUMBNAIL_WIDTH', 160)
+
+# PyMuPDF opens PDFs and scanned images alike; plain text is read directly.
+RENDERED_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg', '.tif', '.tiff'}
+TEXT_EXTENSIONS = {'.txt', '.csv'}
+
+
+class UnreadableDocument(Exception):
+    """The file is damaged or not really of its type; retrying will not help."""
+
+
+def is_supported(file_name):
+    extension = os.path.splitext(file_name)[1].lower()
+    return extension in RENDERED_EXTENSIONS or extension in TEXT_EXTENSIONS
+
+
+def queue_preview(document):
+    """Mark a document's preview as due. Called on save, so it only writes one row."""
+    status = 'pending' if is_supported(document.file.name) else 'unsupported'
+    DocumentPreview.objects.update_or_create(
+        document=document,
+        defaults={
+            'file_name': document.file.name,
+            'status': status,
+            'text': '',
+            'page_count': 0,
+            'thumbnail': b'',
+            'attempts': 0,
+            'last_error': '',
+            'claimed_at': None,
+        },
+    )
+
+
+def queue_missing_previews():
+    """Queue every document that has no preview yet; returns how many were queued."""
+    queued = 0
+    for document in Document.objects.filter(preview__isnull=True).only('file').iterator(chunk_size=500):
+        queue_preview(document)
+        queued += 1
+    return queued
+
+
+def preview_backlog():
+    return DocumentPreview.objects.filter(status__in=['pending', 'processing']).count()
+
+
+def extract_preview(path, text_limit=PREVIEW_TEXT_LIMIT, thumbnail_width=PREVIEW_THUMBNAIL_WIDTH):
+    """
+    Return (text, page_count, thumbnail_jpeg) for the file at path.
+
+    Runs in a pool process, so it touches only the file and never the database.
+    Text stops after text_limit characters instead of walking every page.
+    """
+    if os.path.splitext(path)[1].lower() in TEXT_EXTENSIONS:
+        with open(path, encoding='utf-8', errors='replace') as handle:
+            return handle.read(text_limit), 0, b''
+
+    import pymupdf
+
+    try:
+        pdf = pymupdf.open(path)
+    except pymupdf.FileDataError as exc:
+        raise UnreadableDocument(str(exc)) from None
+    with pdf:
+        parts, length = [], 0
+        for page in pdf:
+            text = page.get_text()
+            parts.append(text)
+            length += len(text)
+            if length >= text_limit:
+                break
+        thumbnail = b''
+        if pdf.page_count:
+            first = pdf[0]
+            zoom = thumbnail_width / first.rect.width
+            pixmap = first.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+            thumbnail = pixmap.tobytes('jpeg', jpg_quality=75)
+        return ''.join(parts)[:text_limit], pdf.page_count, thumbnail
+
+
+def requeue_stale_previews(timeout=PREVIEW_CLAIM_TIMEOUT):
+    """Give previews claimed by a worker that died back to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return DocumentPreview.objects.filter(status='processing', claimed_at__lt=cutoff).update(status='pending')
+
+
+def claim_previews(limit):
+    """Move up to limit pending previews to processing and return them."""
+    if limit <= 0:
+        return []
+    pks = list(
+        DocumentPreview.objects.filter(status='pending')
+        .order_by('updated_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+    if not pks:
+        return []
+    now = timezone.now()
+    DocumentPreview.objects.filter(pk__in=pks, status='pending').update(
+        status='processing', claimed_at=now, attempts=F('attempts') + 1
+    )
+    return list(
+        DocumentPreview.objects.filter(pk__in=pks, status='processing', claimed_at=now)
+        .only('document_id', 'file_name', 'attempts')
+    )
+
+
+def copy_existing_preview(preview):
+    """Reuse the result for an identical file; content-addressed names make this common."""
+    source = (
+        DocumentPreview.objects.filter(file_name=preview.file_name, status='ready')
+        .exclude(pk=preview.pk)
+        .values('text', 'page_count', 'thumbnail')
+        .first()
+    )
+    if source is None:
+        return False
+    store_preview(preview, source['text'], source['page_count'], bytes(source['thumbnail']))
+    return True
+
+
+def store_preview(preview, text, page_count, thumbnail):
+    # A new file may have been queued while this one was processing; its
+    # file_name no longer matches and the stale result is dropped.
+    updated = DocumentPreview.objects.filter(
+        pk=preview.pk, file_name=preview.file_name, status='processing'
+    ).update(
+        status='ready', text=text, page_count=page_count, thumbnail=thumbnail,
+        last_error='', updated_at=timezone.now(),
+    )
+    if updated:
+        document = Document.objects.select_related('preview').filter(pk=preview.document_id).first()
+        if document is not None:
+            get_backend().index(document)
+    return bool(updated)
+
+
+def record_preview_failure(preview, error, permanent=False):
+    status = 'failed' if permanent or preview.attempts >= PREVIEW_MAX_ATTEMPTS else 'pending'
+    DocumentPreview.objects.filter(
+        pk=preview.pk, file_name=preview.file_name, status='processing'
+    ).update(status=status, last_error=error[:2000], updated_at=timezone.now())
+    logger.warning('Preview of %s failed (attempt %s): %s', preview.file_name, preview.attempts, error)
+
+
+def _lower_priority():
+    # Pool processes yield the CPU to web workers on the same host.
+    if PREVIEW_NICENESS and hasattr(os, 'nice'):
+        os.nice(PREVIEW_NICENESS)
+
+
+def run_preview_pipeline(workers=PREVIEW_WORKERS, loop=False, interval=5.0):
+    """
+    Build pending previews in a pool of worker processes; returns how many finished.
+
+    At most workers * 2 previews are claimed at a time, so a burst of uploads
+    waits in the table rather than in memory, and the rest stay claimable by
+    another pipeline. Web requests only ever write the pending row.
+    """
+    max_in_flight = workers * 2
+    requeue_stale_previews()
+    # Pool processes are forked; they must not share the parent's connections.
+    connections.close_all()
+    storage = document_storage()
+    finished = 0
+    in_flight = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_lower_priority) as pool:
+        while True:
+            for preview in claim_previews(max_in_flight - len(in_flight)):
+                if copy_existing_preview(preview):
+                    finished += 1
+                    continue
+                path = storage.path(preview.file_name)
+                in_flight[pool.submit(extract_preview, path)] = preview
+            if not in_flight:
+                if not loop:
+                    break
+                time.sleep(interval)
+                continue
+            done, _pending = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                preview = in_flight.pop(future)
+                try:
+                    text, page_count, thumbnail = future.result()
+                except UnreadableDocument as exc:
+                    record_preview_failure(preview, str(exc), permanent=True)
+                except Exception as exc:
+                    record_preview_failure(preview, f'{type(exc).__name__}: {exc}')
+                else:
+                    finished += store_preview(preview, text, page_count, thumbnail)
+    return finished
+
+
+def text_snippet(text, query, width=160):
+    """A short excerpt of text around the first query word it contains."""
+    lowered = text.lower()
+    position = -1
+    for word in query.lower().split():
+        position = lowered.find(word)
+        if position >= 0:
+            break
+    if position < 0:
+        return ''
+    start = max(position - width // 3, 0)
+    excerpt = ' '.join(text[start:start + width].split())
+    return ('…' if start else '') + excerpt + ('…' if start + width < len(text) else '')
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+PUSH_BROKER = getattr(settings, 'PUSH_BROKER', 'portal.push.LocalBroker')
+# Events a slow subscriber may fall behind by before its stream asks for a reload.
+PUSH_QUEUE_SIZE = getattr(settings, 'PUSH_QUEUE_SIZE', 500)
+# Seconds between keep-alive comments, and before a stream closes so the
+# browser reconnects (and is re-authenticated).
+PUSH_KEEPALIVE = getattr(settings, 'PUSH_KEEPALIVE', 15)
+PUSH_STREAM_TIMEOUT = getattr(settings, 'PUSH_STREAM_TIMEOUT', 300)
+PUSH_RETRY_MS = getattr(settings, 'PUSH_RETRY_MS', 3000)
+
+OVERFLOW = object()
+
+
+def shipment_channel(pk):
+    return f'shipment:{pk}'
+
+
+def tenant_channel(key):
+    """The channel for a tenancy.tenant_key(): 'all' for staff, 'org:N' for members."""
+    return f'tenant:{key}'
+
+
+class Subscription:
+    """One subscriber's queue, read from the event loop that created it."""
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = list(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(PUSH_QUEUE_SIZE + 1)
+
+    def deliver(self, event):
+        """Queue event from any thread; returns False once the subscriber's loop is gone."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            return False
+        return True
+
+    def _put(self, event):
+        if self.queue.qsize() < PUSH_QUEUE_SIZE:
+            self.queue.put_nowait(event)
+        elif self.queue.qsize() == PUSH_QUEUE_SIZE:
+            self.queue.put_nowait(OVERFLOW)
+
+    async def get(self, timeout):
+        """The next event, OVERFLOW if events were lost, or None after timeout seconds of quiet."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """
+    In-process fan-out from publishers to subscribed event streams.
+
+    publish() may be called from any thread; each subscriber gets each event
+    once however many of its channels it was published to. Only streams
+    served by this process see the events, so with several ASGI workers use
+    a broker that relays publish() through a shared bus (Redis pub/sub,
+    Postgres LISTEN/NOTIFY) into each process's local fan-out, and point
+    PUSH_BROKER at it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = defaultdict(set)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def publish(self, channels, event):
+        with self._lock:
+            subscribers = set().union(*(self._channels.get(channel, ()) for channel in channels))
+        for subscription in subscribers:
+            if not subscription.deliver(event):
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(set().union(*self._channels.values()))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(PUSH_BROKER)()
+    return _broker
+
+
+def status_event(shipment, from_status, at=None):
+    """The payload sent when shipment moves from from_status ('' when it was just created)."""
+    return {
+        'id': shipment.pk,
+        'tracking_number': shipment.tracking_number,
+        'from_status': from_status,
+        'status': shipment.status,
+        'status_display': shipment.get_status_display(),
+        'changed_at': at or timezone.now(),
+        'organization': shipment.organization_id,
+    }
+
+
+def publish_status_events(events):
+    """
+    Fan status events out to shipment and tenant channels once the current
+    transaction commits, so no stream hears of a change that rolled back.
+    """
+    events = list(events)
+    if not events:
+        return
+
+    def send():
+        broker = get_broker()
+        for event in events:
+            channels = [shipment_channel(event['id']), tenant_channel('all')]
+            if event['organization'] is not None:
+                channels.append(tenant_channel(f"org:{event['organization']}"))
+            broker.publish(channels, event)
+
+    transaction.on_commit(send)
+
+
+def sse_message(data, event=None):
+    lines = [f'event: {event}'] if event else []
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+async def event_stream(channels, keepalive=PUSH_KEEPALIVE, timeout=PUSH_STREAM_TIMEOUT):
+    """
+    Server-sent events for channels until timeout seconds have passed.
+
+    Subscribes on first iteration, inside the loop that serves the response.
+    Quiet spells get a comment line so proxies keep the connection open. A
+    subscriber that fell too far behind gets one 'resync' event and the
+    stream ends, since the page can no longer patch itself up event by event.
+    """
+    subscription = get_broker().subscribe(channels)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        yield f'retry: {PUSH_RETRY_MS}\n\n'
+        while (remaining := deadline - loop.time()) > 0:
+            event = await subscription.get(min(keepalive, remaining))
+            if event is None:
+                yield ': keep-alive\n\n'
+            elif event is OVERFLOW:
+                yield sse_message({}, event='resync')
+                return
+            else:
+                yield sse_message(event, event='status')
+    finally:
+        subscription.close()
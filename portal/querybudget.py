@@ -0,0 +1,15 @@
+def query_budget(max_queries, cold=None):
+    """
+    Declare the most queries a view may run, session and auth lookups included.
+
+    max_queries applies once the caches are warm; cold, when given, is the
+    budget for a request that finds them empty and has to fill them.
+
+    The decorator only tags the view; it costs nothing at request time. The test
+    suite reads the tags and fails any view over budget, cold or warm.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        view_func.cold_query_budget = max_queries if cold is None else cold
+        return view_func
+    return decorator
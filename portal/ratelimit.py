@@ -0,0 +1,137 @@
+import hashlib
+import ipaddress
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .metrics import ratelimited_requests
+
+# Buckets per scope, as 'count/period' (s, m, h or d): count requests at once,
+# refilled evenly over the period. 'ip' keys on the client address, 'username'
+# on the username field of the posted form, 'user' on the logged-in user.
+DEFAULT_RATE_LIMITS = {
+    'login': {'ip': '20/m', 'username': '5/m'},
+    'signup': {'ip': '10/h'},
+    'document_upload': {'user': '30/m', 'ip': '60/m'},
+    'shipment_create': {'user': '60/m', 'ip': '120/m'},
+}
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/m' -> (5, 60.0): bucket size and the seconds it takes to refill completely."""
+    count, _, period = rate.partition('/')
+    multiplier = int(period[:-1] or 1)
+    return int(count), float(multiplier * PERIODS[period[-1]])
+
+
+def client_ip(request):
+    """
+    The client address, or the IPv6 /64 it belongs to, since one host
+    usually holds a whole /64.
+
+    With RATELIMIT_PROXY_COUNT trusted proxies in front of the app, the
+    address is read that many hops from the right of X-Forwarded-For;
+    entries further left are client-supplied and could be forged.
+    """
+    address = request.META.get('REMOTE_ADDR', '')
+    proxies = getattr(settings, 'RATELIMIT_PROXY_COUNT', 0)
+    if proxies:
+        forwarded = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+        if len(forwarded) >= proxies:
+            address = forwarded[-proxies]
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return address
+    if ip.version == 6:
+        return str(ipaddress.ip_network(f'{ip}/64', strict=False))
+    return str(ip)
+
+
+def _key_value(request, kind):
+    if kind == 'ip':
+        return client_ip(request)
+    if kind == 'username':
+        return request.POST.get('username', '').strip().lower() or None
+    if kind == 'user':
+        return request.user.pk if request.user.is_authenticated else None
+    raise ValueError(f'Unknown rate limit key {kind!r}.')
+
+
+def _bucket_key(scope, kind, value):
+    digest = hashlib.sha256(str(value).encode()).hexdigest()[:32]
+    return f'portal:ratelimit:{scope}:{kind}:{digest}'
+
+
+def check_rate_limits(request, scope, limits, now=None):
+    """
+    Take a token from each of scope's buckets for this request; returns 0 if
+    it may go ahead, otherwise the seconds until it would be let through.
+
+    Each bucket is a single cached timestamp, the time at which it will be
+    full again (the generic cell rate algorithm), read and written in one
+    round trip each. A request that is refused takes nothing, so retrying
+    at once does not push the wait further out. Concurrent requests can
+    read the same timestamp, which lets at most one extra request per
+    worker through in a burst.
+    """
+    now = time.time() if now is None else now
+    buckets = {}
+    for kind, rate in limits.items():
+        value = _key_value(request, kind)
+        if value is not None:
+            buckets[_bucket_key(scope, kind, value)] = parse_rate(rate)
+    if not buckets:
+        return 0
+    cache = caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+    full_at = cache.get_many(buckets)
+    updates, wait = {}, 0.0
+    for key, (count, period) in buckets.items():
+        interval = period / count
+        start = max(full_at.get(key, now), now)
+        # Room for one more token while the bucket refills within period - interval.
+        allowed_at = start - (period - interval)
+        if allowed_at > now:
+            wait = max(wait, allowed_at - now)
+        updates[key] = start + interval
+    if wait:
+        return wait
+    cache.set_many(updates, int(max(period for _count, period in buckets.values())) + 1)
+    return 0
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse('Too many requests; please wait and try again.', status=429, content_type='text/plain')
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def ratelimit(scope, methods=('POST',)):
+    """
+    Answer 429 once a client exceeds scope's RATE_LIMITS, before the view runs.
+
+    Only methods are counted, so showing the form is free, and scopes keyed
+    on 'user' do not limit staff. Rates are read per request, so
+    override_settings applies, and RATELIMIT_ENABLED = False turns every
+    limit off.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods and getattr(settings, 'RATELIMIT_ENABLED', True):
+                limits = getattr(settings, 'RATE_LIMITS', DEFAULT_RATE_LIMITS).get(scope, {})
+                # Only scopes keyed on the user look at request.user, so the
+                # others are checked without a single query.
+                exempt = 'user' in limits and request.user.is_staff
+                retry_after = 0 if exempt else check_rate_limits(request, scope, limits)
+                if retry_after:
+                    ratelimited_requests.inc(scope)
+                    return too_many_requests(retry_after)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
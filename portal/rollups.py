@@ -0,0 +1,229 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import DailyProductTradeRollup, DailyShipmentRollup, DailyTradeRollup, Shipment, Trade
+
+# Rollups follow model signals, so queryset.update() and bulk_create() bypass
+# them. Bulk inserts should call apply_shipments()/apply_trades(); otherwise
+# run `manage.py rebuild_rollups` after the write.
+
+TRADE_REVENUE = ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=16, decimal_places=2))
+
+
+def _bump(model, key, **deltas):
+    """Apply counter deltas to one rollup bucket, creating it on first use."""
+    model.objects.get_or_create(**key)
+    model.objects.filter(**key).update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def _bump_many(model, deltas):
+    """
+    Apply {bucket key items: {field: delta}} with a fixed number of queries.
+
+    The buckets are locked while they are read, so the rewritten totals cannot
+    lose an increment made by a concurrent writer.
+    """
+    if not deltas:
+        return
+    model.objects.bulk_create([model(**dict(key)) for key in deltas], ignore_conflicts=True)
+    matches = Q()
+    for key in deltas:
+        matches |= Q(**dict(key))
+    key_fields = [name for name, _value in next(iter(deltas))]
+    rows = list(model.objects.select_for_update().filter(matches))
+    for row in rows:
+        for field, delta in deltas[tuple((name, getattr(row, name)) for name in key_fields)].items():
+            setattr(row, field, getattr(row, field) + delta)
+    model.objects.bulk_update(rows, sorted(next(iter(deltas.values()))))
+
+
+def shipment_bucket(created_at, shipment_type, status):
+    return {
+        'day': timezone.localdate(created_at),
+        'shipment_type': shipment_type,
+        'status': status,
+    }
+
+
+def shipment_state(shipment):
+    return {
+        'created_at': shipment.created_at,
+        'shipment_type': shipment.shipment_type,
+        'status': shipment.status,
+        'price': shipment.price,
+    }
+
+
+def trade_state(trade):
+    return {'date': trade.date, 'product': trade.product, 'price': trade.price, 'quantity': trade.quantity}
+
+
+def apply_shipment(state, sign):
+    key = shipment_bucket(state['created_at'], state['shipment_type'], state['status'])
+    _bump(DailyShipmentRollup, key, shipment_count=sign, revenue=sign * Decimal(str(state['price'])))
+
+
+def apply_trade(state, sign):
+    revenue = Decimal(str(state['price'])) * state['quantity']
+    _bump(DailyTradeRollup, {'day': state['date']}, trade_count=sign, revenue=sign * revenue)
+    _bump(
+        DailyProductTradeRollup, {'day': state['date'], 'product': state['product']},
+        trade_count=sign, volume=sign * state['quantity'], revenue=sign * revenue,
+    )
+
+
+def apply_shipments(shipments):
+    """Add a batch of newly created shipments, one update per bucket."""
+    buckets = defaultdict(lambda: [0, Decimal(0)])
+    for shipment in shipments:
+        key = shipment_bucket(shipment.created_at, shipment.shipment_type, shipment.status)
+        bucket = buckets[tuple(key.items())]
+        bucket[0] += 1
+        bucket[1] += Decimal(str(shipment.price))
+    for key, (count, revenue) in buckets.items():
+        _bump(DailyShipmentRollup, dict(key), shipment_count=count, revenue=revenue)
+
+
+def move_shipments(shipments, to_status):
+    """Move a batch of shipments from their current status bucket to to_status's."""
+    deltas = defaultdict(lambda: {'shipment_count': 0, 'revenue': Decimal(0)})
+    for shipment in shipments:
+        price = Decimal(str(shipment.price))
+        for status, sign in [(shipment.status, -1), (to_status, 1)]:
+            bucket = deltas[tuple(shipment_bucket(shipment.created_at, shipment.shipment_type, status).items())]
+            bucket['shipment_count'] += sign
+            bucket['revenue'] += sign * price
+    _bump_many(DailyShipmentRollup, deltas)
+
+
+def apply_trades(trades):
+    """Add a batch of newly created trades, one update per day and per day and product."""
+    buckets = defaultdict(lambda: [0, Decimal(0)])
+    product_buckets = defaultdict(lambda: [0, 0, Decimal(0)])
+    for trade in trades:
+        revenue = Decimal(str(trade.price)) * trade.quantity
+        bucket = buckets[trade.date]
+        bucket[0] += 1
+        bucket[1] += revenue
+        bucket = product_buckets[trade.date, trade.product]
+        bucket[0] += 1
+        bucket[1] += trade.quantity
+        bucket[2] += revenue
+    for day, (count, revenue) in buckets.items():
+        _bump(DailyTradeRollup, {'day': day}, trade_count=count, revenue=revenue)
+    for (day, product), (count, volume, revenue) in product_buckets.items():
+        _bump(
+            DailyProductTradeRollup, {'day': day, 'product': product},
+            trade_count=count, volume=volume, revenue=revenue,
+        )
+
+
+@transaction.atomic
+def rebuild_rollups():
+    """Recompute every rollup row from the Shipment and Trade tables."""
+    DailyShipmentRollup.objects.all().delete()
+    DailyTradeRollup.objects.all().delete()
+    DailyProductTradeRollup.objects.all().delete()
+
+    shipment_rows = (
+        Shipment.objects.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'shipment_type', 'status')
+        .annotate(shipment_count=Count('id'), revenue=Sum('price'))
+    )
+    DailyShipmentRollup.objects.bulk_create(
+        [DailyShipmentRollup(**row) for row in shipment_rows], batch_size=1000
+    )
+
+    trade_rows = (
+        Trade.objects.order_by()
+        .values(day=F('date'))
+        .annotate(trade_count=Count('id'), revenue=Sum(TRADE_REVENUE))
+    )
+    DailyTradeRollup.objects.bulk_create(
+        [DailyTradeRollup(**row) for row in trade_rows], batch_size=1000
+    )
+
+    product_rows = (
+        Trade.objects.order_by()
+        .values('product', day=F('date'))
+        .annotate(trade_count=Count('id'), volume=Sum('quantity'), revenue=Sum(TRADE_REVENUE))
+    )
+    DailyProductTradeRollup.objects.bulk_create(
+        [DailyProductTradeRollup(**row) for row in product_rows], batch_size=1000
+    )
+
+
+def _month_starts(months):
+    today = timezone.localdate()
+    year, month = today.year, today.month
+    starts = []
+    for _ in range(months):
+        starts.append(date(year, month, 1))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return starts[::-1]
+
+
+def _monthly_rows(starts):
+    shipment_rows = (
+        DailyShipmentRollup.objects.filter(day__gte=starts[0])
+        .annotate(month=TruncMonth('day'))
+        .values('month')
+        .annotate(shipment_count=Sum('shipment_count'), revenue=Sum('revenue'))
+    )
+    trade_rows = (
+        DailyTradeRollup.objects.filter(day__gte=starts[0])
+        .annotate(month=TruncMonth('day'))
+        .values('month')
+        .annotate(revenue=Sum('revenue'))
+    )
+    return shipment_rows, trade_rows
+
+
+def _monthly_series(starts, shipment_rows, trade_rows):
+    shipments = dict.fromkeys(starts, 0)
+    revenue = dict.fromkeys(starts, Decimal(0))
+    for row in shipment_rows:
+        if row['month'] not in shipments:
+            continue
+        shipments[row['month']] += row['shipment_count']
+        revenue[row['month']] += row['revenue']
+    for row in trade_rows:
+        if row['month'] not in revenue:
+            continue
+        revenue[row['month']] += row['revenue']
+
+    return {
+        'labels': [start.strftime('%b %Y') for start in starts],
+        'shipment_data': [shipments[start] for start in starts],
+        'revenue_data': [float(revenue[start]) for start in starts],
+    }
+
+
+def monthly_series(months=12):
+    """Return chart labels plus monthly shipment counts and revenue from the rollups."""
+    starts = _month_starts(months)
+    return _monthly_series(starts, *_monthly_rows(starts))
+
+
+async def amonthly_series(months=12):
+    """monthly_series() for async views."""
+    starts = _month_starts(months)
+    shipment_rows, trade_rows = _monthly_rows(starts)
+    return _monthly_series(starts, [row async for row in shipment_rows], [row async for row in trade_rows])
+
+
+def total_trade_revenue():
+    return DailyTradeRollup.objects.aggregate(total=Sum('revenue'))['total'] or 0
+
+
+async def atotal_trade_revenue():
+    return (await DailyTradeRollup.objects.aaggregate(total=Sum('revenue')))['total'] or 0
@@ -0,0 +1,251 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Document, Shipment
+
+SEARCH_TABLE = 'portal_search'
+SEARCH_LIMIT = getattr(settings, 'SEARCH_LIMIT', 50)
+
+# Index rows are keyed by rowid = pk * KIND_SLOTS + kind code, so updating or
+# removing one object is a rowid lookup rather than a scan of the index.
+KIND_SLOTS = 4
+KIND_CODES = {'shipment': 0, 'document': 1}
+KIND_MODELS = {'shipment': Shipment, 'document': Document}
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def kind_of(instance):
+    return 'shipment' if isinstance(instance, Shipment) else 'document'
+
+
+def tenant_organization(tenant):
+    """
+    What a tenancy.tenant_key() lets a search see: (False, None) for 'all',
+    (True, N) for 'org:N', and (True, None) for 'none', which matches no row.
+    """
+    if tenant is None or tenant == 'all':
+        return False, None
+    if tenant.startswith('org:'):
+        return True, int(tenant[4:])
+    return True, None
+
+
+def search_fields(instance):
+    """Return the (tracking, title, body) text indexed for a shipment or document."""
+    if isinstance(instance, Shipment):
+        return (
+            instance.tracking_number,
+            f'{instance.origin} {instance.destination}',
+            instance.description,
+        )
+    return ('', instance.title, f'{instance.description} {preview_text(instance)}')
+
+
+def preview_text(document):
+    """Text extracted from the document's file, once the preview pipeline has run."""
+    try:
+        return document.preview.text
+    except ObjectDoesNotExist:
+        return ''
+
+
+class SearchHit:
+    def __init__(self, kind, obj, score):
+        self.kind = kind
+        self.object = obj
+        self.score = score
+
+
+class BaseSearchBackend:
+    def index(self, instance):
+        pass
+
+    def index_many(self, instances):
+        for instance in instances:
+            self.index(instance)
+
+    def remove(self, instance):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query, kinds=None, limit=SEARCH_LIMIT, tenant=None):
+        """
+        Return a ranked list of (kind, pk, score) tuples.
+
+        tenant is a tenancy.tenant_key(); rows outside it are filtered out
+        before ranking, so a tenant gets its own best limit matches.
+        """
+        raise NotImplementedError
+
+    def hits(self, query, kinds=None, limit=SEARCH_LIMIT, tenant=None, querysets=None):
+        """
+        Like search(), but with the matching objects loaded in rank order.
+
+        querysets maps kinds to the rows the caller may see; a hit outside
+        them, from an index entry not yet updated, is dropped.
+        """
+        ranked = self.search(query, kinds, limit, tenant)
+        querysets = querysets or {}
+        loaded = {}
+        for kind, model in KIND_MODELS.items():
+            pks = [pk for hit_kind, pk, _score in ranked if hit_kind == kind]
+            if pks:
+                loaded[kind] = querysets.get(kind, model.objects.all()).in_bulk(pks)
+        return [
+            SearchHit(kind, loaded[kind][pk], score)
+            for kind, pk, score in ranked
+            if pk in loaded.get(kind, {})
+        ]
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Portable fallback: icontains filters through the ORM, newest first."""
+
+    def search(self, query, kinds=None, limit=SEARCH_LIMIT, tenant=None):
+        terms = _TOKEN.findall(query)
+        restricted, organization = tenant_organization(tenant)
+        if not terms or (restricted and organization is None):
+            return []
+        scope = Q(organization_id=organization) if restricted else Q()
+        results = []
+        if kinds is None or 'shipment' in kinds:
+            condition = Q()
+            for term in terms:
+                condition &= (
+                    Q(tracking_number__icontains=term) | Q(origin__icontains=term)
+                    | Q(destination__icontains=term) | Q(description__icontains=term)
+                )
+            pks = Shipment.objects.filter(scope, condition).values_list('pk', flat=True)[:limit]
+            results += [('shipment', pk, 0.0) for pk in pks]
+        if kinds is None or 'document' in kinds:
+            condition = Q()
+            for term in terms:
+                condition &= (
+                    Q(title__icontains=term) | Q(description__icontains=term)
+                    | Q(preview__text__icontains=term)
+                )
+            pks = Document.objects.filter(scope, condition).values_list('pk', flat=True)[:limit]
+            results += [('document', pk, 0.0) for pk in pks]
+        return results[:limit]
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """SQLite FTS5 index ranked with bm25, weighting tracking > title > body."""
+
+    WEIGHTS = (10.0, 5.0, 1.0)
+
+    def _rowid(self, instance):
+        return instance.pk * KIND_SLOTS + KIND_CODES[kind_of(instance)]
+
+    def _row(self, instance):
+        return [self._rowid(instance), *search_fields(instance), instance.organization_id]
+
+    def index(self, instance):
+        rowid = self._rowid(instance)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [rowid])
+            self._insert_many(cursor, [self._row(instance)])
+
+    def index_many(self, instances):
+        rows = [self._row(instance) for instance in instances]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [[row[0]] for row in rows])
+            self._insert_many(cursor, rows)
+
+    def remove(self, instance):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [self._rowid(instance)])
+
+    def rebuild(self, batch_size=2000):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            for model in KIND_MODELS.values():
+                queryset = model.objects.order_by('pk')
+                if model is Document:
+                    queryset = queryset.select_related('preview')
+                batch = []
+                for instance in queryset.iterator(chunk_size=batch_size):
+                    batch.append(self._row(instance))
+                    if len(batch) >= batch_size:
+                        self._insert_many(cursor, batch)
+                        batch = []
+                if batch:
+                    self._insert_many(cursor, batch)
+
+    def _insert_many(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, tracking, title, body, organization) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            rows,
+        )
+
+    def match_expression(self, query):
+        """
+        Turn free text into an FTS5 expression of prefix phrases.
+
+        Each word becomes a quoted phrase of its tokens with a trailing *, so
+        'TRK-20' matches TRK-2025-001 and user input can never inject FTS syntax.
+        """
+        phrases = []
+        for word in query.split():
+            tokens = _TOKEN.findall(word)
+            if tokens:
+                phrases.append('"%s"*' % ' '.join(tokens))
+        return ' '.join(phrases)
+
+    def search(self, query, kinds=None, limit=SEARCH_LIMIT, tenant=None):
+        expression = self.match_expression(query)
+        restricted, organization = tenant_organization(tenant)
+        if not expression or (restricted and organization is None):
+            return []
+        sql = (
+            f'SELECT rowid, bm25({SEARCH_TABLE}, %s, %s, %s) AS score FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s'
+        )
+        params = [*self.WEIGHTS, expression]
+        if kinds is not None:
+            codes = [KIND_CODES[kind] for kind in kinds]
+            sql += f' AND (rowid %% {KIND_SLOTS}) IN ({", ".join(["%s"] * len(codes))})'
+            params += codes
+        if restricted:
+            # The unindexed organization column is checked on each match
+            # before ranking, so other tenants' rows never use up the limit.
+            sql += ' AND organization = %s'
+            params.append(organization)
+        sql += ' ORDER BY score LIMIT %s'
+        params.append(limit)
+        names = {code: kind for kind, code in KIND_CODES.items()}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [
+                (names[rowid % KIND_SLOTS], rowid // KIND_SLOTS, -score)
+                for rowid, score in cursor.fetchall()
+            ]
+
+
+def get_backend():
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSSearchBackend()
+    return DatabaseSearchBackend()
+
+
+def tracking_prefix_lookup(prefix, shipments=None, limit=10):
+    """Shipments whose tracking number starts with prefix (case-sensitive), via a range scan on its unique index."""
+    shipments = Shipment.objects.all() if shipments is None else shipments
+    if not prefix:
+        return shipments.none()
+    return (
+        shipments.filter(tracking_number__gte=prefix, tracking_number__lt=prefix + '\uffff')
+        .order_by('tracking_number')[:limit]
+    )
@@ -0,0 +1,198 @@
+from django.contrib.auth.models import User
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import audit, metrics, rollups
+from .blobs import acquire_blob, release_blob
+from .caching import bump_version
+from .previews import queue_preview
+from .push import publish_status_events, status_event
+from .search import get_backend
+from .timeline import record_status_change
+from .models import Document, Shipment, Trade
+from .stats import invalidate_dashboard_stats
+from .tracking import invalidate_tracking
+
+
+@receiver([post_save, post_delete], sender=Shipment)
+@receiver([post_save, post_delete], sender=Document)
+@receiver([post_save, post_delete], sender=Trade)
+def clear_dashboard_stats(sender, instance, **kwargs):
+    invalidate_dashboard_stats(instance.organization_id)
+
+
+# ==================== CACHE VERSIONS ====================
+
+CACHE_NAMESPACES = {Shipment: 'shipments', Document: 'documents', Trade: 'trades'}
+
+
+@receiver([post_save, post_delete], sender=Shipment)
+@receiver([post_save, post_delete], sender=Document)
+@receiver([post_save, post_delete], sender=Trade)
+def bump_cache_version(sender, **kwargs):
+    bump_version(CACHE_NAMESPACES[sender])
+
+
+@receiver(post_save, sender=User)
+def bump_user_cache_version(sender, created, **kwargs):
+    # Every login saves last_login; only new users change the counts.
+    if created:
+        bump_version('users')
+
+
+@receiver(post_delete, sender=User)
+def bump_user_cache_version_on_delete(sender, **kwargs):
+    bump_version('users')
+
+
+# ==================== DAILY ROLLUPS ====================
+
+@receiver(pre_save, sender=Shipment)
+def remember_shipment_state(sender, instance, **kwargs):
+    instance._rollup_previous = None
+    if not instance._state.adding:
+        instance._rollup_previous = (
+            Shipment.objects.filter(pk=instance.pk)
+            .values('created_at', 'shipment_type', 'status', 'price', 'tracking_number')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Shipment)
+def roll_up_shipment(sender, instance, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        rollups.apply_shipment(previous, -1)
+    rollups.apply_shipment(rollups.shipment_state(instance), 1)
+
+
+@receiver(post_delete, sender=Shipment)
+def roll_back_shipment(sender, instance, **kwargs):
+    rollups.apply_shipment(rollups.shipment_state(instance), -1)
+
+
+@receiver(pre_save, sender=Trade)
+def remember_trade_state(sender, instance, **kwargs):
+    instance._rollup_previous = None
+    if not instance._state.adding:
+        instance._rollup_previous = (
+            Trade.objects.filter(pk=instance.pk)
+            .values('date', 'product', 'price', 'quantity')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Trade)
+def roll_up_trade(sender, instance, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        rollups.apply_trade(previous, -1)
+    rollups.apply_trade(rollups.trade_state(instance), 1)
+
+
+@receiver(post_delete, sender=Trade)
+def roll_back_trade(sender, instance, **kwargs):
+    rollups.apply_trade(rollups.trade_state(instance), -1)
+
+
+# ==================== SEARCH INDEX ====================
+
+@receiver(post_save, sender=Shipment)
+@receiver(post_save, sender=Document)
+def index_for_search(sender, instance, **kwargs):
+    get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Shipment)
+@receiver(post_delete, sender=Document)
+def remove_from_search(sender, instance, **kwargs):
+    get_backend().remove(instance)
+
+
+# ==================== PUBLIC TRACKING ====================
+
+@receiver(post_save, sender=Shipment)
+def clear_tracking_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None) or {}
+    invalidate_tracking(instance.tracking_number, previous.get('tracking_number'))
+
+
+@receiver(post_delete, sender=Shipment)
+def clear_tracking_on_delete(sender, instance, **kwargs):
+    invalidate_tracking(instance.tracking_number)
+
+
+# ==================== STATUS TIMELINE ====================
+
+@receiver(post_save, sender=Shipment)
+def record_status_event(sender, instance, created, **kwargs):
+    # Views set _changed_by before saving; creation defaults to the creator.
+    changed_by = getattr(instance, '_changed_by', None)
+    if created:
+        record_status_change(instance, '', changed_by or instance.created_by, at=instance.created_at)
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous and previous['status'] != instance.status:
+        record_status_change(instance, previous['status'], changed_by)
+
+
+# ==================== STATUS PUSH ====================
+
+@receiver(post_save, sender=Shipment)
+def push_status_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if created:
+        publish_status_events([status_event(instance, '', at=instance.created_at)])
+    elif previous and previous['status'] != instance.status:
+        publish_status_events([status_event(instance, previous['status'], at=instance.updated_at)])
+
+
+# ==================== DOCUMENT BLOBS ====================
+
+@receiver(pre_save, sender=Document)
+def remember_document_file(sender, instance, **kwargs):
+    instance._previous_file = None
+    if not instance._state.adding:
+        instance._previous_file = (
+            Document.objects.filter(pk=instance.pk).values_list('file', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Document)
+def count_document_blob(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_file', None)
+    if created or previous != instance.file.name:
+        acquire_blob(instance.file.name)
+        release_blob(previous)
+
+
+@receiver(post_delete, sender=Document)
+def release_document_blob(sender, instance, **kwargs):
+    release_blob(instance.file.name)
+
+
+# ==================== DOCUMENT PREVIEWS ====================
+
+@receiver(post_save, sender=Document)
+def queue_document_preview(sender, instance, created, **kwargs):
+    # Only the pending row is written here; run_preview_pipeline does the work.
+    if created or getattr(instance, '_previous_file', None) != instance.file.name:
+        queue_preview(instance)
+
+
+# ==================== ACTIVITY LOG ====================
+
+@receiver(request_finished)
+def flush_due_activity(sender, **kwargs):
+    # Fires after the response has been sent, so checking the flush interval
+    # here adds no latency to the request itself.
+    audit.buffer.flush_if_due()
+
+
+# ==================== METRICS ====================
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    metrics.instrument_connection(connection)
@@ -0,0 +1,113 @@
+import asyncio
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from .models import Document, Organization, Shipment, Trade
+from .tenancy import tenant_key
+
+DASHBOARD_STATS_KEY = 'portal:dashboard_stats'
+DASHBOARD_STATS_TTL = getattr(settings, 'DASHBOARD_STATS_TTL', 30)
+
+STATUS_KEYS = [status for status, _label in Shipment.STATUS_CHOICES]
+
+
+def _stats_key(scope):
+    return f'{DASHBOARD_STATS_KEY}:{scope}'
+
+
+def _stats_querysets(user):
+    aggregates = {
+        'total_shipments': Count('id'),
+        'shipment_revenue': Sum('price'),
+    }
+    for status in STATUS_KEYS:
+        aggregates[status] = Count('id', filter=Q(status=status))
+    shipments, documents, trades = Shipment.objects.all(), Document.objects.all(), Trade.objects.all()
+    if user is not None:
+        shipments, documents, trades = shipments.for_user(user), documents.for_user(user), trades.for_user(user)
+    return aggregates, shipments, documents, trades
+
+
+def _finish_stats(stats, total_documents, total_trades):
+    stats['shipment_revenue'] = stats['shipment_revenue'] or 0
+    stats['total_documents'] = total_documents
+    stats['total_trades'] = total_trades
+    return stats
+
+
+def compute_dashboard_stats(user=None):
+    """Count every shipment status in a single conditional-aggregation query, within user's tenant if given."""
+    aggregates, shipments, documents, trades = _stats_querysets(user)
+    return _finish_stats(shipments.aggregate(**aggregates), documents.count(), trades.count())
+
+
+async def acompute_dashboard_stats(user=None):
+    """
+    compute_dashboard_stats() on the async ORM, with the three queries
+    awaited together. They share the request's database connection, so they
+    still run one after another, but the event loop serves other requests
+    while they do.
+    """
+    aggregates, shipments, documents, trades = _stats_querysets(user)
+    stats, total_documents, total_trades = await asyncio.gather(
+        shipments.aaggregate(**aggregates), documents.acount(), trades.acount(),
+    )
+    return _finish_stats(stats, total_documents, total_trades)
+
+
+def get_dashboard_stats(user=None):
+    """Return the dashboard counters for everything, or for user's tenant, served from cache when possible."""
+    key = _stats_key(tenant_key(user))
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_dashboard_stats(user)
+        cache.set(key, stats, DASHBOARD_STATS_TTL)
+    return stats
+
+
+async def aget_dashboard_stats(user=None):
+    """get_dashboard_stats() for async views."""
+    key = _stats_key(tenant_key(user))
+    stats = await cache.aget(key)
+    if stats is None:
+        stats = await acompute_dashboard_stats(user)
+        await cache.aset(key, stats, DASHBOARD_STATS_TTL)
+    return stats
+
+
+def refresh_dashboard_stats():
+    """
+    Recompute and cache the counters of every tenant at once.
+
+    Grouping by organization answers all of them in the same three queries
+    that one tenant would take; staff totals are the sums of the groups.
+    """
+    aggregates, shipments, documents, trades = _stats_querysets(None)
+    by_organization = {
+        row.pop('organization_id'): row
+        for row in shipments.order_by().values('organization_id').annotate(**aggregates)
+    }
+    document_counts = dict(documents.order_by().values_list('organization_id').annotate(Count('id')))
+    trade_counts = dict(trades.order_by().values_list('organization_id').annotate(Count('id')))
+    empty = {name: 0 for name in aggregates}
+    totals = {name: sum(row[name] or 0 for row in by_organization.values()) for name in aggregates}
+    entries = {
+        _stats_key('all'): _finish_stats(totals, sum(document_counts.values()), sum(trade_counts.values())),
+    }
+    for organization in Organization.objects.values_list('pk', flat=True):
+        entries[_stats_key(f'org:{organization}')] = _finish_stats(
+            dict(by_organization.get(organization, empty)),
+            document_counts.get(organization, 0),
+            trade_counts.get(organization, 0),
+        )
+    cache.set_many(entries, DASHBOARD_STATS_TTL)
+    return entries
+
+
+def invalidate_dashboard_stats(*organization_ids):
+    """Drop the all-tenant counters and those of the given organizations."""
+    cache.delete_many([_stats_key('all')] + [
+        _stats_key(f'org:{organization}') for organization in set(organization_ids) if organization is not None
+    ])
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def blob_name_for(digest, extension=''):
+    return f'blobs/{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage that names every file by the SHA-256 of its contents.
+
+    The digest is computed while the upload is streamed to a temporary file,
+    so identical uploads end up as one file on disk and are never held in
+    memory. Reference counting lives in portal.blobs; this class only stores.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content has been hashed.
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1]
+        tmp_dir = self.path('tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as out:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+            blob_name = blob_name_for(digest.hexdigest(), extension)
+            target = self.path(blob_name)
+            if os.path.exists(target):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+                if self.file_permissions_mode is not None:
+                    os.chmod(target, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return blob_name
+
+    def trash(self, name):
+        """Move a file aside instead of deleting it, so restore() can bring it back."""
+        trashed = self.path(f'trash/{name}')
+        os.makedirs(os.path.dirname(trashed), exist_ok=True)
+        try:
+            os.replace(self.path(name), trashed)
+        except FileNotFoundError:
+            return
+        # Age the file from when it was trashed, not from when it was written.
+        os.utime(trashed)
+
+    def restore(self, name):
+        """Put a trashed file back; returns whether there was one."""
+        target = self.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(self.path(f'trash/{name}'), target)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def purge_trash(self, max_age):
+        """Delete files trashed more than max_age seconds ago; returns how many."""
+        cutoff, purged = time.time() - max_age, 0
+        for root, _dirs, files in os.walk(self.path('trash')):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.remove(path)
+                        purged += 1
+                except FileNotFoundError:
+                    pass
+        return purged
+
+
+_document_storage = ContentAddressedStorage()
+
+
+def document_storage():
+    return _document_storage
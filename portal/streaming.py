@@ -0,0 +1,30 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_END = object()
+
+
+async def iterate_in_thread(iterable, thread_sensitive=True):
+    """
+    Async iterator over a sync iterable, pulling one chunk at a time in a thread.
+
+    Under ASGI, Django reads a sync streaming body whole with
+    sync_to_async(list) before sending it; an async iterator is sent as it is
+    produced. Leave thread_sensitive on when the iterable runs queries, so
+    every chunk uses the same thread and database connection.
+    """
+    iterator = iter(iterable)
+    step = sync_to_async(next, thread_sensitive=thread_sensitive)
+    try:
+        while (chunk := await step(iterator, _END)) is not _END:
+            yield chunk
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close, thread_sensitive=thread_sensitive)()
+
+
+def stream_for(request, response, thread_sensitive=True):
+    """Make a streaming response stream under ASGI too; WSGI responses are left alone."""
+    if isinstance(request, ASGIRequest):
+        response.streaming_content = iterate_in_thread(response.streaming_content, thread_sensitive)
+    return response
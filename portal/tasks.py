@@ -0,0 +1,34 @@
+from .blobs import sweep_blobs
+from .jobs import purge_finished_jobs, task
+from .outbox import dispatch_outbox
+from .uploads import expire_upload_sessions
+from . import stats
+
+
+@task(queue='mail', priority=10)
+def send_outbox():
+    """Send one batch of due emails; scheduled, so no separate send_outbox loop is needed."""
+    dispatch_outbox()
+
+
+@task()
+def refresh_dashboard_stats():
+    """Keep every tenant's dashboard counters cached, so dashboards rarely count in a request."""
+    stats.refresh_dashboard_stats()
+
+
+@task(priority=-10)
+def purge_jobs():
+    purge_finished_jobs()
+
+
+@task(priority=-10)
+def purge_blob_trash():
+    """Delete released document files once no racing upload can take them back."""
+    sweep_blobs()
+
+
+@task(priority=-10)
+def expire_uploads():
+    """Discard chunked uploads their clients abandoned, with their partial files."""
+    expire_upload_sessions()
@@ -0,0 +1,49 @@
+from django import template
+from django.core.cache import cache
+
+from ..caching import FRAGMENT_CACHE_TTL, NAMESPACES, record_lookup, versioned_key
+
+register = template.Library()
+
+
+class VersionedCacheNode(template.Node):
+    def __init__(self, nodelist, name, namespaces, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.namespaces = namespaces
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        key = versioned_key(self.name, self.namespaces, *vary_on)
+        html = cache.get(key)
+        record_lookup(self.name, html is not None)
+        if html is None:
+            html = self.nodelist.render(context)
+            cache.set(key, html, FRAGMENT_CACHE_TTL)
+        return html
+
+
+@register.tag('versioned_cache')
+def do_versioned_cache(parser, token):
+    """
+    Cache a template fragment until one of the named namespaces changes.
+
+        {% versioned_cache shipment_rows shipments,documents request.GET.urlencode %}
+            ...
+        {% endversioned_cache %}
+
+    The fragment name and comma-separated namespaces are literal; any further
+    arguments are variables the fragment varies on.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and at least one namespace.")
+    namespaces = tuple(bits[2].split(','))
+    unknown = set(namespaces) - set(NAMESPACES)
+    if unknown:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' got unknown namespace(s): {', '.join(sorted(unknown))}.")
+    nodelist = parser.parse(('endversioned_cache',))
+    parser.delete_first_token()
+    vary_on = [parser.compile_filter(bit) for bit in bits[3:]]
+    return VersionedCacheNode(nodelist, f'fragment:{bits[1]}', namespaces, vary_on)
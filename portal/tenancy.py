@@ -0,0 +1,26 @@
+from .models import Membership, Organization
+
+
+def organization_id(user):
+    """The id of user's organization, or None for users outside any organization."""
+    try:
+        return user.membership.organization_id
+    except Membership.DoesNotExist:
+        return None
+
+
+def tenant_key(user):
+    """
+    What a user's view of tenant data depends on, for cache keys: 'all' for
+    staff, the organization for members, 'none' for everyone else.
+    """
+    if user is None or user.is_staff:
+        return 'all'
+    organization = organization_id(user)
+    return f'org:{organization}' if organization is not None else 'none'
+
+
+def create_organization(name, *users):
+    organization = Organization.objects.create(name=name)
+    Membership.objects.bulk_create([Membership(user=user, organization=organization) for user in users])
+    return organization
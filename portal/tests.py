@@ -1,3 +1,1331 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import os
+import shutil
+import tempfile
+import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import audit, imports, views
+from .analytics import rolling_mean
+from .benchmarks import Benchmark, compare, seed
+from .blobs import sweep_blobs
+from .caching import cache_stats, reset_cache_stats
+from .exports import SHIPMENT_FIELDS, TRADE_FIELDS
+from .imports import import_shipments, read_rows
+from .jobs import Cron, Scheduler, enqueue, queue_depth, task, work_off
+from .models import (
+    ActivityLog, Blob, DailyProductTradeRollup, DailyShipmentRollup, DailyTradeRollup, Document, DocumentPreview,
+    Job, OutboundEmail, Shipment, ShipmentStatusEvent, Trade, UploadSession,
+)
+from .outbox import dispatch_outbox, enqueue_mail
+from .pagination import decode_cursor, encode_cursor, keyset_page
+from .previews import run_preview_pipeline
+from .push import event_stream, get_broker, shipment_channel, tenant_channel
+from .ratelimit import check_rate_limits, client_ip
+from .rollups import rebuild_rollups
+from .search import SEARCH_LIMIT, get_backend
+from .stats import compute_dashboard_stats, get_dashboard_stats, refresh_dashboard_stats
+from .tenancy import create_organization
+from .timeline import record_status_change
+from .tracking import MISSING, tracking_cache_key
+from .urls import urlpatterns
+from .uploads import DOCUMENT_MAX_SIZE, UploadError, append_chunk, expire_upload_sessions, partial_path
+
+
+def create_shipments(organization, created_by, statuses, prefix='TRK'):
+    """One shipment per status, numbered prefix-0, prefix-1, ... in creation order."""
+    return [
+        Shipment.objects.create(
+            organization=organization,
+            tracking_number=f'{prefix}-{i}',
+            shipment_type='import',
+            status=status,
+            origin='Mumbai',
+            destination='Rotterdam',
+            description='Test shipment',
+            price=100,
+            created_by=created_by,
+            estimated_delivery=date(2025, 12, 1),
+        )
+        for i, status in enumerate(statuses)
+    ]
+
+
+SAMPLE_STATUSES = ['pending', 'in_transit', 'in_transit', 'customs', 'delivered']
+
+
+class DashboardStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.client_user = User.objects.create_user('client', password='pw')
+        cls.organization = create_organization('Client Co', cls.client_user)
+        create_shipments(cls.organization, cls.staff, SAMPLE_STATUSES)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_statuses_in_one_query(self):
+        with self.assertNumQueries(3):
+            stats = get_dashboard_stats()
+        self.assertEqual(stats['total_shipments'], 5)
+        self.assertEqual(stats['in_transit'], 2)
+        self.assertEqual(stats['customs'], 1)
+        with self.assertNumQueries(0):
+            get_dashboard_stats()
+
+    def test_shipment_delete_invalidates_cache(self):
+        get_dashboard_stats()
+        Shipment.objects.filter(status='pending').get().delete()
+        self.assertEqual(get_dashboard_stats()['pending'], 0)
+
+    def assertViewQueries(self, user, url_name, num):
+        self.client.force_login(user)
+        self.client.get(reverse(url_name))
+        with self.assertNumQueries(num):
+            self.client.get(reverse(url_name))
+
+    def test_home_query_count(self):
+        self.assertViewQueries(self.client_user, 'home', 2)
+
+    def test_client_dashboard_query_count(self):
+        # Warm renders come from the per-user cache: only session and user.
+        self.assertViewQueries(self.client_user, 'client_dashboard', 2)
+
+    def test_admin_dashboard_query_count(self):
+        self.assertViewQueries(self.staff, 'admin_dashboard', 2)
+
+    def test_dashboard_cache_is_per_user_and_versioned_by_signals(self):
+        reset_cache_stats()
+        self.client.force_login(self.client_user)
+        self.client.get(reverse('client_dashboard'))
+        Document.objects.create(
+            title='Packing list', document_type='export', file='documents/pl.pdf', uploaded_by=self.client_user,
+            organization=self.organization,
+        )
+        self.assertContains(self.client.get(reverse('client_dashboard')), 'Packing list')
+        self.client.get(reverse('client_dashboard'))
+        self.client.force_login(self.staff)
+        self.assertNotContains(self.client.get(reverse('client_dashboard')), 'Packing list')
+
+        stats = cache_stats()
+        self.assertEqual(stats['client_dashboard'], {'hits': 1, 'misses': 3})
+        # Staff see every tenant's shipments, so they get their own copy of the fragment.
+        self.assertEqual(stats['fragment:client_recent_shipments'], {'hits': 2, 'misses': 2})
+        self.assertEqual(self.client.get(reverse('cache_statistics')).json()['caches'], cache_stats())
+
+
+class ShipmentListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.client_user = User.objects.create_user('client', password='pw')
+        cls.organization = create_organization('Client Co', cls.client_user)
+        create_shipments(cls.organization, cls.staff, SAMPLE_STATUSES)
+        other = User.objects.create_user('other', password='pw')
+        cls.other_shipments = create_shipments(create_organization('Other Co', other), other, ['pending'] * 3, 'OTH')
+
+    def test_keyset_pages_cover_every_shipment_once(self):
+        seen, cursor = [], None
+        while True:
+            page = keyset_page(Shipment.objects.filter(organization=self.organization), cursor, 2)
+            seen.extend(shipment.tracking_number for shipment in page.items)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, [f'TRK-{i}' for i in range(4, -1, -1)])
+
+    def test_shipment_list_filters_by_status(self):
+        self.client.force_login(self.client_user)
+        response = self.client.get(reverse('shipment_list'), {'status': 'in_transit'})
+        self.assertEqual({s.status for s in response.context['shipments']}, {'in_transit'})
+        self.assertEqual(len(response.context['shipments']), 2)
+
+    def test_malformed_cursors_show_the_first_page(self):
+        def token(raw):
+            return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+        newest = Shipment.objects.filter(organization=self.organization).latest('created_at', 'id')
+        self.client.force_login(self.client_user)
+        for cursor in ['!!!', 'not-base64', token('no separator'), token('2025-01-01T00:00:00+00:00|1|2'),
+                       token('yesterday|1'), token(f'{newest.created_at.replace(tzinfo=None).isoformat()}|{newest.pk}')]:
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+                response = self.client.get(reverse('shipment_list'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['shipments']), 5)
+
+    def test_forged_cursor_stays_within_the_tenant(self):
+        # A cursor built from another tenant's newest shipment only moves the position.
+        newest_other = self.other_shipments[-1]
+        cursor = encode_cursor(newest_other.created_at, newest_other.pk)
+        self.client.force_login(self.client_user)
+        response = self.client.get(reverse('shipment_list'), {'cursor': cursor})
+        self.assertEqual({s.organization_id for s in response.context['shipments']}, {self.organization.pk})
+        self.assertFalse(any(s.tracking_number.startswith('OTH') for s in response.context['shipments']))
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.client_user = User.objects.create_user('client', password='pw')
+        cls.organization = create_organization('Client Co', cls.client_user)
+        create_shipments(cls.organization, cls.staff, SAMPLE_STATUSES)
+        other = User.objects.create_user('other', password='pw')
+        create_shipments(create_organization('Other Co', other), other, ['in_transit'], 'OTH')
+        Trade.objects.create(user=cls.client_user, product='Rice', quantity=5, price=10, date=date(2025, 1, 5))
+
+    def test_export_streams_filtered_rows(self):
+        self.client.force_login(self.client_user)
+        response = self.client.get(reverse('export_shipments'), {'status': 'in_transit'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="shipments.csv"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'tracking_number'])
+        self.assertEqual(len(lines), 3)
+
+    def test_json_export_is_one_array_of_objects(self):
+        self.client.force_login(self.client_user)
+        response = self.client.get(reverse('export_shipments'), {'format': 'json'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['tracking_number'] for row in rows], [f'TRK-{i}' for i in range(4, -1, -1)])
+        self.assertEqual(set(rows[0]), set(SHIPMENT_FIELDS))
+
+        response = self.client.get(reverse('export_shipments'), {'format': 'json', 'status': 'cancelled'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+    def test_unknown_format_is_refused(self):
+        self.client.force_login(self.client_user)
+        response = self.client.get(reverse('export_shipments'), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
+
+    def test_trade_and_activity_exports_are_staff_only(self):
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.client.get(reverse('export_trades')).status_code, 302)
+        self.client.force_login(self.staff)
+        lines = b''.join(self.client.get(reverse('export_trades')).streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(','), TRADE_FIELDS)
+        self.assertEqual(lines[1].split(',')[1:3], ['Rice', '5'])
+        self.assertEqual(self.client.get(reverse('export_activity'), {'format': 'json'}).status_code, 200)
+
+    async def test_export_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.client_user)
+        response = await self.async_client.get(reverse('export_shipments'), {'status': 'in_transit'})
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.client_user = User.objects.create_user('client', password='pw')
+        cls.organization = create_organization('Client Co', cls.client_user)
+        create_shipments(cls.organization, cls.staff, SAMPLE_STATUSES)
+        Document.objects.create(
+            title='Bill of lading TRK-3', document_type='import', file='documents/bl.pdf',
+            uploaded_by=cls.staff, organization=cls.organization, description='Rotterdam arrival',
+        )
+        cls.other_user = User.objects.create_user('other', password='pw')
+        other_organization = create_organization('Other Co', cls.other_user)
+        create_shipments(other_organization, cls.other_user, ['pending'], 'TRK-3')
+        Document.objects.create(
+            title='Rotterdam manifest', document_type='export', file='documents/om.pdf',
+            uploaded_by=cls.other_user, organization=other_organization,
+        )
+
+    def search(self, user, **params):
+        self.client.force_login(user)
+        return self.client.get(reverse('search'), {'format': 'json', **params}).json()
+
+    def test_search_ranks_tracking_prefix_matches(self):
+        data = self.search(self.client_user, q='TRK-3')
+        results = data['results']
+        self.assertEqual(results[0], {**results[0], 'type': 'shipment', 'label': 'TRK-3 - Customs Clearance'})
+        self.assertEqual([r['type'] for r in results], ['shipment', 'document'])
+        self.assertEqual(data['tracking_numbers'], ['TRK-3'])
+        self.assertEqual(len(self.search(self.client_user, q='rotter', type='document')['results']), 1)
+
+    def test_results_never_cross_tenants(self):
+        # The other tenant has a TRK-3-0 shipment and a Rotterdam document of its own.
+        client_results = self.search(self.client_user, q='TRK-3')
+        other_results = self.search(self.other_user, q='TRK-3')
+        self.assertEqual(client_results['tracking_numbers'], ['TRK-3'])
+        self.assertEqual(other_results['tracking_numbers'], ['TRK-3-0'])
+        self.assertEqual([r['label'] for r in other_results['results']], ['TRK-3-0 - Pending'])
+        other_documents = self.search(self.other_user, q='rotter', type='document')['results']
+        self.assertEqual([r['label'] for r in other_documents], ['Rotterdam manifest - Export Document'])
+
+        self.client.force_login(self.other_user)
+        page = self.client.get(reverse('search'), {'q': 'lading'})
+        self.assertEqual(page.context['hits'], [])
+        self.assertNotContains(page, 'Bill of lading')
+
+        # Staff search every tenant.
+        self.assertEqual(len(self.search(self.staff, q='rotter', type='document')['results']), 2)
+
+
+class TrackingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        create_shipments(create_organization('Client Co'), cls.staff, SAMPLE_STATUSES)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tracking_api_serves_repeat_polls_from_cache(self):
+        url = reverse('track_shipment_api', args=['TRK-1'])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['status'], 'in_transit')
+        with self.assertNumQueries(0):
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+        shipment = Shipment.objects.get(tracking_number='TRK-1')
+        shipment.status = 'customs'
+        shipment.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'customs')
+        with self.assertNumQueries(0):
+            page = self.client.get(reverse('track_shipment'), {'number': 'TRK-1'})
+        self.assertContains(page, 'Customs Clearance')
+        self.assertEqual(self.client.get(reverse('track_shipment_api', args=['NOPE'])).status_code, 404)
+
+    def test_unknown_numbers_are_cached_as_misses_until_the_shipment_exists(self):
+        url = reverse('track_shipment_api', args=['TRK-9'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(cache.get(tracking_cache_key('TRK-9')), MISSING)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 404)
+            page = self.client.get(reverse('track_shipment'), {'number': 'TRK-9'})
+        self.assertEqual(page.status_code, 404)
+
+        Shipment.objects.create(
+            tracking_number='TRK-9', shipment_type='export', status='pending', origin='Kochi', destination='Busan',
+            description='Late booking', price=10, created_by=self.staff, estimated_delivery=date(2025, 12, 1),
+        )
+        self.assertEqual(self.client.get(url).json()['status'], 'pending')
+
+    def test_tracking_page_answers_304_for_a_matching_etag(self):
+        page = self.client.get(reverse('track_shipment'), {'number': 'TRK-3'})
+        self.assertContains(page, 'Customs Clearance')
+        self.assertEqual(page['Cache-Control'], 'public, no-cache')
+        with self.assertNumQueries(0):
+            repeat = self.client.get(reverse('track_shipment'), {'number': 'TRK-3'}, HTTP_IF_NONE_MATCH=page['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.content, b'')
+        stale = self.client.get(reverse('track_shipment'), {'number': 'TRK-3'}, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(stale.status_code, 200)
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        create_shipments(create_organization('Client Co'), cls.staff, SAMPLE_STATUSES)
+
+    def test_status_transitions_build_timeline_and_dwell(self):
+        shipment = Shipment.objects.get(tracking_number='TRK-0')
+        shipment._changed_by = self.staff
+        shipment.status = 'in_transit'
+        shipment.save()
+        shipment.save()
+        events = list(shipment.status_events.all())
+        self.assertEqual([(e.from_status, e.to_status) for e in events], [('', 'pending'), ('pending', 'in_transit')])
+        self.assertIsNotNone(events[0].left_at)
+        self.assertEqual(events[1].changed_by, self.staff)
+
+        self.client.force_login(self.staff)
+        data = self.client.get(reverse('shipment_dwell_analytics'), {'status': 'pending'}).json()
+        self.assertEqual(data['dwell_seconds'][0]['shipments'], 1)
+        self.assertGreaterEqual(data['dwell_seconds'][0]['avg_dwell'], 0)
+
+    def test_dwell_counts_only_completed_stays(self):
+        start = datetime(2025, 6, 2, 8, 0, tzinfo=dt_timezone.utc)
+        shipments = create_shipments(create_organization('Dwell Co'), self.staff, ['pending'] * 3, 'DWL')
+        ShipmentStatusEvent.objects.filter(shipment__in=shipments).update(changed_at=start)
+        for shipment, hours in zip(shipments, [1, 3]):
+            shipment.status = 'in_transit'
+            record_status_change(shipment, 'pending', at=start + timedelta(hours=hours))
+        # DWL-2 is still pending and the other two are still in transit: open stays, left out.
+        self.assertEqual(ShipmentStatusEvent.objects.filter(shipment__in=shipments, left_at=None).count(), 3)
+
+        self.client.force_login(self.staff)
+        data = self.client.get(reverse('shipment_dwell_analytics'), {'status': 'pending'}).json()
+        self.assertEqual(data['dwell_seconds'], [{
+            'to_status': 'pending', 'origin': 'Mumbai', 'destination': 'Rotterdam',
+            'shipments': 2, 'avg_dwell': 7200.0, 'max_dwell': 10800.0,
+        }])
+        data = self.client.get(reverse('shipment_dwell_analytics'), {'status': 'in_transit'}).json()
+        self.assertEqual(data['dwell_seconds'], [])
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('trader', password='pw')
+
+    def rollup_rows(self):
+        shipments = list(
+            DailyShipmentRollup.objects.exclude(shipment_count=0)
+            .order_by('day', 'shipment_type', 'status')
+            .values_list('day', 'shipment_type', 'status', 'shipment_count', 'revenue')
+        )
+        trades = list(
+            DailyTradeRollup.objects.exclude(trade_count=0)
+            .order_by('day')
+            .values_list('day', 'trade_count', 'revenue')
+        )
+        products = list(
+            DailyProductTradeRollup.objects.exclude(trade_count=0)
+            .order_by('day', 'product')
+            .values_list('day', 'product', 'trade_count', 'volume', 'revenue')
+        )
+        return shipments, trades, products
+
+    def test_incremental_rollups_match_rebuild(self):
+        shipment = Shipment.objects.create(
+            tracking_number='TRK-R1',
+            shipment_type='export',
+            origin='Chennai',
+            destination='Hamburg',
+            description='Rollup shipment',
+            price=250,
+            created_by=self.user,
+            estimated_delivery=date(2025, 12, 1),
+        )
+        shipment.status = 'customs'
+        shipment.save()
+        trade = Trade.objects.create(user=self.user, product='Tea', quantity=3, price=10, date=date(2025, 11, 5))
+        Trade.objects.create(user=self.user, product='Rice', quantity=2, price=5, date=date(2025, 11, 5))
+        moved = Trade.objects.create(user=self.user, product='Rice', quantity=4, price=5, date=date(2025, 11, 6))
+        trade.delete()
+        moved.product = 'Jute'
+        moved.save()
+
+        incremental = self.rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollup_rows())
+        self.assertEqual(incremental[0][0][2:4], ('customs', 1))
+        self.assertEqual(incremental[1], [(date(2025, 11, 5), 1, 10), (date(2025, 11, 6), 1, 20)])
+        self.assertEqual(incremental[2], [(date(2025, 11, 5), 'Rice', 1, 2, 10), (date(2025, 11, 6), 'Jute', 1, 4, 20)])
+
+
+class BulkStatusTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ops', password='pw')
+        organization = create_organization('Ops Co', self.user)
+        self.client.force_login(self.user)
+        self.addCleanup(audit.buffer.flush)
+        for i in range(6):
+            Shipment.objects.create(
+                organization=organization,
+                tracking_number=f'VSL-{i}', shipment_type='import', status='in_transit', origin='Busan',
+                destination='Rotterdam', description='Vessel cargo', price=100, created_by=self.user,
+                estimated_delivery=date(2025, 12, 1),
+            )
+
+    def post(self, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('shipment_bulk_status'), payload, content_type='application/json')
+
+    def test_bulk_transition_skips_stale_versions_and_keeps_derived_data(self):
+        shipments = list(Shipment.objects.order_by('pk'))
+        items = [{'id': shipment.pk, 'version': shipment.version} for shipment in shipments]
+        stale = Shipment.objects.get(pk=shipments[0].pk)
+        stale.description = 'Edited elsewhere'
+        stale.save()
+
+        # Session, user, then one batch: the same count for 6 shipments or 1,000.
+        with self.assertNumQueries(11):
+            response = self.post({'to_status': 'customs', 'from_status': 'in_transit', 'shipments': items})
+        body = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in body['updated']], [shipment.pk for shipment in shipments[1:]])
+        self.assertEqual(body['conflicts'], [{'id': stale.pk, 'status': 'in_transit', 'version': stale.version}])
+        self.assertEqual(Shipment.objects.filter(status='customs').count(), 5)
+
+        buckets = lambda: sorted(
+            DailyShipmentRollup.objects.exclude(shipment_count=0).values_list('status', 'shipment_count', 'revenue')
+        )
+        incremental = buckets()
+        rebuild_rollups()
+        self.assertEqual(incremental, buckets())
+        moved = shipments[1]
+        self.assertEqual(
+            list(moved.status_events.order_by('changed_at', 'id').values_list('from_status', 'to_status', 'left_at')),
+            [('', 'in_transit', mock.ANY), ('in_transit', 'customs', None)],
+        )
+        audit.buffer.flush()
+        self.assertEqual(ActivityLog.objects.filter(verb='update', target_type='portal.shipment').count(), 5)
+
+        retry = self.post({'to_status': 'customs', 'shipments': [{'id': moved.pk, 'version': moved.version}]})
+        self.assertEqual(retry.status_code, 409)
+        fresh = [item for item in body['updated'] if item['id'] == moved.pk]
+        self.assertEqual(self.post({'to_status': 'customs', 'shipments': fresh}).json()['unchanged'], [moved.pk])
+
+    def test_form_post_from_shipment_list(self):
+        shipment = Shipment.objects.order_by('pk').first()
+        page = self.client.get(reverse('shipment_list'))
+        self.assertContains(page, f'value="{shipment.pk}:{shipment.version}"')
+        response = self.client.post(reverse('shipment_bulk_status'), {
+            'to_status': 'delivered', 'shipments': [f'{shipment.pk}:{shipment.version}', 'bogus'],
+        })
+        self.assertRedirects(response, reverse('shipment_list'))
+        self.assertEqual(Shipment.objects.get(pk=shipment.pk).status, 'in_transit')
+        self.client.post(reverse('shipment_bulk_status'), {
+            'to_status': 'delivered', 'shipments': [f'{shipment.pk}:{shipment.version}'],
+        })
+        self.assertEqual(Shipment.objects.get(pk=shipment.pk).status, 'delivered')
+
+
+class TenancyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', password='pw')
+        cls.bob = User.objects.create_user('bob', password='pw')
+        cls.alice_org = create_organization('Alice Exports', cls.alice)
+        cls.bob_org = create_organization('Bob Imports', cls.bob)
+        tenants = [(cls.alice_org, cls.alice, 'ALC', 3), (cls.bob_org, cls.bob, 'BOB', 2)]
+        for organization, owner, prefix, count in tenants:
+            for i in range(count):
+                Shipment.objects.create(
+                    organization=organization, tracking_number=f'{prefix}-{i}', shipment_type='export',
+                    status='pending', origin='Kochi', destination='Felixstowe', description='Spices', price=50,
+                    created_by=owner, estimated_delivery=date(2025, 12, 1),
+                )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_ranks_within_the_tenant(self):
+        # Bob's organization holds more, better-ranked matches than one page of results.
+        Shipment.objects.bulk_create([
+            Shipment(
+                organization=self.bob_org, tracking_number=f'REEFER-{i}', shipment_type='import', status='pending',
+                origin='Reefer', destination='Reefer', description='Reefer reefer', price=10,
+                created_by=self.bob, estimated_delivery=date(2025, 12, 1),
+            )
+            for i in range(SEARCH_LIMIT + 10)
+        ])
+        get_backend().rebuild()
+        Shipment.objects.filter(tracking_number='ALC-1').update(description='Spices in a reefer')
+        get_backend().index(Shipment.objects.get(tracking_number='ALC-1'))
+
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('search'), {'q': 'reefer', 'format': 'json'})
+        self.assertEqual([result['label'] for result in response.json()['results']], ['ALC-1 - Pending'])
+        self.assertEqual(len(get_backend().search('reefer', tenant=f'org:{self.bob_org.pk}')), SEARCH_LIMIT)
+        self.assertEqual(get_backend().search('reefer', tenant='none'), [])
+
+    def test_clients_only_see_their_organization(self):
+        self.client.force_login(self.alice)
+        shipments = self.client.get(reverse('shipment_list')).context['shipments']
+        self.assertEqual(sorted(s.tracking_number for s in shipments), ['ALC-0', 'ALC-1', 'ALC-2'])
+        self.assertEqual(self.client.get(reverse('client_dashboard')).context['total_shipments'], 3)
+        other = Shipment.objects.get(tracking_number='BOB-0')
+        self.assertEqual(self.client.get(reverse('shipment_detail', args=[other.pk])).status_code, 404)
+
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.get(reverse('client_dashboard')).context['total_shipments'], 2)
+        self.assertEqual(len(self.client.get(reverse('shipment_list')).context['shipments']), 2)
+
+        loner = User.objects.create_user('loner', password='pw')
+        self.assertFalse(Shipment.objects.for_user(loner).exists())
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.assertEqual(Shipment.objects.for_user(staff).count(), 5)
+
+    def test_new_rows_belong_to_the_creators_organization(self):
+        self.client.force_login(self.alice)
+        self.client.post(reverse('shipment_create'), {
+            'tracking_number': 'ALC-9', 'shipment_type': 'import', 'status': 'pending', 'origin': 'Santos',
+            'destination': 'Kochi', 'description': 'Coffee', 'price': '75.00', 'estimated_delivery': '2025-12-20',
+        })
+        self.assertEqual(Shipment.objects.get(tracking_number='ALC-9').organization, self.alice_org)
+        self.assertEqual(self.client.get(reverse('client_dashboard')).context['total_shipments'], 4)
+
+    async def test_async_read_views_under_asgi(self):
+        await self.async_client.aforce_login(self.alice)
+        for name in ['home', 'client_dashboard', 'shipment_list', 'document_list']:
+            response = await self.async_client.get(reverse(name))
+            self.assertEqual(response.status_code, 200, name)
+        self.assertEqual(response.context['documents'], [])
+        response = await self.async_client.get(reverse('client_dashboard'))
+        self.assertEqual([s.tracking_number for s in response.context['recent_shipments']], ['ALC-2', 'ALC-1', 'ALC-0'])
+        response = await self.async_client.get(reverse('shipment_list'), {'status': 'pending'})
+        self.assertEqual(len(response.context['shipments']), 3)
+        alice_shipment = await Shipment.objects.aget(tracking_number='ALC-0')
+        response = await self.async_client.get(reverse('shipment_detail', args=[alice_shipment.pk]))
+        self.assertEqual(len(response.context['timeline']), 1)
+        other = await Shipment.objects.aget(tracking_number='BOB-0')
+        response = await self.async_client.get(reverse('shipment_detail', args=[other.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_membership_is_loaded_with_the_user(self):
+        self.client.force_login(self.alice)
+        self.client.get(reverse('shipment_list'))
+        cache.clear()
+        # Session, user with membership, then the page: no extra query for the tenant.
+        with self.assertNumQueries(3):
+            self.client.get(reverse('shipment_list'))
+
+
+class TradeAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('finance', password='pw', is_staff=True)
+        cls.trader = User.objects.create_user('trader', password='pw')
+        for product, quantity, price, day in [
+            ('Tea', 10, 2, date(2025, 10, 30)),
+            ('Tea', 5, 2, date(2025, 11, 1)),
+            ('Rice', 1, 100, date(2025, 11, 3)),
+        ]:
+            Trade.objects.create(user=cls.trader, product=product, quantity=quantity, price=price, date=day)
+        Trade.objects.create(user=cls.staff, product='Rice', quantity=2, price=100, date=date(2025, 11, 3))
+
+    def report(self, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('trade_analytics'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['rows']
+
+    def test_grouped_reports_agree_between_rollup_and_trades(self):
+        months = self.report(report='month')
+        self.assertEqual([(row['period'], row['trades'], row['volume']) for row in months],
+                         [('2025-10-01', 1, 10), ('2025-11-01', 3, 8)])
+        self.assertEqual([row['product'] for row in self.report(report='top', limit=1)], ['Rice'])
+        self.assertEqual([row['product'] for row in self.report(report='top', rank_by='volume')], ['Tea', 'Rice'])
+        by_user = self.report(report='user', product='Rice')
+        self.assertEqual([(row['user__username'], row['volume']) for row in by_user], [('finance', 2), ('trader', 1)])
+        trader_months = self.report(report='month', user='trader')
+        self.assertEqual([row['volume'] for row in trader_months], [10, 6])
+
+    def test_moving_average_counts_days_without_trades(self):
+        rows = self.report(report='moving_average', product='Tea', window=2)
+        self.assertEqual([(row['date'], row['volume'], row['volume_avg']) for row in rows],
+                         [('2025-10-31', 0.0, 5.0), ('2025-11-01', 5.0, 2.5)])
+        self.assertEqual(rolling_mean([1.0, 2.0, 3.0, 4.0], 3), [2.0, 3.0])
+        self.assertEqual(rolling_mean([4.0, 0.0, 2.0, 6.0, 1.0], 2), [2.0, 1.0, 4.0, 3.5])
+        self.assertEqual(rolling_mean([1.0, 2.0], 3), [])
+
+    def test_invalid_parameters_are_rejected(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('trade_analytics'), {'report': 'forecast', 'window': 0})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'report', 'window'})
+
+
+def measure_view(client, url, **extra):
+    """GET url and return (queries run, the view it routes to)."""
+    view = resolve(url.split('?')[0]).func
+    with CaptureQueriesContext(connection) as context:
+        client.get(url, **extra)
+    return len(context.captured_queries), view
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.client_user = User.objects.create_user('client', password='pw')
+        organization = create_organization('Budget Co', cls.client_user)
+        for i in range(5):
+            user = User.objects.create_user(f'user{i}', password='pw')
+            cls.document = Document.objects.create(
+                title=f'Bill {i}', document_type='import', file='documents/bill.pdf', uploaded_by=user,
+                organization=organization,
+            )
+            ActivityLog.objects.create(user=user, action=f'Action {i}')
+            cls.shipment = Shipment.objects.create(
+                tracking_number=f'TRK-Q{i}',
+                shipment_type='export',
+                origin='Mumbai',
+                destination='Dubai',
+                description='Budget shipment',
+                created_by=user,
+                organization=organization,
+                estimated_delivery=date(2025, 12, 1),
+            )
+
+    def budgeted_urls(self):
+        """Every routed view that declares a budget, with arguments that reach its main path."""
+        query = {'search': '?q=TRK', 'trade_analytics': '?report=product'}
+        urls = []
+        for pattern in urlpatterns:
+            if not hasattr(pattern.callback, 'query_budget'):
+                continue
+            kwargs = {}
+            if 'pk' in pattern.pattern.converters:
+                kwargs['pk'] = (self.document if pattern.name.startswith('document_') else self.shipment).pk
+            urls.append(reverse(pattern.name, kwargs=kwargs) + query.get(pattern.name, ''))
+        return urls
+
+    def test_views_stay_within_declared_budget_cold_and_warm(self):
+        routed = {pattern.callback for pattern in urlpatterns}
+        budgeted = {view for view in vars(views).values() if callable(view) and hasattr(view, 'query_budget')}
+        self.assertEqual(budgeted - routed, set(), 'views with a budget that no URL reaches')
+        urls = self.budgeted_urls()
+        for user in [self.staff, self.client_user]:
+            self.client.force_login(user)
+            for url in urls:
+                cache.clear()
+                cold, view = measure_view(self.client, url)
+                warm, view = measure_view(self.client, url)
+                with self.subTest(user=user.username, url=url):
+                    self.assertLessEqual(cold, view.cold_query_budget, 'cold cache')
+                    self.assertLessEqual(warm, view.query_budget, 'warm cache')
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_pragmas_are_applied_on_connect(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite profile only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertGreater(cursor.fetchone()[0], 0)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+class PushTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('watcher', password='pw')
+        cls.organization = create_organization('Watch Co', cls.user)
+        cls.shipment = Shipment.objects.create(
+            organization=cls.organization, tracking_number='LIVE-1', shipment_type='import', status='pending',
+            origin='Jebel Ali', destination='Mundra', description='Reefer', price=80, created_by=cls.user,
+            estimated_delivery=date(2025, 12, 1),
+        )
+        cls.other = Shipment.objects.create(
+            tracking_number='LIVE-2', shipment_type='import', status='pending', origin='Jebel Ali',
+            destination='Mundra', description='Reefer', price=80, created_by=cls.user,
+            estimated_delivery=date(2025, 12, 1),
+        )
+
+    async def test_shipment_stream_is_scoped_and_delivers_events(self):
+        await self.async_client.aforce_login(self.user)
+        missing = await self.async_client.get(reverse('shipment_events', args=[self.other.pk]))
+        self.assertEqual(missing.status_code, 404)
+
+        response = await self.async_client.get(reverse('shipment_events', args=[self.shipment.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        get_broker().publish([shipment_channel(self.shipment.pk)], {'id': self.shipment.pk, 'status': 'customs'})
+        message = (await anext(stream)).decode()
+        self.assertEqual(message.splitlines()[0], 'event: status')
+        self.assertEqual(json.loads(message.splitlines()[1][len('data: '):])['status'], 'customs')
+
+    def test_wsgi_requests_are_told_not_to_reconnect(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('dashboard_events')).status_code, 204)
+
+    async def test_slow_subscribers_resync_and_quiet_streams_close(self):
+        stream = event_stream(['test:overflow'])
+        await anext(stream)
+        with mock.patch('portal.push.PUSH_QUEUE_SIZE', 2):
+            for number in range(4):
+                get_broker().publish(['test:overflow', 'test:other'], {'number': number})
+            await asyncio.sleep(0)
+            messages = [message async for message in stream]
+        self.assertEqual([message.split('\n')[0] for message in messages], ['event: status'] * 2 + ['event: resync'])
+
+        stream = event_stream(['test:quiet'], keepalive=0.01, timeout=0.05)
+        self.assertIn(': keep-alive\n\n', [message async for message in stream])
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    def test_saves_and_bulk_transitions_publish_after_commit(self):
+        self.addCleanup(audit.buffer.flush)
+        broker = mock.Mock()
+        with mock.patch('portal.push.get_broker', return_value=broker):
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.shipment.status = 'in_transit'
+                self.shipment.save()
+                self.shipment.save()
+            broker.publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+            channels, event = broker.publish.call_args.args
+            self.assertEqual(channels, [
+                shipment_channel(self.shipment.pk), tenant_channel('all'), tenant_channel(f'org:{self.organization.pk}'),
+            ])
+            self.assertEqual((event['from_status'], event['status']), ('pending', 'in_transit'))
+
+            broker.reset_mock()
+            self.client.force_login(self.user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('shipment_bulk_status'), {
+                    'to_status': 'delivered', 'shipments': [f'{self.shipment.pk}:'],
+                }, content_type='application/json')
+            self.assertEqual(broker.publish.call_count, 1)
+            self.assertEqual(broker.publish.call_args.args[1]['from_status'], 'in_transit')
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('ops', password='pw', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def test_metrics_endpoint_exposes_per_view_histograms(self):
+        with override_settings(METRICS_SLOW_REQUEST_MS=0), \
+                self.assertLogs('portal.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse('shipment_list'))
+        self.assertIn('portal_shipment', logs.output[0])
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE portal_request_duration_seconds histogram', body)
+        self.assertIn('portal_requests_total{view="shipment_list",method="GET",status="200"}', body)
+        self.assertIn('portal_request_duration_seconds_bucket{view="shipment_list",le="+Inf"}', body)
+        self.assertIn('portal_template_render_seconds_count{view="shipment_list"}', body)
+        self.assertIn('portal_response_size_bytes_count{view="shipment_list"}', body)
+
+    async def test_async_requests_are_measured_too(self):
+        await self.async_client.aforce_login(self.staff)
+        with override_settings(METRICS_SLOW_REQUEST_MS=0), \
+                self.assertLogs('portal.slow_requests', 'WARNING') as logs:
+            response = await self.async_client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        # The async ORM runs statements on a worker thread; they still count.
+        self.assertIn('portal_dailytraderollup', logs.output[0])
+
+    def test_unknown_methods_share_one_series(self):
+        for method in ['PROPFIND', 'BREW', 'X-PROBE-1']:
+            self.client.generic(method, reverse('home'))
+        self.client.generic('PATCH', reverse('home'))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('portal_requests_total{view="home",method="other",status="200"} 3', body)
+        self.assertIn('method="PATCH"', body)
+        self.assertNotIn('BREW', body)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics_token_replaces_staff_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_seeded_scenarios_run_and_regressions_are_reported(self):
+        run = seed(users=3, shipments=30, trades=10, documents=2, activities=20)
+        self.assertEqual(Shipment.objects.filter(tracking_number__startswith=f'BENCH-{run}-').count(), 30)
+        self.assertEqual(sum(DailyTradeRollup.objects.values_list('trade_count', flat=True)), 10)
+        self.assertEqual(Document.objects.count(), 2)
+
+        users = User.objects.filter(username__startswith=f'bench-{run}-').order_by('pk')
+        benchmark = Benchmark(users[0], users[1])
+        results = {scenario: benchmark.run(scenario, 3, warmup=1) for scenario in Benchmark.SCENARIOS}
+        for scenario, summary in results.items():
+            self.assertEqual((summary['requests'], summary['errors']), (3, 0), scenario)
+        self.assertEqual(compare(results, results), [])
+
+        slower = {name: dict(summary) for name, summary in results.items()}
+        slower['dashboard_reads'].update(p95_ms=results['dashboard_reads']['p95_ms'] * 2 + 10, max_queries=50)
+        problems = compare(slower, results)
+        self.assertEqual(len(problems), 2)
+        self.assertTrue(all(problem.startswith('dashboard_reads:') for problem in problems))
+
+
+class OutboxTests(TestCase):
+    def test_dispatch_sends_batch_over_one_connection(self):
+        for i in range(3):
+            enqueue_mail(f'Trade {i}', 'Recorded', [f'client{i}@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(dispatch_outbox(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+
+    def test_failed_send_is_retried_later(self):
+        email = enqueue_mail('Trade', 'Recorded', ['client@example.com'])
+        with mock.patch('portal.outbox.EmailMessage.send', side_effect=OSError('SMTP down')), \
+                self.assertLogs('portal.outbox', 'WARNING'):
+            self.assertEqual(dispatch_outbox(), 0)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertGreater(email.next_attempt_at, email.created_at)
+        self.assertEqual(dispatch_outbox(), 0)
+
+    def test_overlapping_dispatches_send_each_email_once(self):
+        for i in range(3):
+            enqueue_mail(f'Trade {i}', 'Recorded', [f'client{i}@example.com'])
+        send, overlapping = EmailMessage.send, []
+
+        def send_while_next_slot_runs(message, *args, **kwargs):
+            if not overlapping:
+                overlapping.append(dispatch_outbox())
+            return send(message, *args, **kwargs)
+
+        with mock.patch.object(EmailMessage, 'send', autospec=True, side_effect=send_while_next_slot_runs):
+            self.assertEqual(dispatch_outbox(), 3)
+        self.assertEqual(overlapping, [0])
+        self.assertEqual(len(mail.outbox), 3)
+
+        # A batch left claimed by a dispatcher that died is sent once the claim times out.
+        email = enqueue_mail('Trade', 'Recorded', ['late@example.com'])
+        OutboundEmail.objects.filter(pk=email.pk).update(status='sending', claimed_at=timezone.now())
+        self.assertEqual(dispatch_outbox(), 0)
+        OutboundEmail.objects.filter(pk=email.pk).update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(dispatch_outbox(), 1)
+
+
+JOB_CALLS = []
+
+
+@task()
+def record_call(value):
+    JOB_CALLS.append(value)
+
+
+@task(max_attempts=2)
+def always_fails():
+    raise OSError('carrier API down')
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        JOB_CALLS.clear()
+
+    def test_due_jobs_run_by_priority_and_later_ones_wait(self):
+        enqueue(record_call, ['low'])
+        enqueue(record_call, ['high'], priority=5)
+        later = enqueue(record_call, ['later'], run_at=datetime(2999, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(work_off(), 2)
+        self.assertEqual(JOB_CALLS, ['high', 'low'])
+        self.assertEqual(Job.objects.filter(status='done').count(), 2)
+        self.assertEqual(queue_depth()['default'], {'due': 0, 'scheduled': 1, 'running': 0, 'failed': 0, 'lag': 0.0})
+        later.refresh_from_db()
+        self.assertEqual((later.status, later.attempts), ('pending', 0))
+
+    def test_failed_job_is_retried_with_backoff_then_fails(self):
+        job = enqueue('portal.tests.always_fails')
+        with self.assertLogs('portal.jobs', 'WARNING'):
+            self.assertEqual(work_off(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertGreater(job.run_at, job.created_at)
+        self.assertIn('carrier API down', job.last_error)
+        self.assertEqual(work_off(), 0)
+
+        Job.objects.filter(pk=job.pk).update(run_at=job.created_at)
+        with self.assertLogs('portal.jobs', 'WARNING'):
+            work_off()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertEqual(queue_depth()['default']['failed'], 1)
+
+    def test_schedule_enqueues_each_slot_once_across_workers(self):
+        schedule = {
+            'ping': {'task': 'portal.tests.record_call', 'every': 60, 'args': ['ping']},
+            'nightly': {'task': 'portal.tests.record_call', 'cron': '30 2 * * 1-5', 'args': ['nightly']},
+        }
+        first, second = Scheduler(schedule), Scheduler(schedule)
+        monday = datetime(2025, 10, 20, 2, 30, 10, tzinfo=dt_timezone.utc)
+        self.assertEqual(len(first.tick(monday)), 2)
+        self.assertEqual(first.tick(monday.replace(second=50)), [])
+        second.tick(monday.replace(second=40))
+        self.assertEqual(Job.objects.count(), 2)
+        first.tick(monday.replace(minute=31))
+        self.assertEqual(Job.objects.count(), 3)
+        work_off()
+        self.assertEqual(sorted(JOB_CALLS), ['nightly', 'ping', 'ping'])
+
+    def test_cron_expressions(self):
+        cron = Cron('*/15 9-17 * * 1-5')
+        self.assertTrue(cron.matches(datetime(2026, 10, 19, 9, 45)))
+        self.assertFalse(cron.matches(datetime(2026, 10, 19, 9, 50)))
+        self.assertFalse(cron.matches(datetime(2026, 10, 18, 9, 45)))
+        # A restricted day of month or day of week is enough, as in cron.
+        first_or_sunday = Cron('0 0 1 * 7')
+        self.assertTrue(first_or_sunday.matches(datetime(2026, 10, 1, 0, 0)))
+        self.assertTrue(first_or_sunday.matches(datetime(2026, 10, 18, 0, 0)))
+        self.assertFalse(first_or_sunday.matches(datetime(2026, 10, 19, 0, 0)))
+        with self.assertRaises(ValueError):
+            Cron('61 * * * *')
+
+    def test_runworker_command_runs_due_jobs_and_reports_depth(self):
+        enqueue(record_call, ['queued'], queue='mail')
+        out = io.StringIO()
+        call_command('runworker', '--status', stdout=out)
+        self.assertIn('mail: 1 due', out.getvalue())
+        with mock.patch('portal.management.commands.runworker.Worker') as worker:
+            worker.return_value.run.return_value = 1
+            call_command('runworker', '--once', '--workers', '2', '--queue', 'mail', stdout=io.StringIO())
+        worker.assert_called_once_with(2, processes=False, queues=['mail'], schedule=True, poll_interval=1.0)
+        worker.return_value.run.assert_called_once_with(once=True)
+
+    def test_refresh_dashboard_stats_matches_per_tenant_counts(self):
+        staff = User.objects.create_user('ops', password='pw', is_staff=True)
+        client = User.objects.create_user('acme-client', password='pw')
+        organization = create_organization('Acme', client)
+        for index, status in enumerate(['pending', 'in_transit', 'delivered']):
+            Shipment.objects.create(
+                tracking_number=f'JOB-{index}', shipment_type='export', status=status, origin='Pune',
+                destination='Oslo', estimated_delivery=date(2026, 12, 1), created_by=staff, price=10,
+                organization=organization if index else None,
+            )
+        cache.clear()
+        refresh_dashboard_stats()
+        client = User.objects.select_related('membership').get(pk=client.pk)
+        self.assertEqual(get_dashboard_stats(client), compute_dashboard_stats(client))
+        self.assertEqual(get_dashboard_stats(staff), compute_dashboard_stats(staff))
+        self.assertEqual(get_dashboard_stats(client)['total_shipments'], 2)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def test_bucket_allows_a_burst_then_refills_evenly(self):
+        request = self.factory.post('/login/', {'username': 'Alice'}, REMOTE_ADDR='203.0.113.9')
+        limits = {'ip': '3/m', 'username': '10/m'}
+        for _ in range(3):
+            self.assertEqual(check_rate_limits(request, 'login', limits, now=1000.0), 0)
+        self.assertAlmostEqual(check_rate_limits(request, 'login', limits, now=1000.0), 20.0)
+        # A refused request takes nothing, so the wait does not grow.
+        self.assertAlmostEqual(check_rate_limits(request, 'login', limits, now=1005.0), 15.0)
+        self.assertEqual(check_rate_limits(request, 'login', limits, now=1020.0), 0)
+        self.assertGreater(check_rate_limits(request, 'login', limits, now=1020.0), 0)
+        other = self.factory.post('/login/', {'username': 'alice '}, REMOTE_ADDR='203.0.113.10')
+        self.assertEqual(check_rate_limits(other, 'login', {'username': '3/m'}, now=1000.0), 0)
+
+    @override_settings(RATE_LIMITS={'login': {'username': '2/m'}})
+    def test_login_is_refused_before_any_password_is_hashed(self):
+        with mock.patch('portal.views.authenticate', return_value=None) as authenticate:
+            for index in range(2):
+                self.client.post(reverse('login'), {'username': 'victim', 'password': 'guess'},
+                                 REMOTE_ADDR=f'198.51.100.{index}')
+            with self.assertNumQueries(0):
+                response = self.client.post(reverse('login'), {'username': 'Victim', 'password': 'guess'},
+                                            REMOTE_ADDR='198.51.100.99')
+        self.assertEqual(authenticate.call_count, 2)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(self.client.get(reverse('login')).status_code, 200)
+
+    @override_settings(RATE_LIMITS={'shipment_create': {'user': '1/h'}})
+    def test_write_limits_are_per_user_and_skip_staff(self):
+        member = User.objects.create_user('member', password='pw')
+        staff = User.objects.create_user('clerk', password='pw', is_staff=True)
+        create_organization('Acme', member)
+        url = reverse('shipment_create')
+        self.client.force_login(member)
+        self.assertEqual(self.client.post(url, {}).status_code, 200)
+        self.assertEqual(self.client.post(url, {}).status_code, 429)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.post(url, {}).status_code, 200)
+        self.assertEqual(self.client.post(url, {}).status_code, 200)
+        with override_settings(RATELIMIT_ENABLED=False):
+            self.client.force_login(member)
+            self.assertEqual(self.client.post(url, {}).status_code, 200)
+
+    def test_client_ip_trusts_only_configured_proxies(self):
+        request = self.factory.get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='1.1.1.1, 203.0.113.7')
+        self.assertEqual(client_ip(request), '10.0.0.2')
+        with override_settings(RATELIMIT_PROXY_COUNT=1):
+            self.assertEqual(client_ip(request), '203.0.113.7')
+        request = self.factory.get('/', REMOTE_ADDR='2001:db8:1:2:aaaa::1')
+        self.assertEqual(client_ip(request), '2001:db8:1:2::/64')
+
+
+class ActivityLogTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auditor', password='pw')
+        self.addCleanup(audit.buffer.flush)
+
+    def test_events_are_buffered_until_commit_and_flushed_in_bulk(self):
+        trade = Trade.objects.create(user=self.user, product='Rice', quantity=5, price=10, date=date(2025, 1, 5))
+        with mock.patch.object(audit.buffer, 'size', 3):
+            with self.captureOnCommitCallbacks(execute=True):
+                audit.log_activity(self.user, 'create', trade)
+                audit.log_activity(self.user, 'update', trade)
+                self.assertEqual(len(audit.buffer), 0)
+            self.assertEqual(len(audit.buffer), 2)
+            self.assertFalse(ActivityLog.objects.exists())
+            # One INSERT, inside a savepoint so a failed batch cannot break the test's transaction.
+            with self.assertNumQueries(3), self.captureOnCommitCallbacks(execute=True):
+                audit.log_activity(self.user, 'delete', trade)
+        self.assertEqual(len(audit.buffer), 0)
+        self.assertEqual(
+            list(ActivityLog.objects.order_by('timestamp').values_list('verb', 'target_type', 'target_id')),
+            [(verb, 'portal.trade', str(trade.pk)) for verb in ['create', 'update', 'delete']],
+        )
+
+    def test_flush_drops_only_the_events_that_cannot_be_written(self):
+        events = [ActivityLog(user=self.user, verb='create', action=f'Event {i}') for i in range(3)]
+        events[1].verb = None
+        audit.buffer.extend(events)
+        with self.assertLogs('portal.audit', 'ERROR') as logs:
+            self.assertEqual(audit.buffer.flush(), 2)
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(list(ActivityLog.objects.order_by('id').values_list('action', flat=True)), ['Event 0', 'Event 2'])
+
+        events = [ActivityLog(user=self.user, verb='create', action=f'Retry {i}') for i in range(2)]
+        with mock.patch.object(ActivityLog, 'save', side_effect=DatabaseError('database is locked')), \
+                mock.patch.object(ActivityLog.objects, 'bulk_create', side_effect=DatabaseError('database is locked')), \
+                self.assertLogs('portal.audit', 'ERROR'):
+            audit.buffer.extend(events)
+            self.assertEqual(audit.buffer.flush(), 0)
+        self.assertEqual(len(audit.buffer), 2)
+        self.assertEqual(audit.buffer.flush(), 2)
+
+    def test_prune_archives_and_removes_expired_months(self):
+        for when in [datetime(2020, 1, 15, tzinfo=dt_timezone.utc), datetime(2020, 2, 3, tzinfo=dt_timezone.utc)]:
+            ActivityLog.objects.create(user=self.user, verb='create', action='Old', timestamp=when)
+        ActivityLog.objects.create(user=self.user, verb='create', action='Recent')
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+
+        call_command('prune_activity', months=12, archive_dir=archive_dir, stdout=io.StringIO())
+        self.assertEqual(sorted(os.listdir(archive_dir)), ['activity-2020-01.csv', 'activity-2020-02.csv'])
+        self.assertEqual(list(ActivityLog.objects.values_list('action', flat=True)), ['Recent'])
+
+
+class BulkImportTests(TestCase):
+    def test_import_shipments_reports_row_errors(self):
+        user = User.objects.create_user('importer', password='pw')
+        csv_data = (
+            'tracking_number,shipment_type,origin,destination,description,price,estimated_delivery\n'
+            'IMP-1,import,Mumbai,Dubai,Rice,10.50,2025-12-01\n'
+            'IMP-1,import,Mumbai,Dubai,Duplicate,10.50,2025-12-01\n'
+            'IMP-2,air,Mumbai,Dubai,Bad type,10.50,2025-12-01\n'
+            'IMP-3,export,Chennai,Hamburg,Tea,5,not-a-date\n'
+            'IMP-4,export,Chennai,Hamburg,Tea,5,2025-12-02\n'
+        )
+        rows = read_rows(io.BytesIO(csv_data.encode()), 'shipments.csv')
+        result = import_shipments(rows, user, chunk_size=2)
+        self.assertEqual(result.created, 2)
+        self.assertEqual([line for line, _messages in result.errors], [3, 4, 5])
+        self.assertEqual(DailyShipmentRollup.objects.get(shipment_type='export').shipment_count, 1)
+
+    def test_tracking_number_taken_during_the_import_is_a_row_error(self):
+        user = User.objects.create_user('importer', password='pw')
+        csv_data = (
+            'tracking_number,shipment_type,origin,destination,description,price,estimated_delivery\n'
+            'IMP-1,import,Mumbai,Dubai,Rice,10.50,2025-12-01\n'
+            'IMP-2,import,Mumbai,Dubai,Sugar,10.50,2025-12-01\n'
+            'IMP-3,export,Chennai,Hamburg,Tea,5,2025-12-02\n'
+        )
+        insert = imports.insert_shipments
+
+        def insert_after_another_writer(shipments):
+            if not Shipment.objects.filter(tracking_number='IMP-2').exists():
+                Shipment.objects.create(
+                    tracking_number='IMP-2', shipment_type='import', origin='Kandla', destination='Jeddah',
+                    description='Other upload', price=1, created_by=user, estimated_delivery=date(2025, 12, 1),
+                )
+            insert(shipments)
+
+        rows = read_rows(io.BytesIO(csv_data.encode()), 'shipments.csv')
+        with mock.patch('portal.imports.insert_shipments', side_effect=insert_after_another_writer):
+            result = import_shipments(rows, user)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.errors, [(3, ['Tracking number IMP-2 already exists.'])])
+        self.assertEqual(Shipment.objects.get(tracking_number='IMP-2').description, 'Other upload')
+        self.assertEqual(Shipment.objects.filter(tracking_number__in=['IMP-1', 'IMP-3']).count(), 2)
+
+
+class DocumentStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.user = User.objects.create_user('uploader', password='pw')
+        create_organization('Uploader Co', self.user)
+        self.client.force_login(self.user)
+
+    def upload(self, title, content):
+        self.client.post(reverse('document_upload'), {
+            'title': title,
+            'document_type': 'import',
+            'file': SimpleUploadedFile(f'{title}.pdf', content),
+        })
+        return Document.objects.get(title=title)
+
+    def test_preview_pipeline_extracts_text_and_thumbnail(self):
+        import pymupdf
+
+        pdf = pymupdf.open()
+        pdf.new_page().insert_text((72, 72), 'Bill of lading MAEU7781234 Nhava Sheva')
+        content = pdf.tobytes()
+        first = self.upload('bol', content)
+        second = self.upload('bol-copy', content)
+        self.assertEqual(first.preview.status, 'pending')
+
+        self.assertEqual(run_preview_pipeline(workers=1), 2)
+        preview = DocumentPreview.objects.get(document=first)
+        self.assertEqual(preview.status, 'ready')
+        self.assertIn('MAEU7781234', preview.text)
+        self.assertEqual(preview.page_count, 1)
+        self.assertEqual(bytes(preview.thumbnail)[:2], b'\xff\xd8')
+        self.assertEqual(DocumentPreview.objects.get(document=second).text, preview.text)
+
+        response = self.client.get(reverse('document_list'), {'q': 'MAEU7781234'})
+        self.assertContains(response, 'Bill of lading MAEU7781234')
+        self.assertEqual(len(response.context['documents']), 2)
+        thumbnail = self.client.get(reverse('document_thumbnail', args=[first.pk]))
+        self.assertEqual(thumbnail['Content-Type'], 'image/jpeg')
+        cached = self.client.get(reverse('document_thumbnail', args=[first.pk]), HTTP_IF_NONE_MATCH=thumbnail['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_identical_uploads_share_one_blob_until_last_delete(self):
+        first = self.upload('first', b'%PDF same bytes')
+        second = self.upload('second', b'%PDF same bytes')
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(Blob.objects.get(name=first.file.name).ref_count, 2)
+        path = first.file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('document_delete', args=[first.pk]))
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('document_delete', args=[second.pk]))
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(Blob.objects.exists())
+        self.assertEqual(sweep_blobs(trash_seconds=-1), 1)
+
+    def test_upload_racing_the_last_release_keeps_the_file(self):
+        first = self.upload('first', b'%PDF racing bytes')
+        name, path = first.file.name, first.file.path
+
+        # The last reference goes, and before its commit hook runs, an upload of
+        # the same bytes finds the file in place and skips writing it.
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        self.assertEqual(Blob.objects.get(name=name).ref_count, 0)
+        second = Document.objects.create(title='second', document_type='import', file=name, uploaded_by=self.user)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(Blob.objects.get(name=name).ref_count, 1)
+
+        # Or the file is trashed first and the upload only acquires it afterwards.
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        Document.objects.create(title='third', document_type='import', file=name, uploaded_by=self.user)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(Blob.objects.get(name=name).ref_count, 1)
+        self.assertEqual(sweep_blobs(trash_seconds=-1), 0)
+
+    def test_chunked_upload_resumes_from_reported_offset(self):
+        content = b'0123456789' * 10
+        session_id = self.client.post(reverse('upload_session_create'), {
+            'filename': 'scan.pdf', 'total_size': len(content),
+        }).json()['id']
+        chunk_url = reverse('upload_session_chunk', args=[session_id])
+
+        response = self.client.put(chunk_url, content[:40], content_type='application/octet-stream',
+                                   HTTP_CONTENT_RANGE='bytes 0-39/100')
+        self.assertEqual(response.json()['offset'], 40)
+        response = self.client.put(chunk_url, content[60:], content_type='application/octet-stream',
+                                   HTTP_CONTENT_RANGE='bytes 60-99/100')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.get(chunk_url).json()['offset'], 40)
+        self.client.put(chunk_url, content[40:], content_type='application/octet-stream',
+                        HTTP_CONTENT_RANGE='bytes 40-99/100')
+
+        response = self.client.post(reverse('upload_session_complete', args=[session_id]), {
+            'title': 'Customs scan', 'document_type': 'import',
+        })
+        document = Document.objects.get(pk=response.json()['document_id'])
+        with document.file.open('rb') as stored:
+            self.assertEqual(stored.read(), content)
+        self.assertTrue(document.file.name.startswith('blobs/'))
+
+    def test_chunk_racing_another_for_the_same_offset_is_refused(self):
+        session_id = self.client.post(reverse('upload_session_create'), {
+            'filename': 'scan.pdf', 'total_size': 100,
+        }).json()['id']
+        stale = UploadSession.objects.get(pk=session_id)
+        self.client.put(reverse('upload_session_chunk', args=[session_id]), b'a' * 40,
+                        content_type='application/octet-stream', HTTP_CONTENT_RANGE='bytes 0-39/100')
+
+        # The second request read the session before the first one's chunk landed.
+        with self.assertRaises(UploadError) as refused:
+            append_chunk(stale, io.BytesIO(b'b' * 40), 'bytes 0-39/100')
+        self.assertEqual((refused.exception.status, stale.received), (409, 40))
+        with open(partial_path(stale), 'rb') as partial:
+            self.assertEqual(partial.read(), b'a' * 40)
+
+    def test_oversized_and_abandoned_uploads_are_refused_and_expired(self):
+        response = self.client.post(reverse('upload_session_create'), {
+            'filename': 'huge.pdf', 'total_size': DOCUMENT_MAX_SIZE + 1,
+        })
+        self.assertEqual(response.status_code, 400)
+
+        session_id = self.client.post(reverse('upload_session_create'), {
+            'filename': 'scan.pdf', 'total_size': 100,
+        }).json()['id']
+        self.client.put(reverse('upload_session_chunk', args=[session_id]), b'a' * 40,
+                        content_type='application/octet-stream', HTTP_CONTENT_RANGE='bytes 0-39/100')
+        session = UploadSession.objects.get(pk=session_id)
+        self.assertEqual(expire_upload_sessions(), 0)
+        UploadSession.objects.filter(pk=session_id).update(updated_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(expire_upload_sessions(), 1)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(partial_path(session)))
+
+    async def test_download_streams_under_asgi(self):
+        document = await sync_to_async(self.upload)('manifest', b'0123456789')
+        await self.async_client.aforce_login(self.user)
+        url = reverse('document_download', args=[document.pk])
+        response = await self.async_client.get(url)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'0123456789')
+        response = await self.async_client.get(url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'2345')
+
+    def test_download_honours_range_and_conditional_requests(self):
+        document = self.upload('manifest', b'0123456789')
+        url = reverse('document_download', args=[document.pk])
+
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(b''.join(self.client.get(url, HTTP_RANGE='bytes=-3').streaming_content), b'789')
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=20-').status_code, 416)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        stale = self.client.get(url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"other"')
+        self.assertEqual(stale.status_code, 200)
+        stale.close()
@@ -0,0 +1,88 @@
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max
+from django.utils import timezone
+
+from .models import ShipmentStatusEvent
+
+DWELL = ExpressionWrapper(F('left_at') - F('changed_at'), output_field=DurationField())
+TRANSIT = ExpressionWrapper(F('changed_at') - F('shipment__created_at'), output_field=DurationField())
+
+
+def record_status_change(shipment, from_status, changed_by=None, at=None):
+    """Close the shipment's open event and open one for its new status."""
+    at = at or timezone.now()
+    if from_status:
+        ShipmentStatusEvent.objects.filter(shipment=shipment, left_at__isnull=True).update(left_at=at)
+    return ShipmentStatusEvent.objects.create(
+        shipment=shipment,
+        from_status=from_status,
+        to_status=shipment.status,
+        changed_at=at,
+        changed_by=changed_by,
+        origin=shipment.origin,
+        destination=shipment.destination,
+    )
+
+
+def record_initial_statuses(shipments):
+    """Open the first timeline event for a batch of newly created shipments."""
+    ShipmentStatusEvent.objects.bulk_create([
+        ShipmentStatusEvent(
+            shipment=shipment,
+            to_status=shipment.status,
+            changed_at=shipment.created_at,
+            changed_by_id=shipment.created_by_id,
+            origin=shipment.origin,
+            destination=shipment.destination,
+        )
+        for shipment in shipments
+    ])
+
+
+def shipment_timeline(shipment):
+    return (
+        shipment.status_events.select_related('changed_by')
+        .only('shipment', 'from_status', 'to_status', 'changed_at', 'left_at', 'changed_by__username')
+        .order_by('changed_at', 'id')
+    )
+
+
+def dwell_times(status=None):
+    """Average and longest time spent in each status, per route, for completed stays."""
+    events = ShipmentStatusEvent.objects.filter(left_at__isnull=False)
+    if status:
+        events = events.filter(to_status=status)
+    return (
+        events.values('to_status', 'origin', 'destination')
+        .annotate(shipments=Count('id'), avg_dwell=Avg(DWELL), max_dwell=Max(DWELL))
+        .order_by('to_status', 'origin', 'destination')
+    )
+
+
+def transit_times():
+    """Average time from shipment creation to delivery, per route."""
+    return (
+        ShipmentStatusEvent.objects.filter(to_status='delivered')
+        .values('origin', 'destination')
+        .annotate(shipments=Count('id'), avg_transit=Avg(TRANSIT))
+        .order_by('origin', 'destination')
+    )
+
+
+def record_status_changes(shipments, to_status, changed_by=None, at=None):
+    """record_status_change() for a batch leaving their current statuses, in two queries."""
+    at = at or timezone.now()
+    ShipmentStatusEvent.objects.filter(
+        shipment__in=[shipment.pk for shipment in shipments], left_at__isnull=True,
+    ).update(left_at=at)
+    ShipmentStatusEvent.objects.bulk_create([
+        ShipmentStatusEvent(
+            shipment=shipment,
+            from_status=shipment.status,
+            to_status=to_status,
+            changed_at=at,
+            changed_by=changed_by,
+            origin=shipment.origin,
+            destination=shipment.destination,
+        )
+        for shipment in shipments
+    ])
@@ -0,0 +1,57 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_datetime
+
+from .models import Shipment
+
+TRACKING_CACHE_TTL = getattr(settings, 'TRACKING_CACHE_TTL', 300)
+TRACKING_MISS_TTL = getattr(settings, 'TRACKING_MISS_TTL', 30)
+
+# Cached for unknown tracking numbers so repeated bad lookups stay off the database.
+MISSING = 'missing'
+
+
+def tracking_cache_key(tracking_number):
+    digest = hashlib.md5(tracking_number.encode()).hexdigest()
+    return f'portal:track:{digest}'
+
+
+def tracking_payload(shipment):
+    return {
+        'tracking_number': shipment.tracking_number,
+        'status': shipment.status,
+        'status_display': shipment.get_status_display(),
+        'shipment_type': shipment.shipment_type,
+        'origin': shipment.origin,
+        'destination': shipment.destination,
+        'estimated_delivery': shipment.estimated_delivery.isoformat(),
+        'updated_at': shipment.updated_at.isoformat(),
+    }
+
+
+def get_tracking(tracking_number):
+    """Return the public tracking payload for a shipment, or None if it does not exist."""
+    key = tracking_cache_key(tracking_number)
+    payload = cache.get(key)
+    if payload is None:
+        shipment = Shipment.objects.filter(tracking_number=tracking_number).first()
+        if shipment is None:
+            cache.set(key, MISSING, TRACKING_MISS_TTL)
+            return None
+        payload = tracking_payload(shipment)
+        cache.set(key, payload, TRACKING_CACHE_TTL)
+    if payload == MISSING:
+        return None
+    return payload
+
+
+def tracking_validators(payload):
+    """ETag and Last-Modified for a payload; both change whenever updated_at does."""
+    etag = hashlib.md5(f"{payload['tracking_number']}:{payload['updated_at']}".encode()).hexdigest()
+    return f'"{etag}"', parse_datetime(payload['updated_at']).timestamp()
+
+
+def invalidate_tracking(*tracking_numbers):
+    cache.delete_many([tracking_cache_key(number) for number in tracking_numbers if number])
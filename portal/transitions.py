@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import audit, rollups
+from .caching import bump_version
+from .models import Shipment
+from .push import publish_status_events, status_event
+from .stats import invalidate_dashboard_stats
+from .timeline import record_status_changes
+from .tracking import invalidate_tracking
+
+BULK_STATUS_BATCH_SIZE = getattr(settings, 'BULK_STATUS_BATCH_SIZE', 1000)
+BULK_STATUS_MAX = getattr(settings, 'BULK_STATUS_MAX', 10000)
+
+# Everything the rollups, timeline and tracking cache need, and nothing else.
+TRANSITION_FIELDS = [
+    'id', 'tracking_number', 'status', 'shipment_type', 'price', 'origin', 'destination', 'created_at', 'updated_at',
+    'organization',
+]
+
+
+class TransitionResult:
+    def __init__(self):
+        self.updated = {}
+        self.unchanged = []
+        self.conflicts = []
+        self.missing = []
+
+    def as_dict(self):
+        return {
+            'updated': [{'id': pk, 'version': version} for pk, version in self.updated.items()],
+            'unchanged': self.unchanged,
+            'conflicts': self.conflicts,
+            'missing': self.missing,
+        }
+
+
+def transition_shipments(user, to_status, versions, from_status=None, shipments=None):
+    """
+    Move shipments to to_status with one UPDATE per batch.
+
+    versions maps shipment ids to the updated_at the caller last saw, or None
+    to skip the check. A shipment saved since then, or no longer in
+    from_status, is reported as a conflict and left alone; the others are
+    still changed. Ids outside the shipments queryset (by default all of
+    them) are reported as missing. Signals do not fire for the UPDATE, so the
+    rollups, status timeline, tracking cache, activity log and status push
+    are handled here in bulk.
+    """
+    result = TransitionResult()
+    shipments = Shipment.objects.all() if shipments is None else shipments
+    organizations = set()
+    ids = sorted(versions)
+    for start in range(0, len(ids), BULK_STATUS_BATCH_SIZE):
+        batch = ids[start:start + BULK_STATUS_BATCH_SIZE]
+        organizations |= _transition_batch(user, to_status, versions, shipments, batch, from_status, result)
+    if result.updated:
+        invalidate_dashboard_stats(*organizations)
+        bump_version('shipments')
+    return result
+
+
+def _transition_batch(user, to_status, versions, queryset, ids, from_status, result):
+    now = timezone.now()
+    with transaction.atomic():
+        # Locked until commit (SQLite already holds the write lock), so no save
+        # can slip in between the version check and the UPDATE.
+        shipments = list(
+            queryset.select_for_update().filter(pk__in=ids).only(*TRANSITION_FIELDS).order_by('pk')
+        )
+        found = {shipment.pk for shipment in shipments}
+        result.missing.extend(pk for pk in ids if pk not in found)
+        moving = []
+        for shipment in shipments:
+            expected = versions[shipment.pk]
+            edited = expected is not None and shipment.updated_at != expected
+            if edited or (from_status and shipment.status != from_status):
+                result.conflicts.append({'id': shipment.pk, 'status': shipment.status, 'version': shipment.version})
+            elif shipment.status == to_status:
+                result.unchanged.append(shipment.pk)
+            else:
+                moving.append(shipment)
+        if not moving:
+            return set()
+
+        Shipment.objects.filter(pk__in=[shipment.pk for shipment in moving]).update(status=to_status, updated_at=now)
+        rollups.move_shipments(moving, to_status)
+        record_status_changes(moving, to_status, user, at=now)
+        audit.log_activities(
+            user, 'update', moving,
+            lambda shipment: f'Changed shipment {shipment.pk} status from {shipment.status} to {to_status}',
+        )
+    previous = {shipment.pk: shipment.status for shipment in moving}
+    for shipment in moving:
+        shipment.status = to_status
+        shipment.updated_at = now
+        result.updated[shipment.pk] = shipment.version
+    invalidate_tracking(*(shipment.tracking_number for shipment in moving))
+    publish_status_events(status_event(shipment, previous[shipment.pk], at=now) for shipment in moving)
+    return {shipment.organization_id for shipment in moving}
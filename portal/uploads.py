@@ -0,0 +1,133 @@
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Document, UploadSession
+from .tenancy import organization_id
+
+UPLOAD_CHUNK_MAX = getattr(settings, 'UPLOAD_CHUNK_MAX', 8 * 1024 * 1024)
+# Largest document accepted, whether uploaded in one request or in chunks.
+DOCUMENT_MAX_SIZE = getattr(settings, 'DOCUMENT_MAX_SIZE', 100 * 1024 * 1024)
+# Seconds an upload session may go without a chunk before it is discarded.
+UPLOAD_SESSION_TTL = getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 3600)
+UPLOAD_READ_SIZE = 64 * 1024
+
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def partial_path(session):
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', f'{session.pk}.part')
+
+
+def parse_content_range(header):
+    """Return (start, end, total) from a 'bytes start-end/total' header."""
+    match = _CONTENT_RANGE.match(header or '')
+    if not match:
+        raise UploadError('Content-Range must look like "bytes start-end/total".')
+    start, end, total = (int(value) for value in match.groups())
+    if end < start or end >= total:
+        raise UploadError('Content-Range is out of bounds.')
+    return start, end, total
+
+
+def append_chunk(session, stream, content_range):
+    """
+    Append one chunk to a resumable upload and return the new offset.
+
+    The chunk must start exactly at the number of bytes already received, so a
+    client that lost its connection asks for the offset and resumes from there.
+    The body is copied in small reads to a file of its own, so a chunk is never
+    held in memory whole. Only then is the session locked, the offset checked
+    again and the chunk appended, so two requests for the same offset cannot
+    both write, and a slow client does not hold the lock.
+    """
+    start, end, total = parse_content_range(content_range)
+    if total != session.total_size:
+        raise UploadError('Total size does not match the upload session.')
+    if start != session.received:
+        raise UploadError(f'Expected a chunk starting at byte {session.received}.', status=409)
+    length = end - start + 1
+    if length > UPLOAD_CHUNK_MAX:
+        raise UploadError(f'Chunks may be at most {UPLOAD_CHUNK_MAX} bytes.', status=413)
+
+    path = partial_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.TemporaryFile(dir=os.path.dirname(path)) as chunk:
+        written = 0
+        while written < length:
+            data = stream.read(min(UPLOAD_READ_SIZE, length - written))
+            if not data:
+                break
+            chunk.write(data)
+            written += len(data)
+        if written != length:
+            raise UploadError('Chunk body is shorter than its Content-Range.')
+
+        with transaction.atomic():
+            try:
+                locked = UploadSession.objects.select_for_update().get(pk=session.pk)
+            except UploadSession.DoesNotExist:
+                raise UploadError('Upload session no longer exists.', status=404)
+            session.received = locked.received
+            if start != locked.received:
+                raise UploadError(f'Expected a chunk starting at byte {locked.received}.', status=409)
+            chunk.seek(0)
+            with open(path, 'ab') as out:
+                # Drop anything past the offset left by a write that failed midway.
+                out.truncate(locked.received)
+                shutil.copyfileobj(chunk, out, UPLOAD_READ_SIZE)
+            session.received += written
+            session.save(update_fields=['received', 'updated_at'])
+    return session.received
+
+
+def complete_upload(session, title, document_type, description=''):
+    """Turn a fully received upload into a Document stored by content hash."""
+    if not session.is_complete:
+        raise UploadError(f'Upload is incomplete: {session.received} of {session.total_size} bytes.', status=409)
+    path = partial_path(session)
+    document = Document(
+        title=title,
+        document_type=document_type,
+        description=description,
+        uploaded_by=session.user,
+        organization_id=organization_id(session.user),
+    )
+    with open(path, 'rb') as partial:
+        document.file.save(session.filename, File(partial), save=False)
+    document.save()
+    os.remove(path)
+    session.delete()
+    return document
+
+
+def discard_upload(session):
+    with transaction.atomic():
+        # Waits for a chunk being appended, so its file is not recreated afterwards.
+        UploadSession.objects.select_for_update().filter(pk=session.pk).delete()
+    path = partial_path(session)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def expire_upload_sessions(ttl=UPLOAD_SESSION_TTL):
+    """Discard uploads that have had no chunk for ttl seconds; returns how many."""
+    stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=ttl))
+    expired = 0
+    for session in stale.iterator():
+        discard_upload(session)
+        expired += 1
+    return expired
@@ -11,16 +11,48 @@ urlpatterns = [
     # Dashboards
     path('dashboard/client/', views.client_dashboard, name='client_dashboard'),
     path('dashboard/admin/', views.admin_dashboard, name='admin_dashboard'),
+    path('dashboard/events/', views.dashboard_events, name='dashboard_events'),
     
     # Document URLs
     path('documents/', views.document_list, name='document_list'),
     path('documents/upload/', views.document_upload, name='document_upload'),
+    path('documents/<int:pk>/download/', views.document_download, name='document_download'),
+    path('documents/<int:pk>/thumbnail/', views.document_thumbnail, name='document_thumbnail'),
     path('documents/<int:pk>/delete/', views.document_delete, name='document_delete'),
+    path('documents/uploads/', views.upload_session_create, name='upload_session_create'),
+    path('documents/uploads/<uuid:session_id>/', views.upload_session_chunk, name='upload_session_chunk'),
+    path('documents/uploads/<uuid:session_id>/complete/', views.upload_session_complete, name='upload_session_complete'),
     
     # Shipment URLs
     path('shipments/', views.shipment_list, name='shipment_list'),
     path('shipments/create/', views.shipment_create, name='shipment_create'),
+    path('shipments/bulk-status/', views.shipment_bulk_status, name='shipment_bulk_status'),
     path('shipments/<int:pk>/', views.shipment_detail, name='shipment_detail'),
+    path('shipments/<int:pk>/events/', views.shipment_events, name='shipment_events'),
     path('shipments/<int:pk>/update/', views.shipment_update, name='shipment_update'),
     path('shipments/<int:pk>/delete/', views.shipment_delete, name='shipment_delete'),
+    
+    # Trade URLs
+    path('trades/new/', views.trade_entry, name='trade_entry'),
+    
+    # Analytics
+    path('analytics/dwell/', views.shipment_dwell_analytics, name='shipment_dwell_analytics'),
+    path('api/trades/analytics/', views.trade_analytics, name='trade_analytics'),
+    path('cache/stats/', views.cache_statistics, name='cache_statistics'),
+    path('metrics', views.metrics, name='metrics'),
+    
+    # Public tracking
+    path('track/', views.track_shipment, name='track_shipment'),
+    path('api/track/<str:tracking_number>/', views.track_shipment_api, name='track_shipment_api'),
+    
+    # Search
+    path('search/', views.search, name='search'),
+    
+    # Bulk import
+    path('import/', views.bulk_import, name='bulk_import'),
+    
+    # Exports
+    path('export/shipments/', views.export_shipments, name='export_shipments'),
+    path('export/trades/', views.export_trades, name='export_trades'),
+    path('export/activity/', views.export_activity, name='export_activity'),
 ]
@@ -1,17 +1,52 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.shortcuts import render, redirect, get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import authenticate, login as auth_login, logout
-from .forms import DocumentForm, ShipmentForm, TradeForm
-from .models import Document, Shipment, Trade, ActivityLog
-from django.core.mail import send_mail
-from django.db.models import Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
+from django.views.decorators.http import require_POST
+from .forms import (
+    BulkImportForm, DateRangeForm, DocumentDetailsForm, DocumentForm, ShipmentFilterForm, ShipmentForm,
+    ShipmentBulkStatusForm, TradeAnalyticsForm, TradeForm, UploadSessionForm,
+)
+from .analytics import filter_trades, moving_averages, top_products, totals_by, totals_by_user, trade_source
+from .audit import log_activity
+from .caching import NAMESPACES, acached, cache_stats, cached
+from .downloads import serve_document
+from .exports import ACTIVITY_FIELDS, SHIPMENT_FIELDS, TRADE_FIELDS, export_response
+from .imports import IMPORTERS, read_rows
+from .metrics import render_metrics
+from .models import Document, DocumentPreview, Shipment, Trade, ActivityLog, UploadSession
+from .outbox import enqueue_mail
+from .pagination import akeyset_page
+from .previews import text_snippet
+from .push import event_stream, shipment_channel, tenant_channel
+from .querybudget import query_budget
+from .ratelimit import ratelimit
+from .search import KIND_MODELS, get_backend, tracking_prefix_lookup
+from .timeline import dwell_times, shipment_timeline, transit_times
+from .tracking import get_tracking, tracking_validators
+from .transitions import transition_shipments
+from .uploads import UPLOAD_CHUNK_MAX, UploadError, append_chunk, complete_upload, discard_upload
+from .rollups import amonthly_series, atotal_trade_revenue
+from .stats import aget_dashboard_stats
+from .tenancy import create_organization, organization_id, tenant_key
 
 # ==================== HOME & AUTH VIEWS ====================
 
+@ratelimit('login')
 def login_view(request):
     if request.method == 'POST':
         username = request.POST['username']
@@ -29,11 +64,14 @@ def login_view(request):
     return render(request, 'portal/login.html')
 
 
+@ratelimit('signup')
 def signup(request):
     if request.method == "POST":
         form = UserCreationForm(request.POST)
         if form.is_valid():
             user = form.save()
+            # Each self-service signup is a new client with its own organization.
+            create_organization(user.username, user)
             auth_login(request, user)
             messages.success(request, 'Account created successfully!')
             return redirect('home')
@@ -46,91 +84,128 @@ def logout_view(request):
     messages.success(request, 'You have been logged out successfully.')
     return redirect('login')
 
+async def _alist(queryset):
+    return [item async for item in queryset]
+
+async def _auser(request):
+    # Templates read request.user; resolve it once here so rendering never
+    # queries from the event loop.
+    request.user = await request.auser()
+    return request.user
+
 @login_required
-def home(request):
-    recent_shipments = Shipment.objects.all().order_by('-created_at')[:5]
-    total_shipments = Shipment.objects.count()
-    in_transit = Shipment.objects.filter(status='in_transit').count()
-    delivered = Shipment.objects.filter(status='delivered').count()
-    pending = Shipment.objects.filter(status='pending').count()
-    customs = Shipment.objects.filter(status='customs').count()
-    total_documents = Document.objects.count()
+@query_budget(2, cold=5)
+async def home(request):
+    stats = await aget_dashboard_stats(await _auser(request))
     context = {
-        'recent_shipments': recent_shipments,
-        'total_shipments': total_shipments,
-        'in_transit': in_transit,
-        'delivered': delivered,
-        'pending': pending,
-        'customs': customs,
-        'total_documents': total_documents,
+        'total_shipments': stats['total_shipments'],
+        'in_transit': stats['in_transit'],
+        'delivered': stats['delivered'],
+        'pending': stats['pending'],
+        'customs': stats['customs'],
+        'total_documents': stats['total_documents'],
     }
     return render(request, 'portal/index.html', context)
 
 # ==================== DASHBOARD VIEWS ====================
 
 @staff_member_required
-def admin_dashboard(request):
-    total_clients = User.objects.filter(is_staff=False).count()
-    total_trades = Trade.objects.count()
-    total_shipments = Shipment.objects.count()
-    total_documents = Document.objects.count()
-    trade_agg = Trade.objects.aggregate(Sum('price'))
-    shipment_agg = Shipment.objects.aggregate(total=Sum('price'))
-    trade_revenue = trade_agg.get('total') or 0
-    shipment_revenue = shipment_agg.get('total') or 0
-
-    total_revenue = trade_revenue + shipment_revenue
-    recent_activities = ActivityLog.objects.all().order_by('-timestamp')[:10]
-    shipment_labels = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul']
-    shipment_data = [10, 15, 20, 18, 25, 30, 28]
-    revenue_labels = shipment_labels
-    revenue_data = [1000, 1200, 1500, 1400, 1600, 1800, 1750]
-    context = {
-        'total_clients': total_clients,
-        'total_documents': total_documents,
-        'total_trades': total_trades,
-        'total_shipments': total_shipments,
-        'total_revenue': total_revenue,
-        'recent_activities': recent_activities,
-        'shipment_labels': shipment_labels,
-        'revenue_labels': revenue_labels,
-        'revenue_data': revenue_data,
-        'shipment_data': shipment_data,
-    }
+@query_budget(7, cold=10)
+async def admin_dashboard(request):
+    async def build_context():
+        activities = (
+            ActivityLog.objects.select_related('user')
+            .only('action', 'timestamp', 'user__username')
+            .order_by('-timestamp')[:10]
+        )
+        stats, series, trade_revenue, total_clients, recent_activities = await asyncio.gather(
+            aget_dashboard_stats(),
+            amonthly_series(),
+            atotal_trade_revenue(),
+            User.objects.filter(is_staff=False).acount(),
+            _alist(activities),
+        )
+        return {
+            'total_clients': total_clients,
+            'total_documents': stats['total_documents'],
+            'total_trades': stats['total_trades'],
+            'total_shipments': stats['total_shipments'],
+            'total_revenue': trade_revenue + stats['shipment_revenue'],
+            'recent_activities': recent_activities,
+            'shipment_labels': series['labels'],
+            'revenue_labels': series['labels'],
+            'revenue_data': series['revenue_data'],
+            'shipment_data': series['shipment_data'],
+        }
+
+    user = await _auser(request)
+    context = await acached('admin_dashboard', NAMESPACES, [user.pk], build_context)
     return render(request, 'portal/admin_dashboard.html', context)
 
 @login_required
-def client_dashboard(request):
-    recent_shipments = Shipment.objects.all().order_by('-created_at')[:5]
-    user_documents = Document.objects.filter(uploaded_by=request.user).order_by('-uploaded_at')[:5]
-    total_shipments = Shipment.objects.count()
-    in_transit = Shipment.objects.filter(status='in_transit').count()
-    delivered = Shipment.objects.filter(status='delivered').count()
-    total_clients = User.objects.count()
-    context = {
-        'recent_shipments': recent_shipments,
-        'user_documents': user_documents,
-        'total_shipments': total_shipments,
-        'in_transit': in_transit,
-        'delivered': delivered,
-        'total_clients': total_clients,
-    }
-    return render(request, 'portal/client_dashboard.html', context)
+@query_budget(5, cold=7)
+async def client_dashboard(request):
+    user = await _auser(request)
+
+    async def build_context():
+        stats, recent_shipments, user_documents = await asyncio.gather(
+            aget_dashboard_stats(user),
+            _alist(Shipment.objects.for_user(user).order_by('-created_at')[:5]),
+            _alist(Document.objects.filter(uploaded_by=user).order_by('-uploaded_at')[:5]),
+        )
+        return {
+            'recent_shipments': recent_shipments,
+            'user_documents': user_documents,
+            'total_shipments': stats['total_shipments'],
+            'in_transit': stats['in_transit'],
+            'delivered': stats['delivered'],
+        }
+
+    tenant = tenant_key(user)
+    context = await acached('client_dashboard', ['shipments', 'documents', 'users'], [user.pk, tenant], build_context)
+    return render(request, 'portal/client_dashboard.html', {**context, 'tenant': tenant})
 
 # ==================== DOCUMENT VIEWS ====================
 
 @login_required
-def document_list(request):
-    documents = Document.objects.all().order_by('-uploaded_at')
-    return render(request, 'portal/document_list.html', {'documents': documents})
+@query_budget(4)
+async def document_list(request):
+    user = await _auser(request)
+    query = request.GET.get('q', '').strip()
+    fields = [
+        'title', 'document_type', 'file', 'uploaded_at', 'uploaded_by__username',
+        'preview__status', 'preview__page_count',
+    ]
+    if query:
+        fields.append('preview__text')
+    documents = (
+        Document.objects.for_user(user).select_related('uploaded_by', 'preview')
+        .only(*fields)
+        .order_by('-uploaded_at')
+    )
+    if query:
+        # Rank by the search index, which includes text extracted from the files.
+        ranked = await sync_to_async(get_backend().search)(query, kinds=['document'], tenant=tenant_key(user))
+        ranked = [pk for _kind, pk, _score in ranked]
+        by_pk = await documents.ain_bulk(ranked)
+        documents = [by_pk[pk] for pk in ranked if pk in by_pk]
+        for document in documents:
+            preview = getattr(document, 'preview', None)
+            document.snippet = text_snippet(preview.text, query) if preview else ''
+    else:
+        documents = await _alist(documents)
+    return render(request, 'portal/document_list.html', {'documents': documents, 'query': query})
 
 @login_required
+@ratelimit('document_upload')
+@query_budget(2)
 def document_upload(request):
     if request.method == 'POST':
         form = DocumentForm(request.POST, request.FILES)
         if form.is_valid():
             document = form.save(commit=False)
             document.uploaded_by = request.user
+            document.organization_id = organization_id(request.user)
             document.save()
             messages.success(request, 'Document uploaded successfully!')
             return redirect('document_list')
@@ -139,33 +214,125 @@ def document_upload(request):
     return render(request, 'portal/document_upload.html', {'form': form})
 
 @login_required
+@query_budget(3)
 def document_delete(request, pk):
-    document = get_object_or_404(Document, pk=pk)
+    document = get_object_or_404(Document.objects.for_user(request.user), pk=pk)
     if request.method == 'POST':
         document.delete()
         messages.success(request, 'Document deleted successfully!')
         return redirect('document_list')
     return render(request, 'portal/document_confirm_delete.html', {'document': document})
 
+@login_required
+def document_thumbnail(request, pk):
+    preview = get_object_or_404(
+        DocumentPreview.objects.only('thumbnail', 'updated_at'),
+        document__in=Document.objects.for_user(request.user), document_id=pk, status='ready', page_count__gt=0,
+    )
+    etag = '"%s"' % preview.updated_at.timestamp()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(bytes(preview.thumbnail), content_type='image/jpeg')
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=3600)
+    return response
+
+@login_required
+def document_download(request, pk):
+    document = get_object_or_404(Document.objects.for_user(request.user).only('title', 'file'), pk=pk)
+    try:
+        return serve_document(request, document)
+    except FileNotFoundError:
+        raise Http404('Document file is missing.')
+
+# ==================== CHUNKED UPLOAD VIEWS ====================
+
+@login_required
+@require_POST
+def upload_session_create(request):
+    form = UploadSessionForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    session = UploadSession.objects.create(user=request.user, **form.cleaned_data)
+    return JsonResponse({'id': str(session.pk), 'offset': 0, 'chunk_max': UPLOAD_CHUNK_MAX}, status=201)
+
+@login_required
+def upload_session_chunk(request, session_id):
+    """GET reports the resume offset, PUT appends a chunk, DELETE abandons the upload."""
+    session = get_object_or_404(UploadSession, pk=session_id, user=request.user)
+    if request.method == 'GET':
+        return JsonResponse({'offset': session.received, 'total_size': session.total_size})
+    if request.method == 'DELETE':
+        discard_upload(session)
+        return JsonResponse({'deleted': True})
+    if request.method not in ('PUT', 'POST'):
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    try:
+        offset = append_chunk(session, request, request.headers.get('Content-Range'))
+    except UploadError as exc:
+        return JsonResponse({'error': str(exc), 'offset': session.received}, status=exc.status)
+    return JsonResponse({'offset': offset, 'complete': session.is_complete})
+
+@login_required
+@require_POST
+def upload_session_complete(request, session_id):
+    session = get_object_or_404(UploadSession, pk=session_id, user=request.user)
+    form = DocumentDetailsForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        document = complete_upload(session, **form.cleaned_data)
+    except UploadError as exc:
+        return JsonResponse({'error': str(exc), 'offset': session.received}, status=exc.status)
+    return JsonResponse({'document_id': document.pk, 'file': document.file.name}, status=201)
+
 # ==================== SHIPMENT VIEWS ====================
 
+SHIPMENT_PAGE_SIZE = 50
+
 @login_required
-def shipment_list(request):
-    shipments = Shipment.objects.all().order_by('-created_at')
-    return render(request, 'portal/shipment_list.html', {'shipments': shipments})
+@query_budget(3)
+async def shipment_list(request):
+    user = await _auser(request)
+    filter_form = ShipmentFilterForm(request.GET)
+    shipments = Shipment.objects.for_user(user)
+    if filter_form.is_valid():
+        shipments = filter_form.filter(shipments)
+    tenant = tenant_key(user)
+    page = await acached(
+        'shipment_list', ['shipments'], [tenant, request.GET.urlencode()],
+        lambda: akeyset_page(shipments, request.GET.get('cursor'), SHIPMENT_PAGE_SIZE),
+    )
+    next_query = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_query = params.urlencode()
+    first_query = request.GET.copy()
+    first_query.pop('cursor', None)
+    context = {
+        'shipments': page.items,
+        'filter_form': filter_form,
+        'next_query': next_query,
+        'first_query': first_query.urlencode(),
+        'is_first_page': 'cursor' not in request.GET,
+        'status_choices': Shipment.STATUS_CHOICES,
+        'tenant': tenant,
+    }
+    return render(request, 'portal/shipment_list.html', context)
 
 @login_required
+@ratelimit('shipment_create')
+@query_budget(2)
 def shipment_create(request):
     if request.method == 'POST':
         form = ShipmentForm(request.POST)
         if form.is_valid():
             shipment = form.save(commit=False)
             shipment.created_by = request.user
+            shipment.organization_id = organization_id(request.user)
             shipment.save()
-            ActivityLog.objects.create(
-                user=request.user,
-                action=f"Created a new shipment with ID: {shipment.id}"
-            )
+            log_activity(request.user, 'create', shipment, f"Created a new shipment with ID: {shipment.id}")
             messages.success(request, f'Shipment {shipment.id} created successfully!')
             return redirect('shipment_list')
     else:
@@ -173,21 +340,23 @@ def shipment_create(request):
     return render(request, 'portal/shipment_form.html', {'form': form, 'action': 'Create'})
 
 @login_required
-def shipment_detail(request, pk):
-    shipment = get_object_or_404(Shipment, pk=pk)
-    return render(request, 'portal/shipment_detail.html', {'shipment': shipment})
+@query_budget(4)
+async def shipment_detail(request, pk):
+    user = await _auser(request)
+    shipment = await aget_object_or_404(Shipment.objects.for_user(user).select_related('created_by'), pk=pk)
+    timeline = await _alist(shipment_timeline(shipment))
+    return render(request, 'portal/shipment_detail.html', {'shipment': shipment, 'timeline': timeline})
 
 @login_required
+@query_budget(3)
 def shipment_update(request, pk):
-    shipment = get_object_or_404(Shipment, pk=pk)
+    shipment = get_object_or_404(Shipment.objects.for_user(request.user), pk=pk)
     if request.method == 'POST':
         form = ShipmentForm(request.POST, instance=shipment)
         if form.is_valid():
+            shipment._changed_by = request.user
             form.save()
-            ActivityLog.objects.create(
-                user=request.user,
-                action=f"Updated shipment with ID: {shipment.id}"
-            )
+            log_activity(request.user, 'update', shipment, f"Updated shipment with ID: {shipment.id}")
             messages.success(request, f'Shipment {shipment.id} updated successfully!')
             return redirect('shipment_detail', pk=shipment.pk)
     else:
@@ -195,28 +364,80 @@ def shipment_update(request, pk):
     return render(request, 'portal/shipment_form.html', {'form': form, 'action': 'Update', 'shipment': shipment})
 
 @login_required
-def shipment_delete(request, pk):
-    shipment = get_object_or_404(Shipment, pk=pk)
-    if request.method == 'POST':
-        shipment.delete()
-        messages.success(request, f'Shipment {shipment.id} deleted successfully!')
+@require_POST
+def shipment_bulk_status(request):
+    """Move many shipments to one status; takes the shipment list's form POST or a JSON body."""
+    is_json = request.content_type == 'application/json'
+    if is_json:
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return JsonResponse({'errors': {'__all__': ['Expected a JSON object.']}}, status=400)
+    else:
+        data = request.POST
+    form = ShipmentBulkStatusForm(data)
+    if not form.is_valid():
+        if is_json:
+            return JsonResponse({'errors': form.errors}, status=400)
+        messages.error(request, 'Select at least one shipment and a status.')
         return redirect('shipment_list')
-    return render(request, 'portal/shipment_confirm_delete.html', {'shipment': shipment})
+
+    result = transition_shipments(
+        request.user, form.cleaned_data['to_status'], form.cleaned_data['shipments'],
+        form.cleaned_data['from_status'] or None, Shipment.objects.for_user(request.user),
+    )
+    if is_json:
+        # 409 only when conflicts stopped everything; partial success is a 200 listing them.
+        status = 409 if result.conflicts and not result.updated else 200
+        return JsonResponse(result.as_dict(), status=status)
+    messages.success(request, f'{len(result.updated)} shipment(s) updated.')
+    if result.conflicts:
+        messages.warning(
+            request, f'{len(result.conflicts)} shipment(s) were changed by someone else meanwhile and were skipped.',
+        )
+    return redirect('shipment_list')
+
+# ==================== LIVE UPDATE VIEWS ====================
+
+def _event_stream_response(request, channels):
+    # Every open stream is a long-lived connection; under WSGI it would hold a
+    # worker thread and never flush, so tell the browser not to reconnect.
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(event_stream(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+async def dashboard_events(request):
+    """Status changes to every shipment the user can see, as server-sent events."""
+    user = await request.auser()
+    return _event_stream_response(request, [tenant_channel(tenant_key(user))])
+
+@login_required
+async def shipment_events(request, pk):
+    """Status changes to one shipment, as server-sent events."""
+    user = await request.auser()
+    if not await Shipment.objects.for_user(user).filter(pk=pk).aexists():
+        raise Http404('No Shipment matches the given query.')
+    return _event_stream_response(request, [shipment_channel(pk)])
 
 # ==================== TRADE VIEWS ====================
 
 @login_required
+@query_budget(2)
 def trade_entry(request):
     if request.method == 'POST':
         form = TradeForm(request.POST)
         if form.is_valid():
             trade = form.save(commit=False)
             trade.user = request.user
+            trade.organization_id = organization_id(request.user)
             trade.save()
-            ActivityLog.objects.create(
-                user=request.user,
-                action=f"Created a new trade for product: {trade.product}"
-            )
+            log_activity(request.user, 'create', trade, f"Created a new trade for product: {trade.product}")
             subject = 'New Trade Entry Recorded'
             message = (
                 f"Dear {request.user.username},\n\n"
@@ -227,13 +448,7 @@ def trade_entry(request):
                 f"Date: {trade.date}\n\n"
                 "Thank you for using our service."
             )
-            send_mail(
-                subject,
-                message,
-                None,  # Or DEFAULT_FROM_EMAIL
-                [request.user.email],
-                fail_silently=False,
-            )
+            enqueue_mail(subject, message, [request.user.email])
             messages.success(request, 'Trade entry created successfully!')
             return redirect('client_dashboard')
     else:
@@ -241,11 +456,177 @@ def trade_entry(request):
     return render(request, 'portal/trade_entry.html', {'form': form})
 
 
+# ==================== BULK IMPORT VIEWS ====================
+
+@staff_member_required
+def bulk_import(request):
+    result = None
+    if request.method == 'POST':
+        form = BulkImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            kind = form.cleaned_data['kind']
+            upload = form.cleaned_data['file']
+            upload.seek(0)
+            rows = read_rows(upload.file, upload.name)
+            result = IMPORTERS[kind](rows, request.user, form.cleaned_data['organization'])
+            log_activity(request.user, 'import', action=f"Imported {result.created} {kind} from {upload.name}")
+            messages.success(request, f'Imported {result.created} {kind}, {result.error_count} row(s) rejected.')
+    else:
+        form = BulkImportForm()
+    return render(request, 'portal/bulk_import.html', {'form': form, 'result': result})
+
+# ==================== ANALYTICS VIEWS ====================
+
+def _seconds(duration):
+    return duration.total_seconds() if duration is not None else None
+
+@staff_member_required
+def shipment_dwell_analytics(request):
+    dwell = [
+        {**row, 'avg_dwell': _seconds(row['avg_dwell']), 'max_dwell': _seconds(row['max_dwell'])}
+        for row in dwell_times(request.GET.get('status'))
+    ]
+    transit = [
+        {**row, 'avg_transit': _seconds(row['avg_transit'])}
+        for row in transit_times()
+    ]
+    return JsonResponse({'dwell_seconds': dwell, 'transit_seconds': transit})
+
+@staff_member_required
+@query_budget(3)
+def trade_analytics(request):
+    """Trade volume and revenue as JSON: grouped by period, product or user, top products, or moving averages."""
+    form = TradeAnalyticsForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    data = form.cleaned_data
+    report = data['report'] or 'month'
+
+    filters = [data['date_from'], data['date_to'], data['product'], data['user']]
+
+    def build():
+        if report == 'user':
+            return totals_by_user(filter_trades(*filters))
+        source = trade_source(*filters)
+        if report == 'top':
+            return top_products(source, data['limit'] or 10, data['rank_by'] or 'revenue')
+        if report == 'moving_average':
+            return moving_averages(source, data['window'] or 7)
+        return totals_by(source, report)
+
+    rows = cached('trade_analytics', ['trades'], [request.GET.urlencode()], build)
+    return JsonResponse({'report': report, 'rows': rows})
+
+@staff_member_required
+def cache_statistics(request):
+    """Hit/miss counters of the view and fragment caches in this worker process."""
+    return JsonResponse({
+        'backend': settings.CACHES['default']['BACKEND'],
+        'caches': cache_stats(),
+    })
+
+def metrics(request):
+    """Prometheus scrape endpoint; needs METRICS_TOKEN as a bearer token, or a staff session."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden('Metrics require a token or a staff login.')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# ==================== PUBLIC TRACKING VIEWS ====================
+
+def _tracking_response(request, payload, response):
+    # Answered from the cache; never touch request.user here, or the session
+    # and user lookups would put repeat polls back on the database.
+    etag, last_modified = tracking_validators(payload)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, no_cache=True)
+    return get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+
+def track_shipment_api(request, tracking_number):
+    payload = get_tracking(tracking_number)
+    if payload is None:
+        return JsonResponse({'error': 'Shipment not found'}, status=404)
+    return _tracking_response(request, payload, JsonResponse(payload))
+
+def track_shipment(request):
+    tracking_number = request.GET.get('number', '').strip()
+    payload = get_tracking(tracking_number) if tracking_number else None
+    response = render(request, 'portal/track.html', {'tracking_number': tracking_number, 'shipment': payload})
+    if payload is None:
+        if tracking_number:
+            response.status_code = 404
+        return response
+    return _tracking_response(request, payload, response)
+
+# ==================== SEARCH VIEWS ====================
 
 @login_required
+@query_budget(6)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('type')
+    kinds = [kind] if kind in KIND_MODELS else None
+    querysets = {
+        'shipment': Shipment.objects.for_user(request.user),
+        'document': Document.objects.for_user(request.user),
+    }
+    hits = get_backend().hits(query, kinds, tenant=tenant_key(request.user), querysets=querysets) if query else []
+    tracking_matches = []
+    if query and ' ' not in query and kinds in (None, ['shipment']):
+        tracking_matches = list(tracking_prefix_lookup(query, querysets['shipment']))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'query': query,
+            'results': [
+                {'type': hit.kind, 'id': hit.object.pk, 'score': hit.score, 'label': str(hit.object)}
+                for hit in hits
+            ],
+            'tracking_numbers': [shipment.tracking_number for shipment in tracking_matches],
+        })
+    context = {
+        'query': query,
+        'hits': hits,
+        'tracking_matches': tracking_matches,
+    }
+    return render(request, 'portal/search.html', context)
+
+# ==================== EXPORT VIEWS ====================
+
+@login_required
+def export_shipments(request):
+    filter_form = ShipmentFilterForm(request.GET)
+    shipments = Shipment.objects.for_user(request.user).order_by('-created_at', '-id')
+    if filter_form.is_valid():
+        shipments = filter_form.filter(shipments)
+    return export_response(request, shipments, SHIPMENT_FIELDS, 'shipments')
+
+@staff_member_required
+def export_trades(request):
+    filter_form = DateRangeForm(request.GET)
+    trades = Trade.objects.order_by('id')
+    if filter_form.is_valid():
+        trades = filter_form.filter(trades, 'date', is_datetime=False)
+    return export_response(request, trades, TRADE_FIELDS, 'trades')
+
+@staff_member_required
+def export_activity(request):
+    filter_form = DateRangeForm(request.GET)
+    activities = ActivityLog.objects.order_by('-id')
+    if filter_form.is_valid():
+        activities = filter_form.filter(activities, 'timestamp')
+    return export_response(request, activities, ACTIVITY_FIELDS, 'activity')
+
+
+@login_required
+@query_budget(3)
 def shipment_delete(request, pk):
     """Delete shipment"""
-    shipment = get_object_or_404(Shipment, pk=pk)
+    shipment = get_object_or_404(Shipment.objects.for_user(request.user), pk=pk)
     
     if request.method == 'POST':
         tracking_number = shipment.tracking_number
@@ -254,41 +635,3 @@ def shipment_delete(request, pk):
         return redirect('shipment_list')
     
     return render(request, 'portal/shipment_confirm_delete.html', {'shipment': shipment})
-
-
-# Create your views here.
-@login_required
-def trade_entry(request):
-    if request.method == 'POST':
-        form = TradeForm(request.POST)
-        if form.is_valid():
-            trade = form.save(commit=False)
-            trade.user = request.user
-            trade.save()
-            ActivityLog.objects.create(
-                user=request.user,
-                action=f"Created a new trade for product: {trade.product}"
-            )
-            subject = 'New Trade Entry Recorded'
-            message = (
-                f"Dear {request.user.username},\n\n"
-                "Your trade entry has been successfully recorded.\n\n"
-                f"Product: {trade.product}\n"
-                f"Quantity: {trade.quantity}\n"
-                f"Price: {trade.price}\n"
-                f"Date: {trade.date}\n\n"
-                "Thank you for using our service."
-            )
-            send_mail(
-                subject,
-                message,
-                None,  # Or DEFAULT_FROM_EMAIL
-                [request.user.email],
-                fail_silently=False,  # Shows errors in terminal
-            )
-            messages.success(request, 'Trade entry created successfully!')
-            return redirect('client_dashboard')
-    else:
-        form = TradeForm()
-    return render(request, 'portal/trade_entry.html', {'form': form})
-
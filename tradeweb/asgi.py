@@ -2,6 +2,8 @@
 ASGI config for tradeweb project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it (e.g. ``uvicorn tradeweb.asgi:application``) for the live shipment
+status streams in portal.push; WSGI servers answer them with 204.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -17,13 +17,10 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path,include
-from django.conf import settings
-from django.conf.urls.static import static
 
+# MEDIA_ROOT is deliberately not served, not even with DEBUG: documents are
+# only reachable through the authenticated, tenant-scoped document_download.
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('portal.urls')),
 ]
-#Serve media files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file